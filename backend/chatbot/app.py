@@ -1,15 +1,21 @@
 import pandas as pd
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import faiss
-import requests
 import json
 import torch
 import os
+import time
 import warnings
-from flask import Flask, request, jsonify, Response, render_template
+from flask import Flask, request, jsonify, Response, render_template, stream_with_context
 from flask_cors import CORS
 from functools import wraps
+from catalog_snapshot import read_catalog
+from hot_reload import HotReloader, admin_authorized
+from vector_index import VectorIndex
+from embedding_cache import EmbeddingCache
+from hybrid_retriever import BM25Index, HybridRetriever
+from ollama_client import stream_generate
+from prompt_builder import TokenCounter, build_prompt
 
 warnings.filterwarnings("ignore")
 
@@ -19,60 +25,102 @@ CORS(app)
 # Configuration
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
+DATA_FILE = 'preprocessed_perfume_data.csv'
+INDEX_FILE = 'perfume_faiss.index'
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# faiss index spec, e.g. Flat, SQ8,rerank=4, HNSW32,efSearch=64 or IVF,PQ48,nprobe=16 (see vector_index.py)
+INDEX_SPEC = os.getenv('FAISS_INDEX', 'Flat')
+# Prompt size in tokens of the Ollama model; perfumes beyond it are left out, lowest-ranked first
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '2048'))
+# 'hybrid' fuses BM25 and FAISS hits; 'vector' is FAISS only
+RETRIEVAL = os.getenv('RETRIEVAL', 'hybrid')
+
+class RagSnapshot:
+    """Catalog frame, the VectorIndex synced to it and its BM25 index, swapped together on reload"""
+    __slots__ = ('df', 'index', 'bm25')
+
+    def __init__(self, df, index):
+        self.df = df
+        self.index = index
+        self.bm25 = BM25Index(df['title'].astype(str) + ' ' + df['combined_text'].astype(str))
+
+    @property
+    def version(self):
+        return self.df.attrs.get('sha256', '')
+
 # Global variables
 embedder = None
-index = None
-df = None
 
-def load_data(file_path, chunksize=10000):
-    try:
-        df_chunk = pd.read_csv(file_path, nrows=1)
-        if 'combined_text' not in df_chunk.columns:
-            raise ValueError("Dataset must contain 'combined_text' column.")
-        return pd.read_csv(file_path, chunksize=chunksize)
-    except Exception as e:
-        print(f"Error loading dataset: {e}")
-        return None
+# Query vectors by normalized text, in memory and in SQLite (shared with
+# other workers and restarts); EMBEDDING_CACHE_DB='' keeps it in memory only
+embedding_cache = EmbeddingCache(
+    MODEL_NAME,
+    maxsize=int(os.getenv('EMBEDDING_CACHE_SIZE', '4096')),
+    db_path=os.getenv('EMBEDDING_CACHE_DB', 'query_embeddings.db') or None
+)
+
+# Counts prompt tokens with the llama3 tokenizer (or an estimate without transformers)
+token_counter = TokenCounter("llama3:8b")
 
-def build_faiss_index(chunks, batch_size=100, use_gpu=True):
+def encode_texts(texts, batch_size=100):
     try:
-        device = 'cuda' if use_gpu and torch.cuda.is_available() else 'cpu'
-        print(f"Using device: {device}")
-        local_embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-        
-        dimension = 384
-        local_index = faiss.IndexFlatL2(dimension)
-        
-        for chunk in chunks:
-            texts = chunk['combined_text'].tolist()
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i + batch_size]
-                embeddings = local_embedder.encode(batch_texts, show_progress_bar=True, batch_size=batch_size)
-                local_index.add(embeddings)
-        
-        return local_embedder, local_index
-    except Exception as e:
-        print(f"Error building index: {e}")
-        return None, None
+        return embedder.encode(texts, show_progress_bar=True, batch_size=batch_size)
+    except RuntimeError as e:
+        if embedder.device.type != 'cuda':
+            raise
+        print(f"Encoding on GPU failed ({e}), retrying with CPU...")
+        embedder.to('cpu')
+        return embedder.encode(texts, show_progress_bar=True, batch_size=batch_size)
 
-def retrieve_entries(query, embedder, index, df, k=3):
+def sync_index(df):
+    """Load the saved index, embedding only rows added or changed since it was built"""
+    if 'combined_text' not in df.columns:
+        raise ValueError("Dataset must contain 'combined_text' column.")
+    vector_index, stats = VectorIndex.sync(df, INDEX_FILE, encode_texts, MODEL_NAME, INDEX_SPEC)
+    print(f"FAISS index ready: {stats['encoded']} rows encoded ({stats['mode']})")
+    return vector_index
+
+def search_vectors(query, embedder, index, k):
+    """Row positions and distances of the k nearest perfumes"""
+    query_embedding = embedding_cache.get_or_compute(query, lambda text: embedder.encode([text])[0])
+    distances, positions = index.search(query_embedding.reshape(1, -1), k)
+    found = positions[0] >= 0
+    return positions[0][found], distances[0][found]
+
+# FAISS and BM25 run in parallel and their rankings are fused with RRF
+hybrid_retriever = HybridRetriever(
+    {
+        'vector': lambda query, depth, embedder, index, bm25: search_vectors(query, embedder, index, depth),
+        'bm25': lambda query, depth, embedder, index, bm25: bm25.search(query, depth),
+    },
+    depth=int(os.getenv('RETRIEVAL_DEPTH', '20')),
+    rrf_k=int(os.getenv('RRF_K', '60')),
+    name='rag'
+)
+
+def retrieve_entries(query, embedder, index, df, k=3, bm25=None):
+    """Nearest perfumes, or with bm25 (and RETRIEVAL=hybrid) the fused BM25 + FAISS hits
+    with an rrf_score column and leg stats in attrs['retrieval']"""
     try:
-        query_embedding = embedder.encode([query])
-        distances, indices = index.search(query_embedding, k)
-        retrieved_data = df.iloc[indices[0]].copy()
-        retrieved_data['distance'] = distances[0]
+        if bm25 is None or RETRIEVAL != 'hybrid':
+            positions, distances = search_vectors(query, embedder, index, k)
+            retrieved_data = df.iloc[positions].copy()
+            retrieved_data['distance'] = distances
+            return retrieved_data
+        
+        result = hybrid_retriever.search(query, k, embedder=embedder, index=index, bm25=bm25)
+        vector_distances = dict(zip(*(array.tolist() for array in result.legs['vector'])))
+        retrieved_data = df.iloc[result.positions].copy()
+        # NaN for perfumes only BM25 found
+        retrieved_data['distance'] = [vector_distances.get(position, np.nan) for position in result.positions]
+        retrieved_data['rrf_score'] = result.scores
+        retrieved_data.attrs = {**retrieved_data.attrs, 'retrieval': result.stats()}
         return retrieved_data
     except Exception as e:
         print(f"Retrieval error: {e}")
         return None
 
-def generate_response(query, retrieved_data, ollama_model="llama3:8b", max_tokens=200):
-    try:
-        prompt = f"Query: {query}\nRelevant Perfumes:\n"
-        for idx, row in retrieved_data.iterrows():
-            prompt += f"- {row['title']}: {row['combined_text']}\n"
-            prompt += """
-SYSTEM / USER PROMPT FOR LLaMA 3 — STRICT: TOP 5 WOODY PERFUMES FOR MEN
+SYSTEM_PROMPT = """SYSTEM / USER PROMPT FOR LLaMA 3 — STRICT: TOP 5 WOODY PERFUMES FOR MEN
 
 You are an expert fragrance critic and formatter. You will be given a set of retrieved perfume entries (names, ratings, notes, short review snippets, and any available metadata). Your job is to produce a **clean, professional Top 5 list** of fragrances that are **woody** and **for men**.
 
@@ -113,33 +161,25 @@ OUTPUT: Return only the numbered Top 5 list in the exact format specified above.
 End of prompt.
 """
 
+def build_ollama_payload(query, retrieved_data, ollama_model="llama3:8b", max_tokens=200):
+    """Ollama request with the system prompt once, then as many perfumes as fit the token budget"""
+    prompt = build_prompt(
+        token_counter, SYSTEM_PROMPT, f"Query: {query}\nRelevant Perfumes:\n", retrieved_data,
+        lambda row: f"- {row['title']}: {row['combined_text']}", None, PROMPT_TOKEN_BUDGET
+    )
+    payload = {
+        "model": ollama_model,
+        "prompt": prompt.text,
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "top_p": 0.9,
+        "stream": True
+    }
+    return payload, prompt
 
-        
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": ollama_model,
-                "prompt": prompt,
-                "max_tokens": max_tokens,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "stream": True
-            },
-            stream=True
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Ollama API error: {response.text}")
-        
-        generated_text = ""
-        for line in response.iter_lines():
-            if line:
-                try:
-                    json_data = json.loads(line.decode('utf-8'))
-                    if 'response' in json_data:
-                        generated_text += json_data['response']
-                except json.JSONDecodeError:
-                    continue
+def generate_response(payload):
+    try:
+        generated_text = "".join(stream_generate(payload))
         
         if not generated_text:
             raise Exception("No response from Ollama")
@@ -148,31 +188,76 @@ End of prompt.
         print(f"Generation error: {e}")
         return "Unable to generate response."
 
+def sse_event(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_response(query, retrieved_data, start_time):
+    """Retrieved titles first, then each Ollama token as it arrives, then timings"""
+    yield sse_event('results', {
+        'results': [
+            {'title': row['title'], 'distance': None if pd.isna(row['distance']) else float(row['distance'])}
+            for _, row in retrieved_data.iterrows()
+        ],
+        'retrieval': retrieved_data.attrs.get('retrieval')
+    })
+    
+    first_token, tokens, error = None, 0, None
+    payload, prompt = build_ollama_payload(query, retrieved_data)
+    generation_start = time.perf_counter()
+    try:
+        for text in stream_generate(payload):
+            if first_token is None:
+                first_token = time.perf_counter() - generation_start
+            tokens += 1
+            yield sse_event('token', {'text': text})
+    except Exception as e:
+        print(f"Generation error: {e}")
+        error = str(e)
+    
+    if not tokens:
+        yield sse_event('token', {'text': "Unable to generate response."})
+    yield sse_event('done', {
+        'tokens': tokens,
+        'error': error,
+        **prompt.stats(),
+        'time_to_first_token_ms': round(first_token * 1000, 1) if first_token is not None else None,
+        'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+    })
+
+def rebuild_snapshot(previous):
+    """Reload DATA_FILE in the background, embedding only new or changed rows"""
+    new_df = read_catalog(DATA_FILE, usecols=['title', 'rating', 'combined_text'])
+    if previous is not None and previous.version and new_df.attrs.get('sha256') == previous.version:
+        return previous
+    
+    return RagSnapshot(new_df, sync_index(new_df))
+
+rag_reloader = HotReloader('rag', rebuild_snapshot, trigger_path=os.getenv('CATALOG_RELOAD_TRIGGER') or None)
+
+def start_catalog_watch():
+    """Reload automatically when the data file changes (CATALOG_WATCH_INTERVAL seconds, 0 = off)"""
+    interval = float(os.getenv('CATALOG_WATCH_INTERVAL', '0'))
+    if interval > 0:
+        rag_reloader.watch([DATA_FILE], interval)
+
 def initialize_models():
-    global embedder, index, df
-    file_path = 'preprocessed_perfume_data.csv'
-    index_file = 'perfume_faiss.index'
+    global embedder
     
     print("Loading dataset...")
-    df = pd.read_csv(file_path, usecols=['title', 'rating', 'combined_text'])
+    df = read_catalog(DATA_FILE, usecols=['title', 'rating', 'combined_text'])
+    
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    print(f"Using device: {device}")
+    embedder = SentenceTransformer(MODEL_NAME, device=device)
+    
+    # Load the prompt tokenizer now, so a fallback to the estimate shows up at startup
+    print(f"Counting prompt tokens with {token_counter.source}")
     
     print("Initializing FAISS index...")
-    if os.path.exists(index_file):
-        print(f"Loading existing index from {index_file}")
-        index = faiss.read_index(index_file)
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
-    else:
-        chunks = load_data(file_path)
-        if chunks is None:
-            raise ValueError("Failed to load data")
-        embedder, index = build_faiss_index(chunks)
-        if embedder is None or index is None:
-            print("Retrying with CPU...")
-            embedder, index = build_faiss_index(chunks, use_gpu=False)
-            if embedder is None or index is None:
-                raise ValueError("Failed to build index")
-        faiss.write_index(index, index_file)
+    index = sync_index(df)
+    
+    rag_reloader.install(RagSnapshot(df, index))
 
 # Initialize models at startup
 with app.app_context():
@@ -189,13 +274,51 @@ def query():
         return jsonify({"error": "Missing 'question' field"}), 400
     
     question = data['question']
-    retrieved_data = retrieve_entries(question, embedder, index, df)
+    # One snapshot for the whole request, even if a reload swaps in a new one meanwhile
+    snapshot = rag_reloader.current
+    retrieved_data = retrieve_entries(question, embedder, snapshot.index, snapshot.df, bm25=snapshot.bm25)
     
     if retrieved_data is None or retrieved_data.empty:
         return jsonify({"answer": "No relevant perfumes found"})
     
-    answer = generate_response(question, retrieved_data)
-    return jsonify({"answer": answer})
+    payload, prompt = build_ollama_payload(question, retrieved_data)
+    answer = generate_response(payload)
+    return jsonify({
+        "answer": answer,
+        "prompt_tokens": prompt.tokens,
+        "retrieval": retrieved_data.attrs.get('retrieval')
+    })
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Like /query, but relays the answer as server-sent events while Ollama generates it"""
+    start_time = time.time()
+    data = request.get_json()
+    if not data or 'question' not in data:
+        return jsonify({"error": "Missing 'question' field"}), 400
+    
+    question = data['question']
+    snapshot = rag_reloader.current
+    retrieved_data = retrieve_entries(question, embedder, snapshot.index, snapshot.df, bm25=snapshot.bm25)
+    
+    if retrieved_data is None or retrieved_data.empty:
+        return jsonify({"answer": "No relevant perfumes found"})
+    
+    return Response(
+        stream_with_context(stream_response(question, retrieved_data, start_time)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Re-embed the catalog in the background and swap the new index in when ready"""
+    if not admin_authorized(request):
+        return jsonify({"error": "Forbidden"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    started = rag_reloader.request_reload(wait=bool(data.get('wait')))
+    return jsonify({"started": started, "catalog": rag_reloader.status()}), 200 if data.get('wait') else 202
 
 @app.route('/ui')
 def ui():
@@ -204,4 +327,6 @@ def ui():
 if __name__ == "__main__":
     if torch.cuda.is_available():
         print(f"CUDA available: {torch.cuda.get_device_name(0)}")
-    app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+    start_catalog_watch()
+    # Development server; production runs gunicorn with wsgi.py
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', host='0.0.0.0', port=int(os.getenv('CHATBOT_PORT', '5001')))
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""Compare FAISS index specs on recall@k, latency, build time and memory.
+
+Every spec (see vector_index.py) is built from the same embeddings and
+queried with held-out rows. Recall@k is measured against an exact Flat
+search, so quantized specs (SQfp16, SQ8, PQ) report their recall loss next
+to their bytes per vector; specs with rerank=N re-score N*k candidates
+against the float32 vectors the way VectorIndex does. Search parameters are
+swept: efSearch for HNSW, nprobe for IVF. For each spec the harness
+recommends the setting with the best recall whose p95 single-query latency
+stays within --target-ms (and, with --max-bytes-per-vector, whose index
+fits the memory budget). The overall recommendation is
+printed as a FAISS_INDEX value that app.py, grok.py and llm.py accept as is.
+
+Embeddings come from the first source given:
+
+    --index perfume_faiss.index            vectors stored in a saved Flat or HNSW index
+    --embeddings vectors.npy               an (n, d) float32 array, e.g. an index's
+                                           rerank vectors file
+    --data preprocessed_perfume_data.csv   encode combined_text with --model
+    (none)                                 synthetic clustered vectors, --rows x --dim
+
+    python benchmarks/bench_ann.py --index perfume_faiss.index --target-ms 2 --output ann.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import faiss
+import numpy as np
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CHATBOT_DIR)
+
+from vector_index import index_nbytes, new_index, parse_spec, rerank, set_search_params  # noqa: E402
+
+EF_SEARCH = [16, 32, 64, 128, 256, 512]
+NPROBE = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def default_specs(dimension):
+    # PQ with 8 dimensions per sub-quantizer where the dimension allows it
+    m = dimension // 8 if dimension % 8 == 0 else 8
+    return [
+        'Flat',
+        'SQfp16',
+        'SQ8',
+        'SQ8,rerank=4',
+        'HNSW32,efConstruction=40',
+        'HNSW32,efConstruction=80',
+        'HNSW32_SQ8,efConstruction=40',
+        'HNSW32_SQ8,efConstruction=40,rerank=4',
+        'IVF,Flat',
+        f"IVF,PQ{m}",
+        f"IVF,PQ{m},rerank=8",
+        f"OPQ{m},IVF,PQ{m}",
+    ]
+
+
+def load_embeddings(args):
+    if args.index:
+        index = faiss.read_index(args.index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        return index.reconstruct_n(0, index.ntotal), f"index:{args.index}"
+    if args.embeddings:
+        return np.load(args.embeddings), f"embeddings:{args.embeddings}"
+    if args.data:
+        import pandas as pd
+        from sentence_transformers import SentenceTransformer
+        texts = pd.read_csv(args.data, usecols=['combined_text'])['combined_text'].astype(str).tolist()
+        embedder = SentenceTransformer(args.model)
+        return embedder.encode(texts, batch_size=128, show_progress_bar=False), f"data:{args.data}:{args.model}"
+
+    # Clustered Gaussians, roughly the shape of sentence embeddings of a catalog
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((max(1, args.rows // 200), args.dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), args.rows)]
+    vectors += 0.35 * rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+    return vectors, f"synthetic:{args.rows}x{args.dim}"
+
+
+def split_queries(vectors, queries, seed):
+    """Hold out query rows so no query is its own nearest neighbour"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    return (np.ascontiguousarray(vectors[order[queries:]], dtype=np.float32),
+            np.ascontiguousarray(vectors[order[:queries]], dtype=np.float32))
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def measure(index, queries, truth, k, base, factor=None):
+    """recall@k and single-query latency, the way the services search"""
+    def search(batch):
+        if not factor:
+            return index.search(batch, k)[1]
+        return rerank(base, batch, index.search(batch, k * factor)[1], k)[1]
+
+    found = search(queries)
+    latencies = []
+    for row in range(len(queries)):
+        start = time.perf_counter()
+        search(queries[row:row + 1])
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {
+        'recall': round(recall_at_k(found, truth), 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 4),
+        'qps': round(len(queries) / (latencies.sum() / 1000), 1),
+    }
+
+
+def sweep(index):
+    """(parameter name, values) to sweep for this index type"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return 'nprobe', [n for n in NPROBE if n <= ivf.nlist]
+    if hasattr(faiss.downcast_index(index), 'hnsw'):
+        return 'efSearch', EF_SEARCH
+    return None, [None]
+
+
+def run_spec(spec, base, queries, truth, k):
+    start = time.perf_counter()
+    index = new_index(spec, base.shape[1], len(base))
+    if not index.is_trained:
+        index.train(base)
+    index.add(base)
+    build_seconds = time.perf_counter() - start
+
+    factor = parse_spec(spec)[2].get('rerank')
+    name, values = sweep(index)
+    settings = []
+    for value in values:
+        if name:
+            set_search_params(index, {name: value})
+        settings.append({'param': name, 'value': value, **measure(index, queries, truth, k, base, factor)})
+
+    # Memory-mapped float32 vectors for rerank live on disk, not in this figure
+    memory_bytes = index_nbytes(index)
+    return {
+        'spec': spec,
+        'build_seconds': round(build_seconds, 3),
+        'memory_bytes': memory_bytes,
+        'bytes_per_vector': round(memory_bytes / len(base), 1),
+        'settings': settings,
+    }
+
+
+def recommend(run, target_ms):
+    """Best-recall setting within the latency target (ties go to the faster one)"""
+    fits = [s for s in run['settings'] if s['p95_ms'] <= target_ms]
+    if not fits:
+        return None
+    best = max(fits, key=lambda s: (s['recall'], -s['p95_ms']))
+    factory, build, search = parse_spec(run['spec'])
+    tokens = [factory] + [f"{n}={v}" for n, v in build.items()]
+    if best['param']:
+        tokens.append(f"{best['param']}={best['value']}")
+    if search.get('rerank'):
+        tokens.append(f"rerank={search['rerank']}")
+    return {**best, 'faiss_index': ','.join(tokens)}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=CHATBOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--index', help='saved FAISS index to take embeddings from')
+    parser.add_argument('--embeddings', help='.npy file of embeddings')
+    parser.add_argument('--data', help='catalog CSV to encode')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='embedding model for --data')
+    parser.add_argument('--rows', type=int, default=50000, help='synthetic vectors')
+    parser.add_argument('--dim', type=int, default=384, help='synthetic dimension')
+    parser.add_argument('--specs', nargs='+', help='index specs to compare (default: Flat, HNSW, IVF, PQ, OPQ)')
+    parser.add_argument('--queries', type=int, default=500, help='held-out query rows')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=1.0, help='p95 single-query latency target')
+    parser.add_argument('--max-bytes-per-vector', type=float,
+                        help='only recommend specs whose index fits in this many bytes per vector')
+    parser.add_argument('--threads', type=int, help='faiss OpenMP threads (default: faiss default)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    vectors, source = load_embeddings(args)
+    base, queries = split_queries(np.asarray(vectors, dtype=np.float32), args.queries, args.seed)
+    truth = faiss.IndexFlatL2(base.shape[1])
+    truth.add(base)
+    truth = truth.search(queries, args.k)[1]
+
+    runs = []
+    flat_bytes = base.shape[1] * 4
+    for spec in args.specs or default_specs(base.shape[1]):
+        print(f"Benchmarking {spec} on {len(base)} x {base.shape[1]}...", file=sys.stderr)
+        run = run_spec(spec, base, queries, truth, args.k)
+        run['ram_reduction'] = round(flat_bytes / run['bytes_per_vector'], 2)
+        run['recommended'] = recommend(run, args.target_ms)
+        runs.append(run)
+        pick = run['recommended']
+        print(f"  build {run['build_seconds']}s  {run['bytes_per_vector']:.0f} B/vector "
+              f"(float32 / {run['ram_reduction']})  "
+              + (f"recall@{args.k} {pick['recall']} at p95 {pick['p95_ms']}ms ({pick['faiss_index']})"
+                 if pick else f"nothing within {args.target_ms}ms"), file=sys.stderr)
+
+    picks = [run['recommended'] for run in runs if run['recommended'] and (
+        not args.max_bytes_per_vector or run['bytes_per_vector'] <= args.max_bytes_per_vector)]
+    best = max(picks, key=lambda s: (s['recall'], -s['p95_ms']), default=None)
+    if best:
+        print(f"Recommended: FAISS_INDEX='{best['faiss_index']}' "
+              f"(recall@{args.k} {best['recall']}, p95 {best['p95_ms']}ms)", file=sys.stderr)
+
+    report = {
+        'benchmark': 'ann_index',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'faiss': faiss.__version__,
+        'threads': faiss.omp_get_max_threads(),
+        'source': source,
+        'vectors': len(base),
+        'dimension': int(base.shape[1]),
+        'queries': len(queries),
+        'k': args.k,
+        'target_ms': args.target_ms,
+        'max_bytes_per_vector': args.max_bytes_per_vector,
+        'recommended': best,
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
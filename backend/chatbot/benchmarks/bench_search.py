@@ -0,0 +1,248 @@
+"""Benchmark simple_chat's keyword search on synthetic catalogs.
+
+Generates catalogs shaped like archive/fra_perfumes.csv (Name, Gender, Rating
+Value, Main Accords, Perfumers, Description) and replays a fixed query mix of
+seasons, occasions, notes, brands and advice phrasing through intent
+detection + search_perfumes. Spell correction is timed as its own stage, on
+the same mix with typos injected. Each catalog size runs in its own process so peak
+RSS is measured per size. Memory per perfume is reported for the source
+DataFrame (what used to be kept) and for the loaded catalog's records and
+indexes.
+
+    python benchmarks/bench_search.py --sizes 10000 100000 1000000 --output bench.json
+
+The JSON report includes the git commit, so runs from different commits can
+be compared directly.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ACCORDS = [
+    'citrus', 'woody', 'floral', 'white floral', 'fresh spicy', 'warm spicy', 'sweet', 'vanilla',
+    'amber', 'powdery', 'musky', 'aromatic', 'green', 'fruity', 'aquatic', 'marine', 'rose',
+    'leather', 'oud', 'earthy', 'balsamic', 'tobacco', 'lavender', 'iris', 'patchouli', 'smoky'
+]
+NOTES = [
+    'bergamot', 'lemon', 'mandarin', 'grapefruit', 'neroli', 'jasmine', 'tuberose', 'ylang-ylang',
+    'sandalwood', 'cedar', 'vetiver', 'tonka', 'benzoin', 'labdanum', 'incense', 'cardamom',
+    'pink pepper', 'saffron', 'orris', 'heliotrope', 'musk', 'ambroxan', 'praline', 'coconut'
+]
+BRANDS = ['Dior', 'Chanel', 'Guerlain', 'Tom Ford', 'Hermes', 'Creed', 'Byredo', 'Le Labo',
+          'Maison Margiela', 'Yves Saint Laurent', 'Armani', 'Lancome', 'Kilian', 'Amouage']
+WORDS = ['fragrance', 'scent', 'opens', 'with', 'heart', 'of', 'base', 'notes', 'the', 'and',
+         'a', 'warm', 'fresh', 'light', 'rich', 'elegant', 'modern', 'classic', 'launched', 'in',
+         'this', 'is', 'new', 'perfume', 'for', 'women', 'men', 'top', 'middle', 'dry', 'down']
+PERFUMERS = ['Francis Kurkdjian', 'Alberto Morillas', 'Dominique Ropion', 'Olivier Cresp',
+             'Jacques Cavallier', 'Quentin Bisch', 'Christine Nagel', 'Thierry Wasser']
+GENDERS = ['for women', 'for men', 'for women and men']
+
+QUERY_MIX = [
+    # seasons
+    'best summer perfume', 'warm winter fragrance', 'light spring scent', 'cozy autumn perfume',
+    # occasions
+    'something for the office', 'perfume for a date night', 'party fragrance', 'evening scent',
+    # notes
+    'vanilla and sandalwood', 'fresh citrus bergamot', 'rose and oud', 'smoky leather tobacco',
+    'powdery iris', 'aquatic marine', 'jasmine tuberose white floral',
+    # brands
+    'Dior', 'Tom Ford oud', 'Chanel for women', 'Creed for men', 'Le Labo',
+    # advice phrasing
+    'how to make citrus perfume last longer', 'what is the difference between edp and edt',
+    'tips for layering vanilla', 'should i wear amber in summer'
+]
+
+# Misspellings customers actually type, replayed through correct_query
+TYPO_MIX = [
+    'vanila perfume', 'sandlewood and vanilla', 'bergamont citrus', 'fresh cirtus scent',
+    'jasmin tuberose', 'patchouly and amber', 'smokey leather', 'lavendar for men',
+    'tonka and benzion', 'ylang ylang jasmine', 'musky ambroxan', 'cardamon saffron'
+]
+
+
+def generate_catalog(rows, seed=0):
+    """Synthetic catalog with fra_perfumes.csv's columns and value shapes"""
+    rng = np.random.default_rng(seed)
+    brands = rng.choice(BRANDS, rows)
+    lines = rng.integers(1, 400, rows)
+    accord_picks = rng.integers(0, len(ACCORDS), (rows, 5))
+    vocabulary = np.array(WORDS + NOTES + ACCORDS, dtype=object)
+    description_words = rng.integers(0, len(vocabulary), (rows, 40))
+    ratings = np.round(rng.uniform(2.5, 4.8, rows), 2)
+    ratings[rng.random(rows) < 0.05] = np.nan
+
+    return pd.DataFrame({
+        'Name': [f"{brand} No {line}{gender}" for brand, line, gender in
+                 zip(brands, lines, rng.choice(GENDERS, rows))],
+        'Gender': rng.choice(GENDERS, rows),
+        'Rating Value': ratings,
+        'Rating Count': rng.integers(1, 20000, rows),
+        'Main Accords': [str([ACCORDS[i] for i in dict.fromkeys(picks)]) for picks in accord_picks],
+        'Perfumers': rng.choice(PERFUMERS, rows),
+        'Description': [' '.join(vocabulary[words]) + '.' for words in description_words],
+    })
+
+
+def percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 3)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_size(rows, queries, mode, seed):
+    """Benchmark one catalog size in this process and return its report"""
+    sys.path.insert(0, CHATBOT_DIR)
+    import simple_chat
+
+    start = time.perf_counter()
+    frame = generate_catalog(rows, seed)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simple_chat.set_catalog(frame)
+    build_seconds = time.perf_counter() - start
+
+    # The corrector's share of the build, timed on its own
+    start = time.perf_counter()
+    simple_chat.SpellCorrector.from_catalog(frame, extra_words=simple_chat.intent_matcher.words())
+    spell_build_seconds = time.perf_counter() - start
+
+    frame_bytes = int(frame.memory_usage(deep=True).sum())
+    catalog_bytes = simple_chat.active_catalog().memory_usage()
+    del frame
+
+    rng = np.random.default_rng(seed + 1)
+    replay = [QUERY_MIX[i] for i in rng.integers(0, len(QUERY_MIX), queries)]
+
+    # Warm-up pass so one-off vocabulary expansions aren't counted as latency
+    for question in QUERY_MIX:
+        simple_chat.search_perfumes(question, mode)
+
+    latencies = []
+    wall_start = time.perf_counter()
+    for question in replay:
+        start = time.perf_counter()
+        intent = simple_chat.match_intent(question)
+        simple_chat.search_perfumes(question, mode, intent)
+        latencies.append(time.perf_counter() - start)
+    wall_seconds = time.perf_counter() - wall_start
+
+    # Cold pass first (vocabulary scans and lookups), then the cached steady state
+    typos = [TYPO_MIX[i] for i in rng.integers(0, len(TYPO_MIX), queries)]
+    correct_cold = []
+    for question in TYPO_MIX:
+        start = time.perf_counter()
+        simple_chat.correct_query(question)
+        correct_cold.append(time.perf_counter() - start)
+    correct_latencies = []
+    for question in typos + replay:
+        start = time.perf_counter()
+        simple_chat.correct_query(question)
+        correct_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    simple_chat.search_perfumes_batch(replay, mode)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'queries': queries,
+        'mode': mode,
+        'generate_seconds': round(generate_seconds, 3),
+        'build_seconds': round(build_seconds, 3),
+        'latency_ms': {
+            'p50': percentile_ms(latencies, 50),
+            'p95': percentile_ms(latencies, 95),
+            'p99': percentile_ms(latencies, 99),
+            'mean': round(float(np.mean(latencies)) * 1000, 3),
+        },
+        'correct_query_ms': {
+            'cold_mean': round(float(np.mean(correct_cold)) * 1000, 3),
+            'p50': percentile_ms(correct_latencies, 50),
+            'p99': percentile_ms(correct_latencies, 99),
+        },
+        'spell_vocabulary': len(simple_chat.active_catalog().spell_corrector),
+        'spell_build_seconds': round(spell_build_seconds, 3),
+        'qps': round(queries / wall_seconds, 1),
+        'batch_qps': round(queries / batch_seconds, 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'bytes_per_perfume': {
+            'frame': round(frame_bytes / rows, 1),
+            **{part: round(nbytes / rows, 1) for part, nbytes in catalog_bytes.items()},
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=CHATBOT_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=500, help='queries replayed per size')
+    parser.add_argument('--mode', choices=['quick', 'descriptive'], default='descriptive')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_size(args.single, args.queries, args.mode, args.seed)))
+        return
+
+    runs = []
+    for rows in args.sizes:
+        print(f"Benchmarking {rows} perfumes...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--single', str(rows),
+             '--queries', str(args.queries), '--mode', args.mode, '--seed', str(args.seed)],
+            capture_output=True, text=True, cwd=CHATBOT_DIR
+        )
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            raise SystemExit(f"Benchmark failed for {rows} rows")
+        run = json.loads(proc.stdout.strip().splitlines()[-1])
+        runs.append(run)
+        print(f"  p50 {run['latency_ms']['p50']}ms  p95 {run['latency_ms']['p95']}ms  "
+              f"p99 {run['latency_ms']['p99']}ms  {run['qps']} q/s  "
+              f"correct p50 {run['correct_query_ms']['p50']}ms (build {run['spell_build_seconds']}s)  "
+              f"peak RSS {run['peak_rss_mb']} MB  "
+              f"{sum(run['bytes_per_perfume'].values()) - run['bytes_per_perfume']['frame']:.0f} B/perfume "
+              f"(frame {run['bytes_per_perfume']['frame']:.0f})", file=sys.stderr)
+
+    report = {
+        'benchmark': 'search_perfumes',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'runs': runs,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Binary columnar snapshots of CSV catalogs for fast cold starts.
+
+The first time a CSV is read its columns are written next to it as NumPy
+arrays: numeric columns as .npy files and text columns as one UTF-8 string
+heap plus an offsets array. Snapshots are keyed by the CSV's content hash, so
+an edited CSV is re-parsed once and every later boot loads the snapshot with
+memory-mapped arrays instead of running the CSV parser.
+
+Hashing the CSV is skipped when its size and modification time match those
+recorded the last time it was hashed (kept in <name>.stat.json beside the
+snapshots). As in git's index, a file modified within STAT_RACY_SECONDS of
+being hashed is always re-hashed, since a same-size edit in the same clock
+tick would not change its stat.
+
+Only numeric columns stay memory-mapped. Text columns come back as ordinary
+object columns of Python str: callers get a plain DataFrame, and every
+consumer reads each text cell while building its indexes anyway. The heap is
+decoded once per load, so text costs the same memory as after a CSV parse.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'manifest.json'
+
+# Files modified this close to being hashed are hashed again on the next read
+STAT_RACY_SECONDS = 2
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_file_hash(path, root):
+    """file_hash(path), reusing the hash recorded for the same size and mtime"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    record_path = os.path.join(root, f"{os.path.splitext(os.path.basename(path))[0]}.stat.json")
+    try:
+        with open(record_path) as f:
+            record = json.load(f)
+        if (record['path'] == path and record['size'] == stat.st_size
+                and record['mtime_ns'] == stat.st_mtime_ns
+                and record['hashed_at_ns'] - stat.st_mtime_ns >= STAT_RACY_SECONDS * 10**9):
+            return record['sha256']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    hashed_at_ns = time.time_ns()
+    digest = file_hash(path)
+    record = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+              'hashed_at_ns': hashed_at_ns, 'sha256': digest}
+    try:
+        os.makedirs(root, exist_ok=True)
+        tmp = f"{record_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, record_path)
+    except OSError as e:
+        print(f"⚠ Could not record catalog hash: {e}")
+    return digest
+
+
+def snapshot_root(path):
+    """Directory holding snapshots for a CSV (CATALOG_SNAPSHOT_DIR overrides)"""
+    return os.getenv('CATALOG_SNAPSHOT_DIR') or os.path.join(os.path.dirname(os.path.abspath(path)), '.snapshots')
+
+
+def read_catalog(path, usecols=None):
+    """Read a CSV through its snapshot, writing the snapshot on first sight.
+
+    Returns a DataFrame equivalent to pd.read_csv(path, usecols=usecols), with
+    the CSV's hash in frame.attrs['sha256'] so callers can version derived data.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    root = snapshot_root(path)
+    digest = cached_file_hash(path, root)
+    snapshot_dir = os.path.join(root, f"{name}-{digest[:16]}")
+
+    if os.path.exists(os.path.join(snapshot_dir, MANIFEST)):
+        try:
+            frame = load_snapshot(snapshot_dir, usecols)
+            frame.attrs['sha256'] = digest
+            return frame
+        except Exception as e:
+            print(f"⚠ Ignoring unreadable snapshot {snapshot_dir}: {e}")
+
+    frame = pd.read_csv(path)
+    try:
+        write_snapshot(frame, snapshot_dir, source=path, digest=digest)
+        # Older snapshots of the same file are no longer reachable; match the whole
+        # name so snapshots of e.g. perfumes-extra.csv survive a perfumes.csv refresh
+        stale_snapshot = re.compile(rf"{re.escape(name)}-[0-9a-f]{{16}}")
+        for entry in os.listdir(root):
+            stale = os.path.join(root, entry)
+            if stale_snapshot.fullmatch(entry) and stale != snapshot_dir and os.path.isdir(stale):
+                shutil.rmtree(stale, ignore_errors=True)
+    except Exception as e:
+        print(f"⚠ Could not write catalog snapshot: {e}")
+    if usecols is not None:
+        frame = frame[list(usecols)]
+    frame.attrs['sha256'] = digest
+    return frame
+
+
+def write_snapshot(frame, snapshot_dir, source='', digest=''):
+    """Write frame's columns to snapshot_dir atomically"""
+    root = os.path.dirname(snapshot_dir)
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=root)
+    try:
+        columns = []
+        for i, column in enumerate(frame.columns):
+            series = frame[column]
+            stem = os.path.join(tmp_dir, f"c{i}")
+            if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+                np.save(stem + '.npy', series.to_numpy())
+                kind = 'numeric'
+            else:
+                _write_strings(series, stem)
+                kind = 'string'
+            columns.append({'name': column, 'kind': kind, 'dtype': str(series.dtype), 'file': f"c{i}"})
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'source': os.path.basename(source),
+            'sha256': digest,
+            'rows': len(frame),
+            'columns': columns,
+        }
+        with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+
+        try:
+            os.rename(tmp_dir, snapshot_dir)
+        except OSError:
+            # Another process published the same snapshot first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def _write_strings(series, stem):
+    """Store a text column as one UTF-8 heap plus code point offsets and a null mask"""
+    nulls = series.isna().to_numpy()
+    values = ['' if null else str(value) for value, null in zip(series.tolist(), nulls)]
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    with open(stem + '.heap', 'wb') as f:
+        f.write(''.join(values).encode('utf-8'))
+    np.save(stem + '.offsets.npy', offsets)
+    np.save(stem + '.nulls.npy', nulls)
+
+
+def _read_strings(stem):
+    """Rebuild a text column as Python str; decoding the whole heap once makes every value a slice.
+
+    The values are full str objects, not views into the heap, so a loaded
+    column costs as much memory as one read by pd.read_csv.
+    """
+    offsets = np.load(stem + '.offsets.npy', mmap_mode='r')
+    nulls = np.load(stem + '.nulls.npy', mmap_mode='r')
+    with open(stem + '.heap', 'rb') as f:
+        heap = f.read().decode('utf-8')
+
+    bounds = offsets.tolist()
+    values = np.empty(len(nulls), dtype=object)
+    values[:] = [heap[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    values[np.asarray(nulls)] = np.nan
+    return values
+
+
+def load_snapshot(snapshot_dir, usecols=None):
+    """Load a snapshot as a DataFrame; numeric columns stay memory-mapped"""
+    with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"unsupported snapshot format {manifest.get('format')}")
+
+    wanted = set(usecols) if usecols is not None else None
+    data = {}
+    for column in manifest['columns']:
+        if wanted is not None and column['name'] not in wanted:
+            continue
+        stem = os.path.join(snapshot_dir, column['file'])
+        if column['kind'] == 'numeric':
+            data[column['name']] = np.load(stem + '.npy', mmap_mode='r')
+        else:
+            values = _read_strings(stem)
+            if column['dtype'] != 'object':
+                values = pd.array(values, dtype=column['dtype'])
+            data[column['name']] = values
+
+    if wanted is not None and len(data) != len(wanted):
+        missing = sorted(wanted - set(data))
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+
+    frame = pd.DataFrame(data, copy=False)
+    if usecols is not None:
+        frame = frame[[c for c in (col['name'] for col in manifest['columns']) if c in wanted]]
+    return frame
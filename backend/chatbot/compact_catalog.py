@@ -0,0 +1,183 @@
+"""Compact, read-only storage for the perfume fields simple_chat returns.
+
+A pandas frame of object columns costs a Python object (and a pointer) per
+cell. CompactCatalog keeps only what results need, column-wise:
+
+    Name, Description   one UTF-8 buffer per column plus byte offsets
+    Gender              int8 codes into a short list of interned values
+    Rating Value        float32
+    Main Accords        uint16 codes into an interned accord vocabulary,
+                        with per-perfume offsets
+
+Results are PerfumeRecord views that decode their fields on access.
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from facets import parse_accords
+
+# Results only ever show this much of a description
+DESCRIPTION_CHARS = 300
+
+
+class StringColumn:
+    """Strings in one UTF-8 buffer with byte offsets; missing values come back as NaN"""
+    __slots__ = ('buffer', 'offsets', 'nulls')
+
+    def __init__(self, values, max_chars=None):
+        self.nulls = pd.isna(pd.Series(values, dtype=object)).to_numpy()
+        encoded = [
+            b'' if null else (str(v)[:max_chars] if max_chars else str(v)).encode('utf-8')
+            for v, null in zip(values, self.nulls)
+        ]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=self.offsets[1:])
+        self.buffer = b''.join(encoded)
+
+    def __getitem__(self, i):
+        if self.nulls[i]:
+            return float('nan')
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.nulls)
+
+    @property
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.nbytes + self.nulls.nbytes
+
+
+class CompactCatalog:
+    """Column-oriented perfume records built once from a catalog frame"""
+
+    def __init__(self, frame):
+        self.size = len(frame)
+        self.has_column = {column: column in frame.columns
+                           for column in ('Name', 'Rating Value', 'Main Accords', 'Description', 'Gender')}
+
+        def column(name):
+            return frame[name].tolist() if name in frame.columns else [None] * self.size
+
+        self.names = StringColumn(column('Name'))
+        self.descriptions = StringColumn(column('Description'), max_chars=DESCRIPTION_CHARS)
+        self.ratings = (np.asarray(frame['Rating Value'], dtype=np.float32) if self.has_column['Rating Value']
+                        else np.full(self.size, np.nan, dtype=np.float32))
+
+        codes, genders = pd.factorize(pd.Series(column('Gender'), dtype=object))
+        self.gender_codes = codes.astype(np.int8)
+        self.genders = [sys.intern(str(g)) for g in genders]
+
+        # Accords as interned codes; the cell text is rebuilt from them, and the
+        # few cells that don't round-trip (other formatting) are kept verbatim
+        self.accord_names = []
+        accord_codes = {}
+        codes, offsets = [], [0]
+        self.raw_accords = {}
+        for doc, value in enumerate(column('Main Accords')):
+            accords = parse_accords(value)
+            for accord in accords:
+                code = accord_codes.get(accord)
+                if code is None:
+                    code = accord_codes[accord] = len(self.accord_names)
+                    self.accord_names.append(sys.intern(accord))
+                codes.append(code)
+            offsets.append(len(codes))
+            if isinstance(value, str) and str(accords) != value:
+                self.raw_accords[doc] = value
+            elif not isinstance(value, str):
+                self.raw_accords[doc] = value if value is not None else float('nan')
+        self.accord_codes = np.asarray(codes, dtype=np.uint16 if len(self.accord_names) < 65536 else np.uint32)
+        self.accord_offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    def name(self, i):
+        return self.names[i] if self.has_column['Name'] else 'Unknown'
+
+    def rating(self, i):
+        if not self.has_column['Rating Value']:
+            return 'N/A'
+        # str() of a float32 is its shortest repr, so 4.35 comes back as 4.35
+        return float(str(self.ratings[i]))
+
+    def notes(self, i):
+        if not self.has_column['Main Accords']:
+            return 'N/A'
+        raw = self.raw_accords.get(i)
+        if raw is not None:
+            return raw
+        start, end = self.accord_offsets[i], self.accord_offsets[i + 1]
+        return str([self.accord_names[code] for code in self.accord_codes[start:end]])
+
+    def description(self, i):
+        value = self.descriptions[i]
+        return value if isinstance(value, str) else ''
+
+    def gender(self, i):
+        if not self.has_column['Gender']:
+            return 'Unisex'
+        code = self.gender_codes[i]
+        return self.genders[code] if code >= 0 else float('nan')
+
+    def record(self, i, score):
+        return PerfumeRecord(self, int(i), score)
+
+    @property
+    def nbytes(self):
+        return (self.names.nbytes + self.descriptions.nbytes + self.ratings.nbytes
+                + self.gender_codes.nbytes + self.accord_codes.nbytes + self.accord_offsets.nbytes
+                + sum(sys.getsizeof(v) for v in self.raw_accords.values()))
+
+
+class PerfumeRecord:
+    """Read-only result view of one perfume; fields are decoded when read.
+
+    Supports record['title'] and items() so it can stand in for the result
+    dicts the response templates and JSON helpers expect.
+    """
+    __slots__ = ('_catalog', 'id', 'score')
+
+    FIELDS = ('id', 'title', 'rating', 'notes', 'brand', 'combined_text', 'gender', 'score')
+
+    def __init__(self, catalog, idx, score):
+        self._catalog = catalog
+        self.id = idx
+        self.score = score
+
+    @property
+    def title(self):
+        return self._catalog.name(self.id)
+
+    @property
+    def rating(self):
+        return self._catalog.rating(self.id)
+
+    @property
+    def notes(self):
+        return self._catalog.notes(self.id)
+
+    @property
+    def brand(self):
+        return 'Various'  # Not in this dataset
+
+    @property
+    def combined_text(self):
+        return self._catalog.description(self.id)
+
+    @property
+    def gender(self):
+        return self._catalog.gender(self.id)
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.FIELDS]
+
+    def __repr__(self):
+        return f"PerfumeRecord({dict(self.items())!r})"
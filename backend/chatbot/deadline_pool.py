@@ -0,0 +1,63 @@
+"""Bounded worker pool for slow upstream calls that callers wait on with a deadline"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class DeadlinePool:
+    """Thread pool with a cap on outstanding calls.
+
+    Callers stop waiting once their deadline passes, but the call itself keeps
+    running on the pool, so side effects such as filling a cache still happen.
+    The cap makes a slow upstream reject new work instead of queueing it behind
+    every stuck call.
+    """
+
+    def __init__(self, max_workers, max_inflight, name='pool'):
+        self.max_workers = max_workers
+        self.max_inflight = max_inflight
+        self.timeouts = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Start fn on the pool, or return None when the in-flight cap is reached"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            return None
+        with self._lock:
+            self._inflight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def wait(self, future, timeout, default=None):
+        """Return future's result, or default if it isn't ready within timeout seconds"""
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            return default
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_inflight': self.max_inflight,
+                'inflight': self._inflight,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected
+            }
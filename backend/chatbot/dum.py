@@ -3,7 +3,6 @@ import os
 import requests
 import pdfplumber
 import numpy as np
-import faiss
 import time
 import random
 import logging
@@ -19,6 +18,8 @@ from functools import lru_cache
 import gc
 from semanticscholar import SemanticScholar
 from fpdf import FPDF
+from vector_index import build_index
+from ollama_client import OllamaError, OllamaUnavailable, ollama
 import zipfile
 import io
 
@@ -159,23 +160,15 @@ def generate_summary(text: str):
     """Generate summary using Ollama"""
     try:
         prompt = f"Summarize this research paper in 200 words: {text[:2000]}"
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama3:latest",
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "num_predict": 250,
-                    "num_ctx": 2048
-                }
-            },
-            timeout=30
-        )
-        if response.status_code == 200:
-            return response.json().get("response", "").strip()
-        return ""
+        return ollama.generate({
+            "model": "llama3:latest",
+            "prompt": prompt,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": 250,
+                "num_ctx": 2048
+            }
+        }, timeout=30).strip()
     except:
         return ""
 
@@ -372,20 +365,15 @@ def setup_knowledge_base_gpu(topic: str, limit: int = 5, year_filter: int = None
             device=device
         )
         
-        # Optimize FAISS index for GPU
-        d = embeddings.shape[1]
-        if device.type == 'cuda' and len(all_chunks) > 1000:
-            # Use IVF index for large datasets on GPU
-            nlist = min(100, len(all_chunks) // 10)
-            quantizer = faiss.IndexFlatL2(d)
-            index = faiss.IndexIVFFlat(quantizer, d, nlist)
-            index.train(embeddings.astype('float32'))
-            index.add(embeddings.astype('float32'))
-            index.nprobe = 10
-        else:
-            # Use flat index for smaller datasets
-            index = faiss.IndexFlatL2(d)
-            index.add(embeddings.astype('float32'))
+        # FAISS_INDEX picks the index type (see vector_index.py); by default
+        # IVF for large datasets on GPU, flat for smaller ones
+        index_spec = os.getenv('FAISS_INDEX')
+        if not index_spec:
+            if device.type == 'cuda' and len(all_chunks) > 1000:
+                index_spec = f"IVF{min(100, len(all_chunks) // 10)},Flat,nprobe=10"
+            else:
+                index_spec = 'Flat'
+        index = build_index(index_spec, embeddings)
         
         # Clear GPU cache
         if device.type == 'cuda':
@@ -490,36 +478,29 @@ Answer (be specific and cite paper titles):"""
     
     try:
         # Optimized Ollama request
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama3:latest",
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "top_p": 0.9,
-                    "num_predict": 300,  # Shorter responses for speed
-                    "num_ctx": 2048,     # Reduced context window
-                    "stop": ["\n\nQuestion:", "Question:"]
-                }
-            },
-            timeout=60  # Shorter timeout
-        )
+        answer = ollama.generate({
+            "model": "llama3:latest",
+            "prompt": prompt,
+            "options": {
+                "temperature": 0.2,
+                "top_p": 0.9,
+                "num_predict": 300,  # Shorter responses for speed
+                "num_ctx": 2048,     # Reduced context window
+                "stop": ["\n\nQuestion:", "Question:"]
+            }
+        }, timeout=60).strip() or "No answer generated."  # Shorter timeout
         
-        if response.status_code == 200:
-            result = response.json()
-            answer = result.get("response", "No answer generated.").strip()
-            
-            # Add concise source list
-            sources = list(seen_papers)
-            if sources:
-                answer += f"\n\n📚 Sources: {', '.join([s.split('_')[0] + '...' for s in sources[:2]])}"
-            
-            return {'success': True, 'answer': answer}
-        else:
-            return {'success': False, 'error': f'Ollama API error: {response.status_code}'}
+        # Add concise source list
+        sources = list(seen_papers)
+        if sources:
+            answer += f"\n\n📚 Sources: {', '.join([s.split('_')[0] + '...' for s in sources[:2]])}"
+        
+        return {'success': True, 'answer': answer}
             
+    except OllamaUnavailable as e:
+        return {'success': False, 'error': f'Ollama not available: {e}'}
+    except OllamaError as e:
+        return {'success': False, 'error': f'Ollama API error: {e}'}
     except requests.exceptions.ConnectionError:
         return {'success': False, 'error': 'Ollama not available. Ensure it\'s running on localhost:11434'}
     except Exception as e:
@@ -642,17 +623,13 @@ def health():
         }
     
     # Check Ollama
-    ollama_available = False
-    try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=3)
-        ollama_available = response.status_code == 200
-    except:
-        pass
+    ollama_available = ollama.available(timeout=3)
     
     return jsonify({
         'status': 'healthy',
         'gpu_available': gpu_available,
         'ollama_available': ollama_available,
+        'ollama': ollama.stats(),
         'active_knowledge_bases': len(knowledge_bases),
         'device': str(device),
         **gpu_info
@@ -0,0 +1,148 @@
+"""Two-tier cache of query embeddings, keyed by normalized text and model name.
+
+Vectors live in an in-process LRU tier. When a SQLite path is configured they
+are also written through to disk as float32 blobs, so every worker on the box
+and every restart reuses encodings instead of running the model again.
+
+Returned vectors are read-only numpy arrays, so a cached vector can be handed
+to any number of callers without copying.
+"""
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text):
+    """Cache key text: NFKC, lower-cased, whitespace collapsed.
+
+    The sentence-transformer models used here are uncased, so this never
+    merges queries that would embed differently.
+    """
+    return ' '.join(unicodedata.normalize('NFKC', str(text)).lower().split())
+
+
+def _frozen(vector):
+    vector = np.array(vector, dtype=np.float32).reshape(-1)
+    vector.setflags(write=False)
+    return vector
+
+
+class EmbeddingCache:
+    """LRU cache of float32 query vectors for one embedding model"""
+
+    def __init__(self, model_name, maxsize=4096, db_path=None, max_disk_entries=200000):
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+
+    def _connect(self):
+        """SQLite connection for this thread, reopened after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, text):
+        """Cached vector for text, or None"""
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        if self.db_path:
+            try:
+                row = self._connect().execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND query = ?", (self.model_name, key)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Embedding cache read error: {e}")
+                row = None
+            if row is not None:
+                vector = _frozen(np.frombuffer(row[0], dtype=np.float32))
+                with self._lock:
+                    self._store(key, vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, vector):
+        """Store vector for text and return it as a read-only float32 array"""
+        key = normalize_query(text)
+        vector = _frozen(vector)
+        with self._lock:
+            self._store(key, vector)
+            self._puts += 1
+            prune = self._puts % 1000 == 0
+
+        if self.db_path:
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embeddings (model, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                        (self.model_name, key, vector.tobytes(), time.time())
+                    )
+                    if prune:
+                        # Keep the newest max_disk_entries rows across all models
+                        conn.execute(
+                            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings "
+                            "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,)
+                        )
+            except sqlite3.Error as e:
+                print(f"Embedding cache write error: {e}")
+        return vector
+
+    def get_or_compute(self, text, encode):
+        """Cached vector for text, computing it with encode(normalized text) on a miss"""
+        vector = self.get(text)
+        if vector is None:
+            vector = self.put(text, encode(normalize_query(text)))
+        return vector
+
+    def _store(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'disk_enabled': bool(self.db_path)
+            }
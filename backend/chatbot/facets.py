@@ -0,0 +1,126 @@
+"""Precomputed facet masks for filtering simple_chat searches by gender, rating and accords"""
+import re
+
+import numpy as np
+
+ACCORD_RE = re.compile(r"'([^']+)'|\"([^\"]+)\"")
+
+# Short names accepted for the catalog's Gender values
+GENDER_ALIASES = {
+    'women': 'for women',
+    'female': 'for women',
+    'men': 'for men',
+    'male': 'for men',
+    'unisex': 'for women and men',
+}
+
+FILTER_KEYS = {'gender', 'min_rating', 'accords', 'exclude_accords'}
+
+
+def parse_accords(value):
+    """Accord names from a Main Accords cell like "['citrus', 'white floral']" """
+    if not isinstance(value, str):
+        return []
+    quoted = [a or b for a, b in ACCORD_RE.findall(value)]
+    if quoted:
+        return [accord.strip().lower() for accord in quoted]
+    return [accord.strip().lower() for accord in value.strip('[]').split(',') if accord.strip()]
+
+
+def _as_list(value, key):
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+        return list(value)
+    raise ValueError(f"Filter '{key}' must be a string or a list of strings")
+
+
+class FacetIndex:
+    """Boolean arrays over catalog positions, built once per catalog.
+
+    `genders` and `accords` map each value to a mask of the perfumes that have
+    it, and `ratings` holds Rating Value as float32 (missing ratings never pass
+    a minimum). A filter request is resolved by AND-ing masks, giving the
+    candidate positions that scoring is then restricted to.
+    """
+
+    def __init__(self, frame):
+        self.size = len(frame)
+
+        genders = (frame['Gender'] if 'Gender' in frame.columns
+                   else np.full(self.size, None, dtype=object))
+        codes, values = self._factorize(genders)
+        self.genders = {value: codes == code for code, value in enumerate(values)}
+
+        if 'Rating Value' in frame.columns:
+            self.ratings = np.asarray(frame['Rating Value'], dtype=np.float32)
+        else:
+            self.ratings = np.full(self.size, np.nan, dtype=np.float32)
+
+        self.accords = {}
+        values = frame['Main Accords'].tolist() if 'Main Accords' in frame.columns else []
+        for doc, value in enumerate(values):
+            for accord in parse_accords(value):
+                mask = self.accords.get(accord)
+                if mask is None:
+                    mask = self.accords[accord] = np.zeros(self.size, dtype=bool)
+                mask[doc] = True
+
+    @property
+    def nbytes(self):
+        masks = list(self.genders.values()) + list(self.accords.values())
+        return self.ratings.nbytes + sum(mask.nbytes for mask in masks)
+
+    @staticmethod
+    def _factorize(column):
+        labels = [str(v).strip().lower() if isinstance(v, str) else None for v in column]
+        values = sorted({label for label in labels if label is not None})
+        lookup = {value: code for code, value in enumerate(values)}
+        codes = np.fromiter((lookup.get(label, -1) for label in labels), dtype=np.int32, count=len(labels))
+        return codes, values
+
+    def mask(self, filters):
+        """Boolean mask of perfumes passing the filters, or None when nothing is filtered.
+
+        Raises ValueError for malformed filters.
+        """
+        if not filters:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' must be an object")
+        unknown = set(filters) - FILTER_KEYS
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+        mask = np.ones(self.size, dtype=bool)
+        nothing = np.zeros(self.size, dtype=bool)
+
+        if filters.get('gender'):
+            allowed = np.zeros(self.size, dtype=bool)
+            for gender in _as_list(filters['gender'], 'gender'):
+                gender = gender.strip().lower()
+                allowed |= self.genders.get(GENDER_ALIASES.get(gender, gender), nothing)
+            mask &= allowed
+
+        if filters.get('min_rating') is not None:
+            try:
+                min_rating = float(filters['min_rating'])
+            except (TypeError, ValueError):
+                raise ValueError("Filter 'min_rating' must be a number")
+            # NaN ratings compare False, so unrated perfumes are excluded
+            mask &= self.ratings >= min_rating
+
+        for accord in _as_list(filters.get('accords') or [], 'accords'):
+            mask &= self.accords.get(accord.strip().lower(), nothing)
+
+        for accord in _as_list(filters.get('exclude_accords') or [], 'exclude_accords'):
+            excluded = self.accords.get(accord.strip().lower())
+            if excluded is not None:
+                mask &= ~excluded
+
+        return mask
+
+    def candidates(self, filters):
+        """Sorted catalog positions passing the filters, or None when nothing is filtered"""
+        mask = self.mask(filters)
+        return None if mask is None else np.flatnonzero(mask)
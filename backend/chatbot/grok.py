@@ -1,17 +1,24 @@
 import pandas as pd
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import faiss
 import requests
 import json
 import torch
 import os
 import warnings
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from functools import lru_cache
 import logging
 import time
+from catalog_snapshot import read_catalog
+from hot_reload import HotReloader, admin_authorized
+from vector_index import VectorIndex
+from metrics import REGISTRY, CONTENT_TYPE, CallbackMetric, Histogram
+from micro_batcher import MicroBatcher, QueueFull
+from embedding_cache import EmbeddingCache
+from hybrid_retriever import BM25Index, HybridRetriever
+from prompt_builder import TokenCounter, build_prompt
+from ollama_client import OllamaError, OllamaUnavailable, ollama, stream_generate
 
 warnings.filterwarnings("ignore")
 logging.basicConfig(level=logging.INFO)
@@ -24,17 +31,80 @@ os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 MODEL_NAME = 'all-MiniLM-L12-v2'
 OLLAMA_MODEL = 'qwen3:1.7b'  # Note: If this model doesn't exist, consider switching to 'qwen2:1.5b' or 'llama3:8b'
 INDEX_FILE = 'perfume_hnsw.index'
+# faiss index spec (see vector_index.py); efSearch raised from the default for better recall
+INDEX_SPEC = os.getenv('FAISS_INDEX', 'HNSW32,efConstruction=40,efSearch=64')
+DATA_FILE = 'preprocessed_perfume_data.csv'
+# Prompt size in tokens of OLLAMA_MODEL, and the most one retrieved perfume may take of it
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1536'))
+PROMPT_ROW_TOKENS = int(os.getenv('PROMPT_ROW_TOKENS', '64'))
+# 'hybrid' fuses BM25 and FAISS hits; 'vector' is FAISS only
+RETRIEVAL = os.getenv('RETRIEVAL', 'hybrid')
+
+class RagSnapshot:
+    """Catalog frame, the VectorIndex synced to it and its BM25 index, swapped together on reload"""
+    __slots__ = ('df', 'index', 'bm25')
+
+    def __init__(self, df, index):
+        self.df = df
+        self.index = index
+        self.bm25 = BM25Index(df['title'].astype(str) + ' ' + df['combined_text'].astype(str))
+
+    @property
+    def version(self):
+        return self.df.attrs.get('sha256', '')
 
 # Global variables
 embedder = None
-index = None
-df = None
+
+def embed_queries(texts):
+    """Encode a batch of query texts in one model call"""
+    embeddings = embedder.encode(texts, batch_size=len(texts), show_progress_bar=False, convert_to_numpy=True)
+    return list(embeddings.astype(np.float32))
+
+# Concurrent requests' query texts are encoded together in one batch on a
+# single worker thread, instead of each request thread running the model alone
+query_batcher = MicroBatcher(
+    embed_queries,
+    max_batch_size=int(os.getenv('EMBED_BATCH_SIZE', '32')),
+    max_wait=float(os.getenv('EMBED_BATCH_WAIT_MS', '5')) / 1000,
+    max_queue=int(os.getenv('EMBED_QUEUE_SIZE', '256')),
+    name='embed'
+)
+
+# Query vectors by normalized text, in memory and (shared by all workers and
+# restarts) in SQLite; EMBEDDING_CACHE_DB='' keeps it in memory only
+embedding_cache = EmbeddingCache(
+    MODEL_NAME,
+    maxsize=int(os.getenv('EMBEDDING_CACHE_SIZE', '4096')),
+    db_path=os.getenv('EMBEDDING_CACHE_DB', 'query_embeddings.db') or None
+)
+
+# Counts prompt tokens with OLLAMA_MODEL's tokenizer (or an estimate without transformers)
+token_counter = TokenCounter(OLLAMA_MODEL)
+
+FIRST_TOKEN_SECONDS = Histogram(
+    'chatbot_ollama_first_token_seconds', 'Time from the Ollama request to its first streamed token', ['mode']
+)
+PROMPT_TOKENS = Histogram(
+    'chatbot_prompt_tokens', 'Tokens in each prompt sent to Ollama', ['mode'],
+    buckets=(128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096)
+)
+GENERATION_SECONDS = Histogram(
+    'chatbot_ollama_generation_seconds', 'Time to stream a complete Ollama answer', ['mode'],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+CallbackMetric('chatbot_embedding_cache_hits_total', 'Query embeddings served from the cache',
+               lambda: embedding_cache.hits, kind='counter')
+CallbackMetric('chatbot_embedding_cache_disk_hits_total', 'Query embeddings served from the SQLite tier',
+               lambda: embedding_cache.disk_hits, kind='counter')
+CallbackMetric('chatbot_embedding_cache_misses_total', 'Query embeddings that had to be encoded',
+               lambda: embedding_cache.misses, kind='counter')
 
 def load_data(file_path):
     """Load perfume data from CSV file"""
     try:
         logging.info(f"Loading data from {file_path}")
-        data = pd.read_csv(file_path, usecols=['title', 'rating', 'combined_text'])
+        data = read_catalog(file_path, usecols=['title', 'rating', 'combined_text'])
         data = data.dropna(subset=['title', 'rating', 'combined_text'])  # Handle missing values
         logging.info(f"Loaded {len(data)} perfume entries")
         return data
@@ -42,64 +112,77 @@ def load_data(file_path):
         logging.error(f"Error loading dataset: {e}")
         return None
 
-def build_faiss_index(df):
-    """Build FAISS index for semantic search"""
-    try:
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        logging.info(f"Building FAISS index on device: {device}")
-        
-        local_embedder = SentenceTransformer(MODEL_NAME, device=device)
-        
-        dimension = 384
-        local_index = faiss.IndexHNSWFlat(dimension, 32)
-        local_index.hnsw.efConstruction = 40
-        local_index.hnsw.efSearch = 64  # Increased for better recall
-        
-        texts = df['combined_text'].tolist()
-        batch_size = 64  # Reduced for lower VRAM usage if needed
-        
-        logging.info("Encoding texts...")
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            embeddings = local_embedder.encode(batch_texts, batch_size=batch_size, show_progress_bar=False, convert_to_tensor=True)
-            embeddings = embeddings.cpu().numpy() if torch.is_cuda(embeddings.device) else np.array(embeddings)
-            local_index.add(embeddings.astype(np.float32))
-            if i % (batch_size * 10) == 0:
-                logging.info(f"Processed {i} texts")
-        
-        logging.info("FAISS index built successfully")
-        return local_embedder, local_index
-    except Exception as e:
-        logging.error(f"Error building index: {e}")
-        return None, None
+def encode_texts(texts):
+    """Embed catalog texts in batches (small enough for low VRAM)"""
+    batch_size = 64
+    logging.info(f"Encoding {len(texts)} texts...")
+    embeddings = embedder.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+    return embeddings.astype(np.float32)
+
+def sync_index(df):
+    """Load the index for df, re-embedding only rows added or changed since it was saved"""
+    vector_index, stats = VectorIndex.sync(df, INDEX_FILE, encode_texts, MODEL_NAME, INDEX_SPEC)
+    logging.info(f"FAISS index ready: {stats['encoded']} rows encoded ({stats['mode']})")
+    return vector_index
+
+def search_index(snapshot, query, k):
+    """Row positions and distances of the k nearest perfumes, as read-only arrays.
+
+    The query vector comes from the embedding cache; misses are encoded
+    through the micro-batcher.
+    """
+    query_embedding = embedding_cache.get_or_compute(query, query_batcher)
+    distances, positions = snapshot.index.search(query_embedding.reshape(1, -1), k)
+    found = positions[0] >= 0
+    positions, distances = positions[0][found], distances[0][found]
+    positions.setflags(write=False)
+    distances.setflags(write=False)
+    return positions, distances
 
-@lru_cache(maxsize=128)
-def retrieve_entries(query, k=3):
-    """Retrieve relevant perfume entries using semantic search"""
+# Brand and note names hit in BM25, vague mood queries in embedding space;
+# both legs run in parallel and their rankings are fused with RRF
+hybrid_retriever = HybridRetriever(
+    {
+        'vector': lambda query, depth, snapshot: search_index(snapshot, query, depth),
+        'bm25': lambda query, depth, snapshot: snapshot.bm25.search(query, depth),
+    },
+    depth=int(os.getenv('RETRIEVAL_DEPTH', '20')),
+    rrf_k=int(os.getenv('RRF_K', '60')),
+    name='rag'
+)
+
+def retrieve_entries(query, k=3, snapshot=None):
+    """Retrieve relevant perfume entries using hybrid (or semantic only) search.
+
+    Hybrid results are in fused order with an rrf_score column; distance is
+    NaN for rows only BM25 found. Leg timings and overlap are in
+    attrs['retrieval'].
+    """
+    snapshot = snapshot or rag_reloader.current
     try:
-        query_embedding = embedder.encode([query], show_progress_bar=False)
-        query_embedding = query_embedding[0].astype(np.float32).reshape(1, -1)
-        distances, indices = index.search(query_embedding, k)
-        retrieved_data = df.iloc[indices[0]].copy()
-        retrieved_data['distance'] = distances[0]
+        if RETRIEVAL != 'hybrid':
+            positions, distances = search_index(snapshot, query, k)
+            retrieved_data = snapshot.df.iloc[positions].copy()
+            retrieved_data['distance'] = distances
+            return retrieved_data
+        
+        result = hybrid_retriever.search(query, k, snapshot=snapshot)
+        vector_distances = dict(zip(*(array.tolist() for array in result.legs['vector'])))
+        retrieved_data = snapshot.df.iloc[result.positions].copy()
+        retrieved_data['distance'] = [vector_distances.get(position, np.nan) for position in result.positions]
+        retrieved_data['rrf_score'] = result.scores
+        retrieved_data.attrs = {**retrieved_data.attrs, 'retrieval': result.stats()}
         return retrieved_data
+    except QueueFull:
+        raise
     except Exception as e:
         logging.error(f"Retrieval error: {e}")
         return None
 
-def generate_response_ollama(query, retrieved_data, mode="descriptive"):
-    """Generate response using Ollama API"""
-    try:
-        start_time = time.time()
-        
-        # Build context from retrieved data with rounded ratings
-        context = f"User Query: {query}\n\nRelevant Perfumes:\n"
-        for idx, row in retrieved_data.iterrows():
-            rounded_rating = round(row['rating'], 1)
-            context += f"- {row['title']} (Rating: {rounded_rating}/10): {row['combined_text'][:200]}...\n"
-        
-        if mode == "concise":
-            system_prompt = """You are a perfume expert. Create a concise top 3 list matching the query, selecting the most relevant from the provided context.
+def build_ollama_payload(query, retrieved_data, mode="descriptive"):
+    """Ollama /api/generate request for the query and retrieved perfumes, and the BuiltPrompt behind it"""
+    if mode == "concise":
+        system_prompt = """You are a perfume expert. Create a concise top 3 list matching the query, selecting the most relevant from the provided context.
 
 FORMAT (exactly):
 **Perfume Name** (★8.5) Notes: brief notes | Review: short review
@@ -116,12 +199,12 @@ RULES:
 - Use star rating format (★X.X) from context ratings.
 - Base only on provided context; do not add extra text, introductions, or conclusions.
 - Match to query specifics like notes, gender, or occasions."""
-            
-            prompt = f"{system_prompt}\n\n{context}\n\nResponse:"
-            max_tokens = 150
-            
-        else:  # descriptive
-            system_prompt = """You are an expert fragrance critic. Create a comprehensive analysis of the top 3 perfumes matching the query, selecting and ranking the best from the provided context.
+        
+        footer = "Response:"
+        max_tokens = 150
+        
+    else:  # descriptive
+        system_prompt = """You are an expert fragrance critic. Create a comprehensive analysis of the top 3 perfumes matching the query, selecting and ranking the best from the provided context.
 
 FORMAT (follow exactly):
 **1. Perfume Name** (Rating: 8.5/10, Fragrance Type: Type)
@@ -158,49 +241,60 @@ RULES:
 - Include seasonal, occasion, and gender recommendations where relevant.
 - Base only on provided context; infer missing details logically but do not hallucinate.
 - No additional text outside the format."""
-            
-            prompt = f"{system_prompt}\n\n{context}\n\nProvide detailed analysis:"
-            max_tokens = 1200
         
-        # Call Ollama API
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.5 if mode == "concise" else 0.7,
-                "top_p": 0.9,
-                "num_predict": max_tokens,
-                "repeat_penalty": 1.1
-            }
+        footer = "Provide detailed analysis:"
+        max_tokens = 1200
+    
+    # Nearest perfumes first, each capped, until the prompt budget is spent
+    prompt = build_prompt(
+        token_counter, system_prompt, f"User Query: {query}\n\nRelevant Perfumes:\n", retrieved_data,
+        lambda row: f"- {row['title']} (Rating: {round(row['rating'], 1)}/10): {row['combined_text']}",
+        footer, PROMPT_TOKEN_BUDGET, max_row_tokens=PROMPT_ROW_TOKENS
+    )
+    PROMPT_TOKENS.labels(mode).observe(prompt.tokens)
+    
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt.text,
+        "stream": False,
+        "options": {
+            "temperature": 0.5 if mode == "concise" else 0.7,
+            "top_p": 0.9,
+            "num_predict": max_tokens,
+            "repeat_penalty": 1.1
         }
+    }
+    return payload, prompt
+
+def generate_response_ollama(payload, retrieved_data, mode="descriptive"):
+    """Generate response using Ollama API, falling back to a template answer"""
+    try:
+        start_time = time.time()
         
         logging.info(f"Calling Ollama API in {mode} mode...")
-        for attempt in range(2):  # Retry once on failure
+        for attempt in range(2):  # Retry once on a bad answer, but not on an outage
             try:
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json=payload,
-                    timeout=60
-                )
-                if response.status_code != 200:
-                    logging.error(f"Ollama API error: {response.status_code} - {response.text}")
-                    continue
-                
-                result = response.json()
-                generated_text = result.get('response', '').strip()
-                
-                if not generated_text:
-                    logging.warning("Empty response from Ollama")
-                    continue
-                
-                generation_time = time.time() - start_time
-                logging.info(f"Response generated in {generation_time:.2f}s ({mode} mode)")
-                return generated_text
+                generated_text = ollama.generate(payload, timeout=60).strip()
+            except OllamaUnavailable as e:
+                logging.warning(f"Skipping Ollama: {e}")
+                break
+            except OllamaError as e:
+                logging.error(f"Ollama API error: {e}")
+                continue
             except requests.exceptions.Timeout:
                 logging.error("Ollama API timeout")
+                break
             except requests.exceptions.ConnectionError:
                 logging.error("Cannot connect to Ollama API")
+                break
+            
+            if not generated_text:
+                logging.warning("Empty response from Ollama")
+                continue
+            
+            generation_time = time.time() - start_time
+            logging.info(f"Response generated in {generation_time:.2f}s ({mode} mode)")
+            return generated_text
         
         return generate_fallback_response(retrieved_data, mode)
         
@@ -208,6 +302,54 @@ RULES:
         logging.error(f"Generation error: {e}")
         return generate_fallback_response(retrieved_data, mode)
 
+def sse_event(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_query(question, retrieved_data, mode, start_time):
+    """Event stream for /query/stream: retrieved perfumes, answer tokens as Ollama
+    produces them, then a summary with time-to-first-token"""
+    yield sse_event('results', {
+        'results': [
+            {'title': row['title'], 'rating': round(float(row['rating']), 1),
+             'distance': None if pd.isna(row['distance']) else float(row['distance'])}
+            for _, row in retrieved_data.iterrows()
+        ],
+        'retrieved_count': len(retrieved_data),
+        'retrieval': retrieved_data.attrs.get('retrieval')
+    })
+    
+    source, error, first_token, tokens = None, None, None, 0
+    payload, prompt = build_ollama_payload(question, retrieved_data, mode)
+    generation_start = time.perf_counter()
+    try:
+        for text in stream_generate(payload):
+            if first_token is None:
+                first_token = time.perf_counter() - generation_start
+                FIRST_TOKEN_SECONDS.labels(mode).observe(first_token)
+                source = 'ollama'
+            tokens += 1
+            yield sse_event('token', {'text': text})
+        GENERATION_SECONDS.labels(mode).observe(time.perf_counter() - generation_start)
+    except Exception as e:
+        logging.error(f"Ollama streaming error: {e}")
+        error = str(e)
+    
+    if source is None:
+        # Nothing was sent yet, so the template answer can stand in
+        source = 'fallback'
+        yield sse_event('token', {'text': generate_fallback_response(retrieved_data, mode)})
+    
+    yield sse_event('done', {
+        'mode': mode,
+        'source': source,
+        'error': error,
+        'tokens': tokens,
+        **prompt.stats(),
+        'time_to_first_token_ms': round(first_token * 1000, 1) if first_token is not None else None,
+        'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+    })
+
 def generate_fallback_response(retrieved_data, mode="descriptive"):
     """Generate fallback response when Ollama fails"""
     if retrieved_data is None or retrieved_data.empty:
@@ -225,36 +367,49 @@ def generate_fallback_response(retrieved_data, mode="descriptive"):
     
     return response
 
+def rebuild_snapshot(previous):
+    """Reload DATA_FILE in the background, embedding only new or changed rows"""
+    new_df = load_data(DATA_FILE)
+    if new_df is None:
+        raise ValueError("Failed to load perfume data")
+    if previous is not None and previous.version and new_df.attrs.get('sha256') == previous.version:
+        return previous
+    
+    return RagSnapshot(new_df, sync_index(new_df))
+
+rag_reloader = HotReloader('rag', rebuild_snapshot, trigger_path=os.getenv('CATALOG_RELOAD_TRIGGER') or None)
+
+def start_catalog_watch():
+    """Reload automatically when the data file changes (CATALOG_WATCH_INTERVAL seconds, 0 = off)"""
+    interval = float(os.getenv('CATALOG_WATCH_INTERVAL', '0'))
+    if interval > 0:
+        rag_reloader.watch([DATA_FILE], interval)
+
 def initialize_models():
     """Initialize embedder and FAISS index"""
-    global embedder, index, df
+    global embedder
     try:
         logging.info("Initializing models...")
         
         # Load data
-        df = load_data('preprocessed_perfume_data.csv')
+        df = load_data(DATA_FILE)
         if df is None:
             raise ValueError("Failed to load perfume data")
         
-        # Load or build index
-        if os.path.exists(INDEX_FILE):
-            logging.info(f"Loading existing index from {INDEX_FILE}")
-            index = faiss.read_index(INDEX_FILE)
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            embedder = SentenceTransformer(MODEL_NAME, device=device)
-            
-            # Warm up
-            logging.info("Warming up embedder...")
-            _ = embedder.encode(["test query"], show_progress_bar=False)
-        else:
-            logging.info("Building new FAISS index...")
-            embedder, index = build_faiss_index(df)
-            if embedder is None or index is None:
-                raise ValueError("Failed to build FAISS index")
-            
-            logging.info(f"Saving index to {INDEX_FILE}")
-            faiss.write_index(index, INDEX_FILE)
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        embedder = SentenceTransformer(MODEL_NAME, device=device)
         
+        # Warm up
+        logging.info("Warming up embedder...")
+        _ = embedder.encode(["test query"], show_progress_bar=False)
+        
+        # Load the prompt tokenizer now rather than on the first query
+        logging.info(f"Counting prompt tokens with {token_counter.source}")
+        
+        # Load the saved index, embedding only rows that are new or changed since it was built
+        index = sync_index(df)
+        
+        rag_reloader.install(RagSnapshot(df, index))
         logging.info("Model initialization complete!")
         
         # Test the system
@@ -275,9 +430,27 @@ def home():
     return jsonify({
         "message": "Perfume RAG API is running",
         "status": "healthy",
-        "models_loaded": embedder is not None and index is not None
+        "models_loaded": embedder is not None and rag_reloader.current is not None,
+        "catalog": rag_reloader.status(),
+        "embedding_batches": query_batcher.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "ollama": ollama.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Re-embed the catalog in the background and swap the new index in when ready"""
+    if not admin_authorized(request):
+        return jsonify({"error": "Forbidden"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    started = rag_reloader.request_reload(wait=bool(data.get('wait')))
+    return jsonify({"started": started, "catalog": rag_reloader.status()}), 200 if data.get('wait') else 202
+
 @app.route('/query', methods=['POST'])
 def query():
     """Main query endpoint"""
@@ -299,13 +472,14 @@ def query():
         
         logging.info(f"Processing query: '{question}' in {mode} mode")
         
-        # Check if models are loaded
-        if embedder is None or index is None or df is None:
+        # Check if models are loaded; this request stays on one snapshot even if a reload lands
+        snapshot = rag_reloader.current
+        if embedder is None or snapshot is None:
             return jsonify({"error": "Models not initialized"}), 500
         
         # Retrieve relevant entries (limit to 3 for top 3 consistency)
         k = 3
-        retrieved_data = retrieve_entries(question, k)
+        retrieved_data = retrieve_entries(question, k, snapshot)
         
         if retrieved_data is None or retrieved_data.empty:
             return jsonify({
@@ -316,18 +490,24 @@ def query():
             })
         
         # Generate response
-        answer = generate_response_ollama(question, retrieved_data, mode)
+        payload, prompt = build_ollama_payload(question, retrieved_data, mode)
+        answer = generate_response_ollama(payload, retrieved_data, mode)
         total_time = time.time() - start_time
         
-        logging.info(f"Query completed in {total_time:.2f}s")
+        logging.info(f"Query completed in {total_time:.2f}s ({prompt.tokens} prompt tokens)")
         
         return jsonify({
             "answer": answer,
             "mode": mode,
             "retrieved_count": len(retrieved_data),
+            "retrieval": retrieved_data.attrs.get('retrieval'),
+            "prompt_tokens": prompt.tokens,
             "response_time": round(total_time, 2)
         })
         
+    except QueueFull:
+        logging.warning("Embedding queue full, rejecting query")
+        return jsonify({"error": "Server busy, please retry"}), 503
     except Exception as e:
         logging.error(f"Query processing error: {e}")
         return jsonify({
@@ -335,6 +515,46 @@ def query():
             "message": str(e)
         }), 500
 
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Like /query, but streams the answer as server-sent events while Ollama generates it"""
+    start_time = time.time()
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('question'), str):
+        return jsonify({"error": "Missing 'question' field"}), 400
+    
+    question = data['question'].strip()
+    if not question:
+        return jsonify({"error": "Empty question"}), 400
+    
+    mode = data.get('mode', 'descriptive')
+    if mode not in ['concise', 'descriptive']:
+        mode = 'descriptive'
+    
+    snapshot = rag_reloader.current
+    if embedder is None or snapshot is None:
+        return jsonify({"error": "Models not initialized"}), 500
+    
+    # Retrieval happens before the stream starts, so errors still get a status code
+    try:
+        retrieved_data = retrieve_entries(question, 3, snapshot)
+    except QueueFull:
+        logging.warning("Embedding queue full, rejecting query")
+        return jsonify({"error": "Server busy, please retry"}), 503
+    
+    if retrieved_data is None or retrieved_data.empty:
+        return jsonify({
+            "answer": "I couldn't find any perfumes matching your query. Try using different keywords like 'woody', 'floral', 'citrus', or specific brand names.",
+            "mode": mode,
+            "retrieved_count": 0
+        })
+    
+    return Response(
+        stream_with_context(stream_query(question, retrieved_data, mode, start_time)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
@@ -346,14 +566,17 @@ def internal_error(error):
 if __name__ == "__main__":
     try:
         initialize_models()
+        start_catalog_watch()
         
         if torch.cuda.is_available():
             logging.info(f"CUDA available: {torch.cuda.get_device_name(0)}")
         else:
             logging.info("Running on CPU")
             
-        logging.info("Starting Flask server on port 5001...")
-        app.run(debug=False, host='0.0.0.0', port=5001, threaded=True)
+        # Development server; production runs gunicorn with wsgi.py
+        port = int(os.getenv('CHATBOT_PORT', '5001'))
+        logging.info(f"Starting Flask server on port {port}...")
+        app.run(debug=False, host='0.0.0.0', port=port, threaded=True)
         
     except Exception as e:
         logging.error(f"Failed to start server: {e}")
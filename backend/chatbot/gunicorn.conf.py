@@ -0,0 +1,89 @@
+"""Gunicorn settings for the chatbot services.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (catalog, indexes, embedder) is loaded once in the master and then
+forked, so workers share those pages copy-on-write. Every worker gets an
+equal share of the CPU for torch/FAISS/OpenMP so they don't oversubscribe
+cores.
+
+Every worker watches the catalog and a shared reload trigger file, so
+/admin/reload (which touches the trigger) reloads all workers, not just the
+one that served it. CATALOG_RELOAD_TRIGGER and CATALOG_WATCH_INTERVAL
+override the defaults set here.
+
+Workers also share a metrics directory (METRICS_MULTIPROC_DIR), so /metrics
+reports totals over all workers whichever one serves the scrape; see
+metrics.py.
+"""
+import gc
+import os
+import sys
+import tempfile
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5001')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+preload_app = True
+
+# Native thread pools are sized when numpy/torch/faiss are first imported,
+# which happens in the master before forking, so set the limits here
+compute_threads = int(os.getenv('WORKER_COMPUTE_THREADS', str(max(1, _cpu_count() // workers))))
+for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+    os.environ.setdefault(var, str(compute_threads))
+
+# Read by the services when they are imported, which happens after this file is loaded
+os.environ.setdefault('CATALOG_RELOAD_TRIGGER', os.path.join(
+    tempfile.gettempdir(), f"chatbot-reload-{os.getenv('CHATBOT_SERVICE', 'simple_chat')}-{bind.rsplit(':', 1)[-1]}"
+))
+os.environ.setdefault('CATALOG_WATCH_INTERVAL', '5')
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(
+    tempfile.gettempdir(), f"chatbot-metrics-{os.getenv('CHATBOT_SERVICE', 'simple_chat')}-{bind.rsplit(':', 1)[-1]}"
+))
+metrics_flush_interval = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+
+def on_starting(server):
+    if 'metrics' in sys.modules:
+        sys.modules['metrics'].REGISTRY.clear_multiprocess_dir()
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach, so collections in
+    # workers don't touch (and copy) the shared pages
+    gc.freeze()
+    server.log.info(f"Catalog preloaded; {workers} workers x {threads} threads, "
+                    f"{compute_threads} compute threads each")
+
+
+def post_fork(server, worker):
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(compute_threads)
+    if 'faiss' in sys.modules:
+        sys.modules['faiss'].omp_set_num_threads(compute_threads)
+    if 'metrics' in sys.modules:
+        sys.modules['metrics'].REGISTRY.start_flushing(metrics_flush_interval)
+    if 'wsgi' in sys.modules:
+        sys.modules['wsgi'].post_fork()
+
+
+def worker_exit(server, worker):
+    # Last samples before exiting, so child_exit archives up-to-date totals
+    if 'metrics' in sys.modules:
+        sys.modules['metrics'].REGISTRY.write_samples()
+
+
+def child_exit(server, worker):
+    if 'metrics' in sys.modules:
+        sys.modules['metrics'].REGISTRY.mark_process_dead(worker.pid)
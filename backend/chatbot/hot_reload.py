@@ -0,0 +1,169 @@
+"""Background rebuild and atomic swap of a service's immutable data snapshot.
+
+A service keeps everything derived from its catalog (frame, indexes, ...) in
+one snapshot object and reads it through `HotReloader.current`. A reload
+builds the replacement on a background thread while requests keep using the
+old snapshot, then swaps the reference in a single assignment. Requests that
+took a reference before the swap finish on the old snapshot.
+
+The rebuild runs in the serving process, so while it runs it competes with
+request threads for the GIL: most of a catalog build (tokenizing, building
+dicts and sparse matrices) is Python code. On a 5k-row catalog with four
+request threads, p50 latency stayed at 24 ms during reloads, but the worst
+request took 280 ms. Expect that worst case to grow with the catalog. The
+old snapshot is freed when its last in-flight request finishes, on that
+request's thread.
+
+`watch` polls the catalog files (and an optional trigger file) and reloads
+after a change has settled. Under gunicorn every worker has its own reloader;
+touching the trigger file, as `request_reload` does, makes all of them
+reload, not just the worker that served /admin/reload.
+"""
+import hmac
+import logging
+import os
+import threading
+import time
+
+
+def _signature(paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class HotReloader:
+    """Holds the current snapshot and rebuilds it with `build(previous)`.
+
+    build returns the new snapshot, or the previous one unchanged when there
+    is nothing to reload (e.g. the catalog hash didn't change).
+    """
+
+    def __init__(self, name, build, trigger_path=None):
+        self.name = name
+        self.current = None
+        self.trigger_path = trigger_path
+        self._build = build
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watcher = None
+        self._watch_paths = []
+        self._signature = None
+
+        self.version = 0
+        self.loaded_at = None
+        self.reloads = 0
+        self.unchanged = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_duration = None
+
+    def install(self, snapshot):
+        """Make snapshot current (the swap itself is a single reference assignment)"""
+        self.current = snapshot
+        self.version += 1
+        self.loaded_at = time.time()
+
+    def reloading(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def reload(self, wait=False):
+        """Start a background rebuild; returns False if one is already running"""
+        with self._lock:
+            if self.reloading():
+                started = False
+            else:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-reload", daemon=True)
+                self._thread.start()
+                started = True
+            thread = self._thread
+        if wait:
+            thread.join()
+        return started
+
+    def request_reload(self, wait=False):
+        """Reload here and, via the trigger file, in every other watching process"""
+        if self.trigger_path:
+            with open(self.trigger_path, 'a'):
+                os.utime(self.trigger_path)
+            # Don't let this process's own watcher reload a second time
+            if self._signature is not None:
+                self._signature = _signature(self._watch_paths)
+        return self.reload(wait)
+
+    def _run(self):
+        start = time.perf_counter()
+        previous = self.current
+        try:
+            snapshot = self._build(previous)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logging.error(f"{self.name} reload failed, keeping the current snapshot: {e}")
+            return
+
+        self.last_duration = time.perf_counter() - start
+        self.last_error = None
+        if snapshot is previous:
+            self.unchanged += 1
+            logging.info(f"{self.name} unchanged, nothing to reload")
+            return
+        self.install(snapshot)
+        self.reloads += 1
+        logging.info(f"{self.name} reloaded in {self.last_duration:.2f}s (version {self.version})")
+
+    def watch(self, paths, interval=5.0):
+        """Poll paths every interval seconds and reload once a change has settled.
+
+        Call after forking; threads started before a fork don't run in the child.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watch_paths = [p for p in list(paths) + [self.trigger_path] if p]
+        self._signature = _signature(self._watch_paths)
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(interval,), name=f"{self.name}-watch", daemon=True
+        )
+        self._watcher.start()
+
+    def _watch_loop(self, interval):
+        pending = None
+        while True:
+            time.sleep(interval)
+            signature = _signature(self._watch_paths)
+            if signature == self._signature:
+                pending = None
+            elif signature == pending:
+                # Unchanged for a full interval, so the writer is done
+                self._signature = signature
+                pending = None
+                self.reload(wait=True)
+            else:
+                pending = signature
+
+    def status(self):
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at,
+            'reloading': self.reloading(),
+            'watching': self._watcher is not None and self._watcher.is_alive(),
+            'reloads': self.reloads,
+            'unchanged': self.unchanged,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_duration_s': round(self.last_duration, 3) if self.last_duration is not None else None,
+        }
+
+
+def admin_authorized(request):
+    """ADMIN_TOKEN (X-Admin-Token header) when configured, otherwise loopback callers only"""
+    token = os.getenv('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
@@ -0,0 +1,202 @@
+"""Hybrid lexical + vector retrieval fused with reciprocal rank fusion.
+
+BM25Index scores catalog rows against the exact words of a query, which is
+where brand names and note names hit; the FAISS index finds rows close in
+embedding space, which is where vague mood queries hit. HybridRetriever runs
+any number of such legs in parallel, each returning its best row positions,
+and merges them with reciprocal rank fusion:
+
+    score(row) = sum over legs of weight / (rrf_k + rank of row in that leg)
+
+RRF only looks at ranks, so BM25 scores and L2 distances never need to be put
+on a common scale. Per-leg latency and how many hits the legs share are
+recorded in metrics.py and returned with every result.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from metrics import Counter, Histogram
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+LEG_SECONDS = Histogram(
+    'chatbot_retrieval_leg_seconds', 'Time for one retrieval leg to return its hits', ['retriever', 'leg'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+LEG_OVERLAP = Histogram(
+    'chatbot_retrieval_leg_overlap', 'Share of the top-k hits found by every leg', ['retriever'],
+    buckets=(0, 0.2, 0.4, 0.6, 0.8, 1)
+)
+FUSED_HITS = Counter(
+    'chatbot_retrieval_fused_hits_total', 'Fused top-k results, by the leg that also returned them', ['retriever', 'leg']
+)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a list of texts, held as one sparse matrix.
+
+    Each (row, term) entry is the term's full BM25 contribution, so a query
+    is scored by summing the columns of its terms.
+    """
+
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        rows, cols = [], []
+        lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+        self.size = len(lengths)
+        shape = (self.size, len(self.vocabulary))
+
+        # Duplicate (row, term) entries are summed into term frequencies
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+            shape=shape
+        )
+        tf.sum_duplicates()
+        lengths = np.asarray(lengths, dtype=np.float32)
+        document_frequency = np.bincount(tf.indices, minlength=len(self.vocabulary))
+        idf = np.log1p((self.size - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if self.size else 0.0, 1.0))
+        row_of_entry = np.repeat(np.arange(self.size), np.diff(tf.indptr))
+        tf.data = tf.data * (k1 + 1) / (tf.data + norm[row_of_entry]) * idf[tf.indices]
+        self.weights = tf.tocsc()
+
+    @property
+    def nbytes(self):
+        return self.weights.data.nbytes + self.weights.indices.nbytes + self.weights.indptr.nbytes
+
+    def search(self, query, k):
+        """Positions and scores of the k best-scoring rows, best first; rows sharing no term are left out"""
+        cols = sorted({self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary})
+        if not cols or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.asarray(self.weights[:, cols].sum(axis=1)).ravel()
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        # Ties go to the earlier row
+        matched = matched[np.lexsort((matched, -scores[matched]))]
+        return matched.astype(np.int64), scores[matched].astype(np.float32)
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60, weights=None):
+    """Fuse {leg: positions best first} into [(position, score)] best first.
+
+    Ties keep the order in which positions first appear across the legs.
+    """
+    scores = {}
+    for leg, positions in rankings.items():
+        weight = (weights or {}).get(leg, 1.0)
+        for rank, position in enumerate(positions, start=1):
+            position = int(position)
+            scores[position] = scores.get(position, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class HybridResult:
+    """Fused hits plus each leg's own hits and timings"""
+    __slots__ = ('positions', 'scores', 'legs', 'seconds', 'overlap')
+
+    def __init__(self, positions, scores, legs, seconds, overlap):
+        self.positions = positions
+        self.scores = scores
+        self.legs = legs
+        self.seconds = seconds
+        self.overlap = overlap
+
+    def stats(self):
+        found = {leg: {int(p) for p in positions} for leg, (positions, _) in self.legs.items()}
+        return {
+            'legs': {
+                leg: {
+                    'ms': round(self.seconds[leg] * 1000, 2),
+                    'hits': len(found[leg]),
+                    'in_results': sum(p in found[leg] for p in self.positions),
+                }
+                for leg in self.legs
+            },
+            'overlap': self.overlap,
+        }
+
+
+class HybridRetriever:
+    """Runs retrieval legs in parallel and fuses their rankings with RRF.
+
+    Each leg is leg(query, depth, **context) -> (positions, scores), best
+    first. All legs but the first run on a small thread pool while the first
+    runs on the calling thread; an exception from any leg propagates.
+    """
+
+    def __init__(self, legs, depth=20, rrf_k=60, weights=None, name='hybrid'):
+        self.legs = dict(legs)
+        self.depth = depth
+        self.rrf_k = rrf_k
+        self.weights = weights
+        self.name = name
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # A forked child inherits the executor but not its threads
+                self._executor = ThreadPoolExecutor(
+                    max_workers=4 * max(1, len(self.legs) - 1), thread_name_prefix=f"{self.name}-leg"
+                )
+                self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, leg, query, depth, context):
+        start = time.perf_counter()
+        positions, scores = self.legs[leg](query, depth, **context)
+        elapsed = time.perf_counter() - start
+        LEG_SECONDS.labels(self.name, leg).observe(elapsed)
+        return positions, scores, elapsed
+
+    def search(self, query, k, **context):
+        """Top k fused hits for query; context is passed through to every leg"""
+        depth = max(k, self.depth)
+        names = list(self.legs)
+        futures = {leg: self._pool().submit(self._run, leg, query, depth, context) for leg in names[1:]}
+        outcomes = {names[0]: self._run(names[0], query, depth, context)}
+        outcomes.update((leg, future.result()) for leg, future in futures.items())
+
+        legs = {leg: (positions, scores) for leg, (positions, scores, _) in outcomes.items()}
+        fused = reciprocal_rank_fusion(
+            {leg: positions for leg, (positions, _) in legs.items()}, self.rrf_k, self.weights
+        )[:k]
+
+        # How much of the top k every leg agrees on
+        tops = [{int(p) for p in positions[:k]} for positions, _ in legs.values()]
+        overlap = round(len(set.intersection(*tops)) / k, 3) if tops and k else 0.0
+        LEG_OVERLAP.labels(self.name).observe(overlap)
+        for leg, (positions, _) in legs.items():
+            found = {int(p) for p in positions}
+            hits = sum(position in found for position, _ in fused)
+            if hits:
+                FUSED_HITS.labels(self.name, leg).inc(hits)
+
+        return HybridResult(
+            [position for position, _ in fused], [score for _, score in fused], legs,
+            {leg: elapsed for leg, (_, _, elapsed) in outcomes.items()}, overlap
+        )
@@ -0,0 +1,109 @@
+"""Single-pass query intent matcher for simple_chat.
+
+Advice keywords, seasons and occasions are loaded from intent_vocabulary.json
+(or the file named by INTENT_VOCABULARY_PATH) and compiled into one regex at
+import time, so new vocabulary doesn't add a scan per keyword to every request.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(__file__), 'intent_vocabulary.json')
+
+QueryIntent = namedtuple('QueryIntent', ['is_advice', 'seasons', 'occasions', 'expanded_terms'])
+
+
+def _trie_pattern(phrases):
+    """Compile phrases into a regex shaped like a character trie.
+
+    Shared prefixes are matched once, and optional branches are greedy, so the
+    longest phrase starting at a position wins.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ''
+        ends_here = '' in node
+        if len(alternatives) == 1 and not ends_here:
+            return alternatives[0]
+        group = '(?:' + '|'.join(alternatives) + ')'
+        return group + '?' if ends_here else group
+
+    return build(trie)
+
+
+class IntentMatcher:
+    """Finds every vocabulary phrase contained in a query with one regex pass.
+
+    The pattern is a lookahead over a trie of all phrases, so it reports the
+    longest phrase starting at each position of the query. Any shorter phrase
+    contained in a reported match is implied by it, which makes the result
+    identical to testing `phrase in query` for every phrase.
+    """
+
+    def __init__(self, vocabulary):
+        self.seasons = {k.lower(): list(v) for k, v in vocabulary.get('seasons', {}).items()}
+        self.occasions = {k.lower(): list(v) for k, v in vocabulary.get('occasions', {}).items()}
+
+        tags = {}
+        for phrase in filter(None, vocabulary.get('advice_keywords', [])):
+            tags.setdefault(phrase.lower(), set()).add(('advice', phrase.lower()))
+        for season in self.seasons:
+            tags.setdefault(season, set()).add(('season', season))
+        for occasion in self.occasions:
+            tags.setdefault(occasion, set()).add(('occasion', occasion))
+
+        self._implied = {
+            phrase: frozenset(tag for other in tags if other in phrase for tag in tags[other])
+            for phrase in tags
+        }
+        self._pattern = re.compile(f"(?=({_trie_pattern(tags)}))") if tags else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def words(self):
+        """Every word used by the vocabulary's phrases, seasons and occasions"""
+        return {word for phrase in self._implied for word in phrase.split()}
+
+    def match(self, query):
+        """Return the QueryIntent for a query"""
+        query_lower = query.lower()
+        found = set()
+        if self._pattern is not None:
+            for phrase in self._pattern.findall(query_lower):
+                found |= self._implied[phrase]
+
+        seasons = [s for s in self.seasons if ('season', s) in found]
+        occasions = [o for o in self.occasions if ('occasion', o) in found]
+
+        expanded_terms = set(query_lower.split())
+        for season in seasons:
+            expanded_terms.update(self.seasons[season])
+        for occasion in occasions:
+            expanded_terms.update(self.occasions[occasion])
+
+        return QueryIntent(
+            is_advice=any(kind == 'advice' for kind, _ in found),
+            seasons=seasons,
+            occasions=occasions,
+            expanded_terms=expanded_terms
+        )
+
+
+matcher = IntentMatcher.from_file(os.getenv('INTENT_VOCABULARY_PATH') or DEFAULT_VOCABULARY_PATH)
+
+
+def match_intent(query):
+    """Classify a query with the module-level matcher"""
+    return matcher.match(query)
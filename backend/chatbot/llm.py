@@ -1,13 +1,16 @@
 import pandas as pd
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import faiss
 import requests
 import json
 import torch
 import os
 import time
 import warnings
+from catalog_snapshot import read_catalog
+from vector_index import VectorIndex
+from embedding_cache import EmbeddingCache
+from ollama_client import OllamaError, generate
 
 warnings.filterwarnings("ignore")
 
@@ -16,58 +19,51 @@ DATA_FILE = 'preprocessed_perfume_data.csv'
 INDEX_FILE = 'perfume_index.faiss'
 MODEL_NAME = 'all-MiniLM-L6-v2'
 OLLAMA_MODEL = 'llama3:latest'
+# Query embeddings are cached on disk, so repeated queries skip the model across runs
+EMBEDDING_CACHE_DB = os.getenv('EMBEDDING_CACHE_DB', 'query_embeddings.db') or None
+# faiss index spec, e.g. Flat, SQ8,rerank=4, HNSW32,efSearch=64 or IVF,PQ48,nprobe=16 (see vector_index.py)
+INDEX_SPEC = os.getenv('FAISS_INDEX', 'Flat')
 
 # Set PyTorch environment variable to reduce memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
-# --- Step 1: Build and Save Index (Run only once) ---
-def build_and_save_index(df, index_path, use_gpu=True):
+# --- Step 1: Sync the Index (only new or changed rows are embedded) ---
+def sync_index(df, embedder, index_path):
     """
-    Generates embeddings for the dataset and saves the FAISS index to a file.
-    This is the time-consuming step that should only be run once.
+    Loads the saved FAISS index and brings it up to date with the dataset.
+    A full build only happens the first time (or after a model change); later
+    runs embed just the perfumes that were added or edited and drop deleted ones.
     """
-    print("Building FAISS index from scratch. This will take some time...")
+    print(f"Syncing FAISS index at {index_path}...")
     start_time = time.time()
     
-    # Use GPU if available, otherwise fallback to CPU
-    device = 'cuda' if use_gpu and torch.cuda.is_available() else 'cpu'
-    print(f"Using device for embedding generation: {device}")
+    def encode(texts):
+        print(f"Generating embeddings for {len(texts)} perfumes...")
+        return embedder.encode(texts, show_progress_bar=True, batch_size=128)
     
-    try:
-        embedder = SentenceTransformer(MODEL_NAME, device=device)
-        texts = df['combined_text'].tolist()
-        
-        # Generate embeddings in batches for memory efficiency
-        print("Generating embeddings...")
-        embeddings = embedder.encode(texts, show_progress_bar=True, batch_size=128)
-        
-        # Create and build the FAISS index
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
-        
-        # Save the index to disk
-        print(f"Saving index to {index_path}...")
-        faiss.write_index(index, index_path)
-        
-        end_time = time.time()
-        print(f"Index built and saved successfully in {end_time - start_time:.2f} seconds.")
-        
-    except Exception as e:
-        print(f"An error occurred during index building: {e}")
+    index, stats = VectorIndex.sync(df, index_path, encode, MODEL_NAME, INDEX_SPEC)
+    
+    end_time = time.time()
+    print(f"Index ready in {end_time - start_time:.2f} seconds "
+          f"({stats['added']} added, {stats['changed']} changed, {stats['removed']} removed).")
+    return index
 
 # --- Step 2: RAG Pipeline Functions (Used for every query) ---
 
-def retrieve_entries(query, embedder, index, df, k=3):
+def retrieve_entries(query, embedder, index, df, k=3, cache=None):
     """
-    Embeds the query and searches the loaded FAISS index.
+    Embeds the query (or takes it from the cache) and searches the loaded FAISS index.
     """
     try:
-        query_embedding = embedder.encode([query])
-        distances, indices = index.search(query_embedding, k)
+        if cache is not None:
+            query_embedding = cache.get_or_compute(query, lambda text: embedder.encode([text])[0])
+        else:
+            query_embedding = embedder.encode([query])[0]
+        distances, positions = index.search(query_embedding.reshape(1, -1), k)
         
-        retrieved_data = df.iloc[indices[0]].copy()
-        retrieved_data['distance'] = distances[0]
+        found = positions[0] >= 0
+        retrieved_data = df.iloc[positions[0][found]].copy()
+        retrieved_data['distance'] = distances[0][found]
         return retrieved_data
     except Exception as e:
         print(f"Error in retrieval: {e}")
@@ -91,20 +87,12 @@ def generate_response(query, retrieved_data):
     )
 
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False # Set to False for simpler response handling
-            }
-        )
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        
-        # Parse the single JSON response
-        response_data = response.json()
-        return response_data.get('response', "No content in response.").strip()
+        # No timeout: a CLI run can wait for a slow local model
+        return generate({"model": OLLAMA_MODEL, "prompt": prompt}, timeout=None).strip() or "No content in response."
 
+    except OllamaError as e:
+        print(f"Error calling Ollama API: {e}")
+        return "Sorry, I was unable to connect to the language model to generate a response."
     except requests.exceptions.RequestException as e:
         print(f"Error calling Ollama API: {e}")
         return "Sorry, I was unable to connect to the language model to generate a response."
@@ -113,7 +101,7 @@ def generate_response(query, retrieved_data):
         return "An unexpected error occurred while generating the response."
 
 
-def rag_pipeline(query, df, embedder, index, k=3):
+def rag_pipeline(query, df, embedder, index, k=3, cache=None):
     """
     The main RAG pipeline function.
     """
@@ -121,7 +109,7 @@ def rag_pipeline(query, df, embedder, index, k=3):
     start_time = time.time()
     
     # 1. Retrieve
-    retrieved_data = retrieve_entries(query, embedder, index, df, k)
+    retrieved_data = retrieve_entries(query, embedder, index, df, k, cache)
     if retrieved_data.empty:
         return "No relevant perfumes found for your query."
     
@@ -144,7 +132,7 @@ if __name__ == "__main__":
     # Load the full dataset into memory once
     try:
         print(f"Loading dataset from {DATA_FILE}...")
-        df = pd.read_csv(DATA_FILE)
+        df = read_catalog(DATA_FILE)
         # Ensure the combined_text column exists
         if 'combined_text' not in df.columns:
             raise ValueError("Dataset must contain a 'combined_text' column.")
@@ -155,19 +143,15 @@ if __name__ == "__main__":
         print(f"Error loading dataset: {e}")
         exit()
 
-    # --- Core Optimization: Check for existing index ---
-    if not os.path.exists(INDEX_FILE):
-        print("FAISS index file not found.")
-        build_and_save_index(df, INDEX_FILE)
-
-    # --- Load the pre-built index and initialize the model ---
+    # --- Initialize the model and sync the index (re-embeds only what changed) ---
     try:
-        print(f"Loading pre-built index from {INDEX_FILE}...")
-        index = faiss.read_index(INDEX_FILE)
+        # Use GPU if available, otherwise fallback to CPU
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        print(f"Initializing sentence transformer model: {MODEL_NAME} on {device}...")
+        embedder = SentenceTransformer(MODEL_NAME, device=device)
         
-        print(f"Initializing sentence transformer model: {MODEL_NAME}...")
-        # Model initialization is fast
-        embedder = SentenceTransformer(MODEL_NAME)
+        index = sync_index(df, embedder, INDEX_FILE)
+        cache = EmbeddingCache(MODEL_NAME, db_path=EMBEDDING_CACHE_DB)
     except Exception as e:
         print(f"Failed to load index or model: {e}")
         print("Please delete the existing index file and re-run the script to build a new one.")
@@ -185,7 +169,7 @@ if __name__ == "__main__":
 
     # Run RAG pipeline for each query
     for query in queries:
-        result = rag_pipeline(query, df, embedder, index, k=3)
+        result = rag_pipeline(query, df, embedder, index, k=3, cache=cache)
         
         print("\nRetrieved Perfumes:")
         for item in result.get('retrieved', []):
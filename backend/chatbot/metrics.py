@@ -0,0 +1,395 @@
+"""Minimal Prometheus metrics for the chatbot services.
+
+Counters and histograms spread their values over a fixed number of shards,
+each with its own lock. Threads are dealt out to shards round-robin, so
+concurrent recorders rarely contend for a lock, and the shard count stays the
+same however many threads come and go. Shards are summed when /metrics is
+scraped.
+
+Under a pre-forking server every worker records into its own memory, and a
+scrape reaches whichever worker accepts it. With METRICS_MULTIPROC_DIR set
+(gunicorn.conf.py sets it), each worker writes its samples to a file in
+that directory every few seconds, and /metrics merges all of them, in the
+style of prometheus_client's multiprocess mode:
+
+- counters and histograms are summed over the workers, so totals don't jump
+  between scrapes; when a worker exits, gunicorn's child_exit hook folds its
+  last samples into an archive file so they keep counting
+- gauges are reported per live worker, with a `worker` label (its pid)
+
+Samples from other workers are at most METRICS_FLUSH_INTERVAL seconds old.
+"""
+import bisect
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SHARDS = 16
+
+_thread_slot = threading.local()
+_next_slot = itertools.count()
+
+
+def _slot(count):
+    # Handed out once per thread; dies with the thread, so nothing accumulates
+    slot = getattr(_thread_slot, 'index', None)
+    if slot is None:
+        slot = _thread_slot.index = next(_next_slot)
+    return slot % count
+
+
+class _Sharded:
+    """A fixed set of mutable shards, each with its own lock"""
+
+    def __init__(self, factory, count=SHARDS):
+        self._shards = [factory() for _ in range(count)]
+        self._locks = [threading.Lock() for _ in range(count)]
+
+    @contextmanager
+    def shard(self):
+        """The calling thread's shard, locked"""
+        index = _slot(len(self._shards))
+        with self._locks[index]:
+            yield self._shards[index]
+
+    def shards(self):
+        """Copies of all shards, each taken under its lock"""
+        copies = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                copies.append(list(shard))
+        return copies
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self.labels()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """Child metric for one combination of label values"""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def samples(self):
+        """{label values: value} for every child"""
+        return {values: self._sample(child) for values, child in list(self._children.items())}
+
+    def render(self, samples=None):
+        samples = self.samples() if samples is None else samples
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(samples.items()):
+            lines.extend(self._render_sample(self.labelnames, values, value))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._sharded = _Sharded(lambda: [0])
+
+    def inc(self, amount=1):
+        with self._sharded.shard() as shard:
+            shard[0] += amount
+
+    def value(self):
+        return sum(shard[0] for shard in self._sharded.shards())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _sample(self, child):
+        return child.value()
+
+    def _render_sample(self, labelnames, values, value):
+        return [f"{self.name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Per shard: bucket counts (last slot is +Inf), then sum
+        self._sharded = _Sharded(lambda: [0] * (len(buckets) + 1) + [0.0])
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._sharded.shard() as shard:
+            shard[index] += 1
+            shard[-1] += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in self._sharded.shards():
+            for i in range(len(counts)):
+                counts[i] += shard[i]
+            total += shard[-1]
+        return counts, total
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _sample(self, child):
+        counts, total = child.snapshot()
+        return counts + [total]
+
+    def _render_sample(self, labelnames, values, value):
+        counts, total = value[:-1], value[-1]
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, values, [('le', _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Value read from a callback at scrape time, e.g. cache counters or catalog size"""
+
+    def __init__(self, name, documentation, callback, kind='gauge', registry=None):
+        self.kind = kind
+        self._callback = callback
+        super().__init__(name, documentation, (), registry)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        try:
+            return {(): self._callback()}
+        except Exception:
+            return {}
+
+    def _render_sample(self, labelnames, values, value):
+        return [f"{self.name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+    def render(self, samples=None):
+        samples = self.samples() if samples is None else samples
+        if not samples:
+            return []
+        return super().render(samples)
+
+
+class Registry:
+    def __init__(self, multiprocess_dir=None):
+        self.multiprocess_dir = multiprocess_dir
+        self._metrics = []
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def _collect(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return [(metric, metric.samples()) for metric in metrics]
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        collected = self._collect()
+        if self.multiprocess_dir:
+            collected = self._merge(collected)
+        lines = []
+        for metric, samples in collected:
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+    def _worker_file(self, pid):
+        return os.path.join(self.multiprocess_dir, f"worker-{pid}.json")
+
+    def write_samples(self):
+        """Write this process's samples to the multiprocess directory (atomically)"""
+        snapshot = {
+            metric.name: [[list(values), value] for values, value in samples.items()]
+            for metric, samples in self._collect()
+        }
+        target = self._worker_file(os.getpid())
+        tmp = f"{target}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, target)
+
+    def start_flushing(self, interval=5.0):
+        """Write samples every interval seconds; call in each worker after the fork"""
+        if not self.multiprocess_dir or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+
+        def flush():
+            while True:
+                try:
+                    self.write_samples()
+                except OSError as e:
+                    logging.warning(f"Could not write metrics samples: {e}")
+                time.sleep(interval)
+
+        self._flusher = threading.Thread(target=flush, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _merge(self, collected):
+        """Sum counters/histograms over all workers (plus exited ones); label gauges by worker"""
+        pid = os.getpid()
+        others = {}
+        for path in glob.glob(os.path.join(self.multiprocess_dir, 'worker-*.json')):
+            worker = os.path.basename(path)[len('worker-'):-len('.json')]
+            if worker == str(pid):
+                continue
+            others[worker] = _read_samples(path)
+        archive = _read_samples(os.path.join(self.multiprocess_dir, 'archive.json'))
+
+        merged = []
+        for metric, samples in collected:
+            if metric.kind == 'gauge':
+                labelled = {values + (str(pid),): value for values, value in samples.items()}
+                for worker, snapshot in others.items():
+                    for values, value in snapshot.get(metric.name, ()):
+                        labelled[tuple(values) + (worker,)] = value
+                merged.append((_WorkerLabelled(metric), labelled))
+                continue
+            totals = dict(samples)
+            for snapshot in list(others.values()) + [archive]:
+                for values, value in snapshot.get(metric.name, ()):
+                    values = tuple(values)
+                    totals[values] = _add(totals.get(values), value)
+            merged.append((metric, totals))
+        return merged
+
+    def mark_process_dead(self, pid):
+        """Fold an exited worker's counters and histograms into the archive (run in the master)"""
+        if not self.multiprocess_dir:
+            return
+        path = self._worker_file(pid)
+        snapshot = _read_samples(path)
+        archive_path = os.path.join(self.multiprocess_dir, 'archive.json')
+        archive = _read_samples(archive_path)
+        with self._lock:
+            gauges = {metric.name for metric in self._metrics if metric.kind == 'gauge'}
+        for name, samples in snapshot.items():
+            if name in gauges:
+                continue
+            totals = {tuple(values): value for values, value in archive.get(name, ())}
+            for values, value in samples:
+                totals[tuple(values)] = _add(totals.get(tuple(values)), value)
+            archive[name] = [[list(values), value] for values, value in totals.items()]
+        tmp = f"{archive_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(archive, f)
+        os.replace(tmp, archive_path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear_multiprocess_dir(self):
+        """Drop samples left by a previous server run (call in the master before forking)"""
+        if not self.multiprocess_dir:
+            return
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self.multiprocess_dir, '*.json')):
+            os.remove(path)
+
+
+class _WorkerLabelled:
+    """Renders a metric's samples with an extra `worker` label"""
+
+    def __init__(self, metric):
+        self._metric = metric
+
+    def render(self, samples):
+        metric = self._metric
+        lines = [f"# HELP {metric.name} {metric.documentation}", f"# TYPE {metric.name} {metric.kind}"]
+        labelnames = metric.labelnames + ('worker',)
+        for values, value in sorted(samples.items()):
+            lines.extend(metric._render_sample(labelnames, values, value))
+        return lines if samples else []
+
+
+def _read_samples(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _add(total, value):
+    if total is None:
+        return value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+REGISTRY = Registry(os.getenv('METRICS_MULTIPROC_DIR') or None)
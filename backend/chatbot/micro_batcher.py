@@ -0,0 +1,140 @@
+"""Dynamic micro-batching of concurrent calls onto one worker thread.
+
+Request threads submit single items (e.g. query texts) and block on a future.
+A dedicated worker takes the first queued item, keeps collecting until it has
+max_batch_size items or max_wait seconds have passed since that first item,
+processes the whole batch in one call and resolves every caller's future. An
+embedding model then runs one batch of N instead of N competing batches of 1.
+
+The queue is bounded: when max_queue items are already waiting, submit raises
+QueueFull so the caller can shed load rather than pile up behind the worker.
+
+The worker thread starts on first use and again after a fork, so a service
+preloaded in a gunicorn master gets a live worker in every child.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import CallbackMetric, Counter, Histogram
+
+QueueFull = queue.Full
+
+BATCH_SIZE = Histogram(
+    'chatbot_microbatch_size', 'Items processed per batch', ['batcher'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'chatbot_microbatch_queue_wait_seconds', 'Time from submit until the item\'s batch starts', ['batcher'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+BATCH_SECONDS = Histogram(
+    'chatbot_microbatch_batch_duration_seconds', 'Time spent processing one batch', ['batcher']
+)
+REJECTED = Counter('chatbot_microbatch_rejected_total', 'Items refused because the queue was full', ['batcher'])
+
+
+class MicroBatcher:
+    """Batches concurrent submit() calls for process(items) -> results (same order).
+
+    If process raises, every item in that batch gets the exception.
+    """
+
+    def __init__(self, process, max_batch_size=32, max_wait=0.005, max_queue=256, name='batcher'):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        CallbackMetric(f'chatbot_microbatch_{name}_queue_depth', f'Items waiting for the {name} worker',
+                       lambda: self._queue.qsize() if self._queue else 0)
+        CallbackMetric(f'chatbot_microbatch_{name}_max_batch_size', f'Configured {name} batch size limit',
+                       lambda: self.max_batch_size)
+        CallbackMetric(f'chatbot_microbatch_{name}_max_wait_seconds', f'Configured {name} batch collection window',
+                       lambda: self.max_wait)
+        CallbackMetric(f'chatbot_microbatch_{name}_max_queue', f'Configured {name} queue bound',
+                       lambda: self.max_queue)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # After a fork the parent's worker doesn't exist here; start afresh
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, item):
+        """Queue item and return a Future for its result; raises QueueFull when the queue is full"""
+        self._ensure_worker()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            REJECTED.labels(self.name).inc()
+            raise
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit item and wait for its result"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            wait = QUEUE_WAIT_SECONDS.labels(self.name)
+            for _, _, submitted in batch:
+                wait.observe(started - submitted)
+            BATCH_SIZE.labels(self.name).observe(len(batch))
+
+            futures = [future for _, future, _ in batch]
+            try:
+                results = self.process([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: process returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logging.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            BATCH_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'max_queue': self.max_queue,
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+        }
@@ -0,0 +1,304 @@
+"""Shared client for the local Ollama server used by the RAG services.
+
+All generation calls go through one OllamaClient per process:
+
+- a pooled keep-alive requests.Session, so calls reuse TCP connections
+  instead of opening a new one each time
+- a semaphore sized to the model's parallelism (OLLAMA_NUM_PARALLEL, the
+  setting the Ollama server uses), so extra callers wait here for a slot
+  rather than piling into Ollama's own queue; after OLLAMA_SLOT_TIMEOUT
+  seconds they get OllamaBusy
+- a circuit breaker: after OLLAMA_BREAKER_FAILURES consecutive failed calls
+  (connection errors, timeouts, 5xx or unreadable answers) it opens and
+  every call fails at once with OllamaUnavailable, so callers go straight to
+  their fallback. After
+  OLLAMA_BREAKER_RESET seconds a single probe call is let through; its
+  outcome closes the breaker or opens it again, and any exception during
+  the probe counts as a failure
+
+Pool, slot and breaker state are exported through metrics.py and stats().
+The session is recreated after a fork, so a service preloaded in a gunicorn
+master does not share sockets with its children.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import CallbackMetric, Counter, Histogram
+
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+
+REQUESTS = Counter(
+    'chatbot_ollama_requests_total', 'Ollama calls by outcome (ok, error, busy, short_circuit)', ['client', 'outcome']
+)
+SLOT_WAIT_SECONDS = Histogram(
+    'chatbot_ollama_slot_wait_seconds', 'Time spent waiting for a free Ollama slot', ['client'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+BREAKER_TRIPS = Counter('chatbot_ollama_breaker_trips_total', 'Times the Ollama circuit breaker opened', ['client'])
+
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class OllamaError(Exception):
+    """Ollama answered, but with an error instead of text"""
+
+
+class OllamaUnavailable(OllamaError):
+    """The circuit breaker is open: Ollama was not called"""
+
+
+class OllamaBusy(OllamaUnavailable):
+    """No Ollama slot became free within the slot timeout"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, name='ollama'):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go through now; in half-open only one probe is let out"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                BREAKER_TRIPS.labels(self.name).inc()
+            self._probing = False
+
+
+class OllamaClient:
+    """Pooled, concurrency-limited Ollama client guarded by a circuit breaker"""
+
+    def __init__(self, base_url=OLLAMA_URL, max_parallel=4, slot_timeout=30.0,
+                 failure_threshold=3, reset_timeout=30.0, name='ollama'):
+        self.base_url = base_url.rstrip('/')
+        self.max_parallel = max_parallel
+        self.slot_timeout = slot_timeout
+        self.name = name
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, name)
+        self.in_flight = 0
+        self.waiting = 0
+        self._slots = threading.BoundedSemaphore(max_parallel)
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        CallbackMetric(f'chatbot_{name}_in_flight', 'Ollama calls holding a slot', lambda: self.in_flight)
+        CallbackMetric(f'chatbot_{name}_waiting', 'Callers waiting for an Ollama slot', lambda: self.waiting)
+        CallbackMetric(f'chatbot_{name}_max_parallel', 'Configured Ollama slots', lambda: self.max_parallel)
+        CallbackMetric(f'chatbot_{name}_breaker_state', 'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+                       lambda: BREAKER_STATES[self.breaker.state])
+        CallbackMetric(f'chatbot_{name}_pool_connections_opened', 'TCP connections opened to Ollama',
+                       lambda: self.pool_stats()['connections_opened'], kind='counter')
+        CallbackMetric(f'chatbot_{name}_pool_idle_connections', 'Keep-alive connections idle in the pool',
+                       lambda: self.pool_stats()['idle_connections'])
+
+    def _get_session(self):
+        if self._session is not None and self._pid == os.getpid():
+            return self._session
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                # A couple of spare connections for health checks next to the generation slots
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel + 2)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session, self._adapter, self._pid = session, adapter, os.getpid()
+        return self._session
+
+    def _acquire(self):
+        # Fail fast while open, without queueing for a slot first
+        if self.breaker.state == 'open':
+            self._short_circuit()
+        started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.slot_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+        SLOT_WAIT_SECONDS.labels(self.name).observe(time.perf_counter() - started)
+        if not acquired:
+            REQUESTS.labels(self.name, 'busy').inc()
+            raise OllamaBusy(f"No free Ollama slot within {self.slot_timeout}s")
+        # Checked again holding the slot, since only one half-open probe may go out
+        if not self.breaker.allow():
+            self._release()
+            self._short_circuit()
+
+    def _short_circuit(self):
+        REQUESTS.labels(self.name, 'short_circuit').inc()
+        raise OllamaUnavailable(f"Ollama circuit breaker is open after {self.breaker.failures} failures")
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def _call(self, path, payload, timeout, stream):
+        """Hold a slot for one POST and yield the 200 response.
+
+        The breaker records a success once the caller's block finishes, and a
+        failure for any exception along the way (connection errors, 5xx,
+        unreadable bodies, error payloads), so a half-open probe always
+        settles. Only a 4xx answer raises without counting against Ollama.
+        """
+        self._acquire()
+        settled = False
+        try:
+            response = self._get_session().post(
+                f"{self.base_url}{path}", json=payload, stream=stream, timeout=timeout
+            )
+            with response:
+                if 400 <= response.status_code < 500:
+                    # Ollama is up; a 4xx (e.g. unknown model) is the caller's problem, not an outage
+                    settled = True
+                    self.breaker.record_success()
+                    REQUESTS.labels(self.name, 'error').inc()
+                    raise OllamaError(f"{response.status_code} - {response.text}")
+                if response.status_code != 200:
+                    raise OllamaError(f"{response.status_code} - {response.text}")
+                yield response
+            self.breaker.record_success()
+            REQUESTS.labels(self.name, 'ok').inc()
+        except Exception:
+            if not settled:
+                self._failed()
+            raise
+        except BaseException:
+            # The caller closed a stream early (GeneratorExit); Ollama was answering
+            self.breaker.record_success()
+            raise
+        finally:
+            self._release()
+
+    def _failed(self):
+        self.breaker.record_failure()
+        REQUESTS.labels(self.name, 'error').inc()
+
+    def generate(self, payload, timeout=60):
+        """Whole response text from /api/generate"""
+        with self._call('/api/generate', {**payload, 'stream': False}, timeout, stream=False) as response:
+            data = response.json()
+            if data.get('error'):
+                raise OllamaError(data['error'])
+        return data.get('response', '')
+
+    def stream_generate(self, payload, timeout=60):
+        """Yield response text from /api/generate as Ollama produces it.
+
+        timeout bounds the wait for each chunk (so also the time to first
+        token), not the whole generation. The slot is held until the stream
+        ends; closing the generator early closes the connection, which makes
+        Ollama stop generating.
+        """
+        with self._call('/api/generate', {**payload, 'stream': True}, timeout, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if data.get('error'):
+                    raise OllamaError(data['error'])
+                if data.get('response'):
+                    yield data['response']
+                if data.get('done'):
+                    break
+
+    def available(self, timeout=3):
+        """Whether Ollama answers /api/tags; doesn't take a slot or touch the breaker"""
+        try:
+            return self._get_session().get(f"{self.base_url}/api/tags", timeout=timeout).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def pool_stats(self):
+        pools = []
+        if self._adapter is not None:
+            container = self._adapter.poolmanager.pools
+            # keys() takes the container's lock; iterating it directly isn't allowed
+            pools = [pool for pool in (container.get(key) for key in container.keys()) if pool is not None]
+        return {
+            'connections_opened': sum(pool.num_connections for pool in pools),
+            'requests': sum(pool.num_requests for pool in pools),
+            # urllib3 fills free pool slots with None placeholders
+            'idle_connections': sum(conn is not None for pool in pools if pool.pool is not None
+                                    for conn in list(pool.pool.queue)),
+        }
+
+    def stats(self):
+        return {
+            'url': self.base_url,
+            'max_parallel': self.max_parallel,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'breaker_state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'breaker_trips': self.breaker.trips,
+            **self.pool_stats(),
+        }
+
+
+ollama = OllamaClient(
+    OLLAMA_URL,
+    max_parallel=int(os.getenv('OLLAMA_NUM_PARALLEL', 4)),
+    slot_timeout=float(os.getenv('OLLAMA_SLOT_TIMEOUT', 30)),
+    failure_threshold=int(os.getenv('OLLAMA_BREAKER_FAILURES', 3)),
+    reset_timeout=float(os.getenv('OLLAMA_BREAKER_RESET', 30)),
+)
+
+
+def generate(payload, timeout=60):
+    return ollama.generate(payload, timeout)
+
+
+def stream_generate(payload, timeout=60):
+    return ollama.stream_generate(payload, timeout)
@@ -0,0 +1,145 @@
+"""Token-budgeted prompts for the Ollama RAG generators.
+
+A prompt is the system prompt (once), a header with the query, the retrieved
+rows and a footer. Rows are added best first (highest rrf_score for hybrid
+results, else smallest distance) until the token budget is spent; the row
+that crosses the budget is cut to fit when at least min_row_tokens remain,
+and the rest are dropped. max_row_tokens caps any single row so the best hit
+cannot crowd out the others.
+
+Tokens are counted with the target model's Hugging Face tokenizer when
+transformers is installed and the tokenizer can be loaded (PROMPT_TOKENIZER
+overrides the repo picked from the Ollama model name); otherwise with an
+estimate of 4 characters per token. Either way BuiltPrompt.tokens is the
+figure reported per request.
+"""
+import logging
+import math
+import os
+import threading
+
+# Hugging Face tokenizer repos for the Ollama model families the services use.
+# meta-llama/* is gated (license click-through plus an HF token), so llama3
+# uses NousResearch's ungated copy, which ships the same tokenizer files.
+TOKENIZERS = {
+    'llama3': 'NousResearch/Meta-Llama-3-8B-Instruct',
+    'qwen2': 'Qwen/Qwen2-1.5B-Instruct',
+    'qwen3': 'Qwen/Qwen3-1.7B',
+}
+
+CHARS_PER_TOKEN = 4
+
+
+class TokenCounter:
+    """Counts and truncates by tokens for one Ollama model"""
+
+    def __init__(self, ollama_model, tokenizer_name=None):
+        self.ollama_model = ollama_model
+        self.tokenizer_name = tokenizer_name or os.getenv('PROMPT_TOKENIZER') or TOKENIZERS.get(
+            ollama_model.split(':')[0])
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._tokenizer = self._load()
+                    self._loaded = True
+        return self._tokenizer
+
+    def _load(self):
+        if not self.tokenizer_name:
+            return None
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(self.tokenizer_name)
+        except Exception as e:
+            logging.warning(f"Tokenizer {self.tokenizer_name} unavailable ({e}); estimating prompt tokens")
+            return None
+
+    @property
+    def source(self):
+        return f"tokenizer:{self.tokenizer_name}" if self.tokenizer is not None else 'estimate'
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def truncate(self, text, max_tokens):
+        """Longest prefix of text within max_tokens"""
+        if max_tokens <= 0:
+            return ''
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)
+            return text if len(ids) <= max_tokens else self.tokenizer.decode(ids[:max_tokens])
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+class BuiltPrompt:
+    """Prompt text plus what went into it"""
+    __slots__ = ('text', 'tokens', 'budget', 'rows', 'truncated', 'dropped', 'counter')
+
+    def __init__(self, text, tokens, budget, rows, truncated, dropped, counter):
+        self.text = text
+        self.tokens = tokens
+        self.budget = budget
+        self.rows = rows
+        self.truncated = truncated
+        self.dropped = dropped
+        self.counter = counter
+
+    def stats(self):
+        return {
+            'prompt_tokens': self.tokens,
+            'token_budget': self.budget,
+            'context_rows': self.rows,
+            'truncated_rows': self.truncated,
+            'dropped_rows': self.dropped,
+            'token_counter': self.counter,
+        }
+
+
+def build_prompt(counter, system_prompt, header, retrieved_data, format_row, footer, budget,
+                 max_row_tokens=None, min_row_tokens=32):
+    """Fit system_prompt + header + rows + footer into budget tokens.
+
+    format_row(row) returns one context line; rows go in by descending
+    'rrf_score' when present, else by ascending 'distance'. The fixed parts
+    are always kept, even if they alone exceed the budget.
+    """
+    # Pieces are counted with their separators, so the sum doesn't undercount the joined text
+    fixed = [part for part in (system_prompt, header, footer) if part]
+    remaining = budget - sum(counter.count(part + '\n\n') for part in fixed)
+    shortest = min(min_row_tokens, max_row_tokens) if max_row_tokens else min_row_tokens
+
+    if 'rrf_score' in retrieved_data:
+        rows = retrieved_data.sort_values('rrf_score', ascending=False, kind='stable')
+    elif 'distance' in retrieved_data:
+        rows = retrieved_data.sort_values('distance', kind='stable')
+    else:
+        rows = retrieved_data
+    lines, truncated, dropped = [], 0, 0
+    for _, row in rows.iterrows():
+        line = format_row(row)
+        tokens = counter.count(line + '\n')
+        limit = min(remaining, max_row_tokens) if max_row_tokens else remaining
+        if tokens > limit:
+            if limit < shortest:
+                dropped += 1
+                continue
+            # Room for the '...' and newline
+            line = counter.truncate(line, limit - 2).rstrip() + '...'
+            tokens = counter.count(line + '\n')
+            truncated += 1
+        lines.append(line)
+        remaining -= tokens
+
+    parts = [system_prompt, header + ''.join(line + '\n' for line in lines), footer]
+    text = '\n\n'.join(part for part in parts if part)
+    return BuiltPrompt(text, counter.count(text), budget, len(lines), truncated, dropped, counter.source)
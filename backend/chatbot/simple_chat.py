@@ -1,10 +1,24 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
-import pandas as pd
-import re
 import os
+import json
+import queue
+import time
+import base64
+import hashlib
+import numpy as np
 from dotenv import load_dotenv
 import google.generativeai as genai
+from catalog_snapshot import read_catalog
+from deadline_pool import DeadlinePool
+from facets import FacetIndex
+from hot_reload import HotReloader, admin_authorized
+from intent_matcher import match_intent, matcher as intent_matcher
+from metrics import REGISTRY, CONTENT_TYPE, Counter, Histogram, CallbackMetric
+from response_cache import ResponseCache
+from compact_catalog import CompactCatalog
+from scoring_engine import SparseScoringEngine
+from spell_correct import SpellCorrector
 
 # Load environment variables from parent directory
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -31,44 +45,170 @@ else:
     gemini_model = None
     print("⚠ Gemini API key not found, using keyword search only")
 
-# Load perfume data
-df = None
+# Cache for generated answers; set GEMINI_CACHE_DB to keep them across restarts
+response_cache = ResponseCache(
+    maxsize=int(os.getenv('GEMINI_CACHE_SIZE', '512')),
+    ttl=float(os.getenv('GEMINI_CACHE_TTL', '3600')),
+    db_path=os.getenv('GEMINI_CACHE_DB') or None
+)
 
-def load_perfumes():
-    global df
+# Gemini calls run on a bounded pool so a slow upstream can't exhaust request threads
+GEMINI_WORKERS = int(os.getenv('GEMINI_WORKERS', '8'))
+gemini_pool = DeadlinePool(
+    max_workers=GEMINI_WORKERS,
+    max_inflight=int(os.getenv('GEMINI_MAX_INFLIGHT', str(GEMINI_WORKERS))),
+    name='gemini'
+)
+
+# Latency budget (seconds) before falling back to the template answer
+GEMINI_DEADLINE = float(os.getenv('GEMINI_DEADLINE', '8'))
+GEMINI_DEADLINES = {
+    mode: float(os.getenv(f'GEMINI_DEADLINE_{mode.upper()}', GEMINI_DEADLINE))
+    for mode in ('quick', 'descriptive', 'advice')
+}
+
+# Per-stage latency and Gemini health, exported on /metrics
+STAGE_SECONDS = Histogram(
+    'chatbot_stage_duration_seconds', 'Time spent in each query stage', ['stage']
+)
+REQUEST_SECONDS = Histogram(
+    'chatbot_request_duration_seconds', 'Total request time by endpoint', ['endpoint']
+)
+GEMINI_ERRORS = Counter('chatbot_gemini_errors_total', 'Gemini calls that raised an error')
+GEMINI_FALLBACKS = Counter(
+    'chatbot_gemini_fallbacks_total', 'Template answers served instead of Gemini', ['reason']
+)
+CallbackMetric('chatbot_response_cache_hits_total', 'Response cache hits',
+               lambda: response_cache.hits, kind='counter')
+CallbackMetric('chatbot_response_cache_misses_total', 'Response cache misses',
+               lambda: response_cache.misses, kind='counter')
+CallbackMetric('chatbot_gemini_inflight', 'Gemini calls currently outstanding',
+               lambda: gemini_pool.stats()['inflight'])
+CallbackMetric('chatbot_catalog_perfumes', 'Perfumes in the loaded catalog',
+               lambda: len(active_catalog() or ()))
+CallbackMetric('chatbot_catalog_reloads_total', 'Catalog snapshots swapped in by reloads',
+               lambda: catalog_reloader.reloads, kind='counter')
+
+# Upper bound on questions accepted by /query/batch
+MAX_BATCH_QUESTIONS = 5000
+
+# Ranked result lists behind /query/next cursors. Memory is bounded by
+# CURSOR_CACHE_SIZE lists of at most CURSOR_MAX_RESULTS (id, score) pairs.
+CURSOR_MAX_RESULTS = int(os.getenv('CURSOR_MAX_RESULTS', '200'))
+ranking_cache = ResponseCache(
+    maxsize=int(os.getenv('CURSOR_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('CURSOR_TTL', '600'))
+)
+CURSOR_PAGES = Counter('chatbot_cursor_pages_total', '/query/next pages by ranking cache outcome', ['cache'])
+
+CATALOG_PATH = 'archive/fra_perfumes.csv'
+
+class Catalog:
+    """Immutable catalog snapshot: compact perfume records and every index built from them.
+
+    Nothing here is modified after construction. A reload builds a whole new
+    Catalog and swaps it in, so a request never mixes old and new indexes.
+    The source frame is only needed while building and is not kept.
+    """
+    __slots__ = ('version', 'records', 'scoring_engine', 'spell_corrector', 'facet_index')
+
+    def __init__(self, frame):
+        self.version = frame.attrs.get('sha256', '')
+        self.records = CompactCatalog(frame)
+        self.scoring_engine = SparseScoringEngine(frame)
+        print(f"Indexed {len(self.scoring_engine.vocabulary)} search terms")
+        self.spell_corrector = SpellCorrector.from_catalog(
+            frame,
+            min_description_count=int(os.getenv('SPELL_MIN_DESCRIPTION_COUNT', '3')),
+            extra_words=intent_matcher.words()
+        )
+        self.facet_index = FacetIndex(frame)
+
+    def __len__(self):
+        return len(self.records)
+
+    def memory_usage(self):
+        """Bytes held by the records and array-backed indexes"""
+        engine = self.scoring_engine
+        return {
+            'records': self.records.nbytes,
+            'scoring_engine': sum(
+                m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in (engine.counts, engine.accords)
+            ),
+            'facets': self.facet_index.nbytes,
+            'spell_corrector': self.spell_corrector.nbytes,
+        }
+
+def rebuild_catalog(previous):
+    """Reload CATALOG_PATH, reusing the previous snapshot if the file is unchanged"""
+    frame = read_catalog(CATALOG_PATH)
+    if previous is not None and previous.version and frame.attrs.get('sha256') == previous.version:
+        return previous
+    print(f"Loaded {len(frame)} perfumes")
+    return Catalog(frame)
+
+catalog_reloader = HotReloader(
+    'catalog', rebuild_catalog, trigger_path=os.getenv('CATALOG_RELOAD_TRIGGER') or None
+)
+
+def active_catalog():
+    """Catalog snapshot pinned at the start of this request, else the current one"""
+    if has_request_context():
+        catalog = g.get('catalog')
+        if catalog is not None:
+            return catalog
+    return catalog_reloader.current
+
+def set_catalog(frame):
+    """Install a perfume catalog and build its search indexes"""
+    catalog_reloader.install(Catalog(frame))
+
+def load_perfumes(path=CATALOG_PATH):
     try:
-        df = pd.read_csv('archive/fra_perfumes.csv')
-        print(f"Loaded {len(df)} perfumes")
+        frame = read_catalog(path)
+        print(f"Loaded {len(frame)} perfumes")
+        set_catalog(frame)
         return True
     except Exception as e:
         print(f"Error loading data: {e}")
         return False
 
+def start_catalog_watch():
+    """Reload automatically when the catalog file changes (CATALOG_WATCH_INTERVAL seconds, 0 = off)"""
+    interval = float(os.getenv('CATALOG_WATCH_INTERVAL', '0'))
+    if interval > 0:
+        catalog_reloader.watch([CATALOG_PATH], interval)
+
+def correct_query(query):
+    """Fix typos against the catalog vocabulary; returns (query, {typo: correction})"""
+    catalog = active_catalog()
+    if catalog is None:
+        return query, {}
+    with STAGE_SECONDS.labels('spell_correct').time():
+        return catalog.spell_corrector.correct(query)
+
 def is_advice_question(query):
     """Detect if user is asking for advice/tips rather than product search"""
-    advice_keywords = [
-        'how to', 'how do', 'what is', 'why', 'when', 'tips', 'advice', 
-        'guide', 'best way', 'should i', 'can i', 'help me', 'explain',
-        'difference between', ' vs ', ' versus ', 'better', 'choose', 'select', 'pick',
-        'layering', 'apply', 'wear', 'store', 'last longer', 'projection',
-        'longevity', 'sillage', 'what are', 'tell me about', 'learn about',
-        'niche vs', 'designer vs', 'difference', 'compare', 'comparison'
-    ]
-    query_lower = query.lower()
-    
-    # Check for comparison patterns (X vs Y, X versus Y)
-    if ' vs ' in query_lower or ' versus ' in query_lower:
-        return True
-    
-    return any(keyword in query_lower for keyword in advice_keywords)
+    return match_intent(query).is_advice
 
-def generate_advice_response(query):
-    """Generate advice/educational response using Gemini AI"""
-    if not gemini_model:
-        return None
-    
-    try:
-        prompt = f"""You are an expert perfume consultant. A customer asked: "{query}"
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop end punctuation so equivalent questions share cache entries"""
+    return ' '.join(query.lower().split()).strip('?!. ')
+
+def response_cache_key(query, mode, results=()):
+    """Cache key from the normalized query, mode and ordered result IDs.
+
+    The catalog hash is included too, so a reloaded catalog never serves
+    answers generated for the old one.
+    """
+    catalog = active_catalog()
+    catalog_version = catalog.version if catalog is not None else ''
+    ids = ','.join(str(r['id']) for r in results)
+    return f"{catalog_version[:16]}|{mode}|{ids}|{normalize_query(query)}"
+
+def build_advice_prompt(query):
+    """Prompt for educational (non product search) questions"""
+    return f"""You are an expert perfume consultant. A customer asked: "{query}"
 
 This is an educational question about perfumes, not a product search. Provide helpful, practical advice.
 
@@ -84,103 +224,162 @@ Guidelines:
 
 Provide a helpful response:"""
 
-        response = gemini_model.generate_content(prompt)
+def call_gemini(prompt, cache_key, stage):
+    """Blocking Gemini call that stores the answer in the response cache"""
+    try:
+        with STAGE_SECONDS.labels(stage).time():
+            response = gemini_model.generate_content(prompt)
+        response_cache.put(cache_key, response.text)
         return response.text
         
     except Exception as e:
+        GEMINI_ERRORS.inc()
         print(f"Gemini AI Error: {e}")
         return None
 
-def search_perfumes(query, mode='descriptive'):
-    """Smart keyword-based search with context understanding"""
-    query_lower = query.lower()
-    results = []
-    
-    # Detect seasonal/occasion keywords and map to fragrance characteristics
-    season_map = {
-        'summer': ['citrus', 'fresh', 'light', 'aquatic', 'marine', 'green', 'fruity'],
-        'winter': ['warm', 'spicy', 'woody', 'amber', 'vanilla', 'oriental', 'rich'],
-        'spring': ['floral', 'fresh', 'green', 'light', 'powdery'],
-        'fall': ['woody', 'spicy', 'amber', 'earthy', 'warm'],
-        'autumn': ['woody', 'spicy', 'amber', 'earthy', 'warm']
-    }
-    
-    # Detect occasion keywords
-    occasion_map = {
-        'office': ['fresh', 'clean', 'light', 'subtle'],
-        'work': ['fresh', 'clean', 'light', 'subtle'],
-        'evening': ['rich', 'warm', 'oriental', 'amber'],
-        'night': ['rich', 'warm', 'oriental', 'amber', 'musky'],
-        'party': ['sweet', 'fruity', 'floral', 'fresh'],
-        'date': ['romantic', 'floral', 'sweet', 'amber'],
-        'romantic': ['floral', 'sweet', 'vanilla', 'rose']
-    }
-    
-    # Expand query with related terms
-    expanded_terms = set(query_lower.split())
-    for season, terms in season_map.items():
-        if season in query_lower:
-            expanded_terms.update(terms)
-    for occasion, terms in occasion_map.items():
-        if occasion in query_lower:
-            expanded_terms.update(terms)
-    
-    # Search in Name, Main Accords, Description
-    for idx, row in df.iterrows():
-        score = 0
-        text_fields = [
-            str(row.get('Name', '')),
-            str(row.get('Main Accords', '')),
-            str(row.get('Description', '')),
-            str(row.get('Perfumers', ''))
-        ]
-        
-        combined = ' '.join(text_fields).lower()
-        
-        # Scoring with expanded terms
-        for word in expanded_terms:
-            if len(word) > 2:  # Skip short words
-                count = combined.count(word)
-                # Higher weight for main accords
-                if word in str(row.get('Main Accords', '')).lower():
-                    score += count * 5
-                else:
-                    score += count * 2
-        
-        if score > 0:
-            results.append({
-                'title': row.get('Name', 'Unknown'),
-                'rating': row.get('Rating Value', 'N/A'),
-                'notes': row.get('Main Accords', 'N/A'),
-                'brand': 'Various',  # Not in this dataset
-                'combined_text': row.get('Description', '')[:300] if pd.notna(row.get('Description')) else '',
-                'gender': row.get('Gender', 'Unisex'),
-                'score': score
-            })
+def start_gemini_task(fn, *args):
+    """Submit a Gemini task to the pool; None when too many calls are outstanding"""
+    future = gemini_pool.submit(fn, *args)
+    if future is None:
+        GEMINI_FALLBACKS.labels('capacity').inc()
+        print("Gemini concurrency cap reached, using fallback response")
+    return future
+
+def start_gemini(prompt, cache_key, stage):
+    """Submit call_gemini to the pool; None when too many calls are outstanding"""
+    return start_gemini_task(call_gemini, prompt, cache_key, stage)
+
+def wait_gemini(future, mode):
+    """Wait at most the mode's latency budget for a started Gemini call.
+
+    Returns None when the deadline passes. A call that finishes late still
+    fills the cache for the next request.
+    """
+    answer = gemini_pool.wait(future, GEMINI_DEADLINES.get(mode, GEMINI_DEADLINE))
+    if answer is None:
+        if future.done():
+            GEMINI_FALLBACKS.labels('error').inc()
+        else:
+            # Only drops the call if it is still queued; a running call is left to finish
+            future.cancel()
+            GEMINI_FALLBACKS.labels('deadline').inc()
+            print(f"Gemini missed the {mode} deadline, using fallback response")
+    return answer
+
+def call_gemini_with_deadline(prompt, cache_key, mode, stage):
+    """Run call_gemini on the pool, returning None on deadline or when at capacity"""
+    future = start_gemini(prompt, cache_key, stage)
+    return wait_gemini(future, mode) if future is not None else None
+
+def start_advice_response(query):
+    """Begin generating advice without waiting for it.
+
+    Returns (cached answer, None) on a cache hit, otherwise (None, future)
+    where future is None if Gemini is unavailable or at capacity.
+    """
+    if not gemini_model:
+        return None, None
     
-    # Sort by score
-    results.sort(key=lambda x: x['score'], reverse=True)
+    cache_key = response_cache_key(query, 'advice')
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached, None
     
-    # Limit results
-    limit = 3 if mode == 'quick' else 5
-    return results[:limit]
+    return None, start_gemini(build_advice_prompt(query), cache_key, 'generate_advice_response')
 
-def generate_ai_response(results, query, mode):
-    """Generate AI-powered response using Gemini"""
-    if not gemini_model or not results:
+def generate_advice_response(query):
+    """Generate advice/educational response using Gemini AI"""
+    cached, future = start_advice_response(query)
+    if future is None:
+        return cached
+    return wait_gemini(future, 'advice')
+
+def expand_query(query):
+    """Expand a query with fragrance characteristics for seasons and occasions"""
+    return match_intent(query).expanded_terms
+
+def build_result(idx, score, catalog=None):
+    """Result record for the perfume at catalog position idx (fields decode on access)"""
+    return (catalog or active_catalog()).records.record(idx, score)
+
+def result_json(result):
+    """Result dict safe for JSON clients: missing values become null instead of NaN"""
+    return {k: (None if isinstance(v, float) and v != v else v) for k, v in result.items()}
+
+def resolve_filters(filters):
+    """Catalog positions allowed by a request's filters (None = unfiltered); ValueError if malformed"""
+    catalog = active_catalog()
+    if not filters or catalog is None:
         return None
+    return catalog.facet_index.candidates(filters)
+
+def page_size(mode):
+    return 3 if mode == 'quick' else 5
+
+def rank_perfumes(query, intent=None, candidates=None, limit=CURSOR_MAX_RESULTS):
+    """Best (catalog position, score) pairs for a query, up to limit"""
+    if intent is None:
+        intent = match_intent(query)
     
+    # Score only documents containing the expanded terms (and passing any filters)
+    with STAGE_SECONDS.labels('search_perfumes').time():
+        return active_catalog().scoring_engine.top(intent.expanded_terms, limit, candidates)
+
+def search_perfumes(query, mode='descriptive', intent=None, candidates=None):
+    """Smart keyword-based search with context understanding"""
+    return [build_result(idx, score) for idx, score in rank_perfumes(query, intent, candidates, page_size(mode))]
+
+def ranking_key(query, filters):
+    """Cache key for a query's ranked list under the current catalog"""
+    payload = json.dumps([active_catalog().version, normalize_query(query), filters or {}], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+def encode_cursor(query, filters, mode, offset):
+    payload = json.dumps({'q': query, 'f': filters or {}, 'm': mode, 'o': offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Cursor fields (query, filters, mode, offset); ValueError if the token is malformed"""
     try:
-        # Prepare perfume data for AI
-        perfume_context = "\n\n".join([
-            f"{i+1}. {p['title']} (Rating: {p['rating']}/5)\n"
-            f"   Gender: {p['gender']}\n"
-            f"   Main Accords: {p['notes']}\n"
-            f"   Description: {p['combined_text'][:200] if p['combined_text'] else 'No description available'}"
-            for i, p in enumerate(results[:5])
-        ])
-        
-        prompt = f"""You are an expert perfume consultant. A customer asked: "{query}"
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        query, filters, mode, offset = payload['q'], payload['f'], payload['m'], int(payload['o'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(query, str) or offset < 0:
+        raise ValueError("Invalid cursor")
+    return query, filters, mode, offset
+
+def search_with_cursor(query, mode, intent, candidates, filters):
+    """First page of results plus a cursor for the rest (None when everything fit).
+
+    The full ranked list is cached so /query/next pages without rescoring.
+    """
+    ranking = rank_perfumes(query, intent, candidates)
+    limit = page_size(mode)
+    results = [build_result(idx, score) for idx, score in ranking[:limit]]
+    if len(ranking) <= limit:
+        return results, None
+    ranking_cache.put(ranking_key(query, filters), np.asarray(ranking, dtype=np.int64).reshape(-1, 2))
+    return results, encode_cursor(query, filters, mode, limit)
+
+def search_perfumes_batch(queries, mode='descriptive', candidates=None):
+    """Score many queries with one sparse matrix product"""
+    limit = page_size(mode)
+    catalog = active_catalog()
+    ranked = catalog.scoring_engine.top_batch([expand_query(q) for q in queries], limit, candidates)
+    return [[build_result(idx, score, catalog) for idx, score in hits] for hits in ranked]
+
+def build_recommendation_prompt(results, query):
+    """Prompt asking Gemini to recommend from the matched perfumes"""
+    perfume_context = "\n\n".join([
+        f"{i+1}. {p['title']} (Rating: {p['rating']}/5)\n"
+        f"   Gender: {p['gender']}\n"
+        f"   Main Accords: {p['notes']}\n"
+        f"   Description: {p['combined_text'][:200] if p['combined_text'] else 'No description available'}"
+        for i, p in enumerate(results[:5])
+    ])
+    
+    return f"""You are an expert perfume consultant. A customer asked: "{query}"
 
 Based on these perfumes from our collection:
 {perfume_context}
@@ -194,25 +393,25 @@ Provide a helpful, conversational response that:
 
 Format recommendations with perfume names in **bold**."""
 
-        response = gemini_model.generate_content(prompt)
-        return response.text
-        
-    except Exception as e:
-        print(f"Gemini AI Error: {e}")
+def generate_ai_response(results, query, mode):
+    """Generate AI-powered response using Gemini"""
+    if not gemini_model or not results:
         return None
+    
+    cache_key = response_cache_key(query, mode, results)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    return call_gemini_with_deadline(
+        build_recommendation_prompt(results, query), cache_key, mode, 'generate_ai_response'
+    )
 
-def format_response(results, query, mode):
-    """Format search results into readable response"""
+def format_template_response(results, query, mode):
+    """Template answer used when Gemini is unavailable"""
     if not results:
         return f"I couldn't find perfumes matching '{query}'. Try searching for specific notes like 'vanilla', 'citrus', or brand names."
     
-    # Try AI response first
-    if gemini_model and mode == 'descriptive':
-        ai_response = generate_ai_response(results, query, mode)
-        if ai_response:
-            return ai_response
-    
-    # Fallback to template response
     if mode == 'quick':
         response = f"Found {len(results)} perfumes:\n\n"
         for i, perfume in enumerate(results, 1):
@@ -230,12 +429,172 @@ def format_response(results, query, mode):
     
     return response
 
+def format_response(results, query, mode):
+    """Format search results into readable response"""
+    with STAGE_SECONDS.labels('format_response').time():
+        # Try AI response first
+        if results and gemini_model and mode == 'descriptive':
+            ai_response = generate_ai_response(results, query, mode)
+            if ai_response:
+                return ai_response
+        
+        # Fallback to template response
+        return format_template_response(results, query, mode)
+
+def sse_event(event, data):
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_gemini(prompt, cache_key, stage, chunks):
+    """Pool task: put each chunk of a streamed Gemini answer on chunks, then None.
+
+    Errors are put on the queue instead. Like call_gemini, a stream the
+    client stopped waiting for still runs to the end and fills the cache.
+    """
+    parts = []
+    try:
+        with STAGE_SECONDS.labels(stage).time():
+            for chunk in gemini_model.generate_content(prompt, stream=True):
+                text = chunk.text
+                if text:
+                    parts.append(text)
+                    chunks.put(text)
+    except Exception as e:
+        GEMINI_ERRORS.inc()
+        print(f"Gemini AI Error: {e}")
+        chunks.put(e)
+        return
+    if parts:
+        response_cache.put(cache_key, ''.join(parts))
+    chunks.put(None)
+
+def relay_gemini(prompt, cache_key, outcome, stage, mode):
+    """Yield token events for a Gemini answer as chunks arrive.
+
+    The stream runs on gemini_pool, so it counts against the concurrency cap,
+    and the mode's deadline bounds the wait for the first chunk (and for each
+    later one). Cached answers are sent as a single token. outcome['source']
+    becomes 'cache' or 'gemini' once text has been sent and stays None if
+    Gemini failed, was at capacity or missed the deadline before producing
+    anything, so the caller can fall back.
+    """
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        outcome['source'] = 'cache'
+        yield sse_event('token', {'text': cached})
+        return
+    
+    chunks = queue.Queue()
+    future = start_gemini_task(stream_gemini, prompt, cache_key, stage, chunks)
+    if future is None:
+        outcome['error'] = 'capacity'
+        return
+    
+    deadline = GEMINI_DEADLINES.get(mode, GEMINI_DEADLINE)
+    while True:
+        try:
+            item = chunks.get(timeout=deadline)
+        except queue.Empty:
+            if outcome['source'] is None:
+                GEMINI_FALLBACKS.labels('deadline').inc()
+                print(f"Gemini missed the {mode} deadline, using fallback response")
+            outcome['error'] = 'deadline'
+            return
+        if item is None:
+            return
+        if isinstance(item, Exception):
+            if outcome['source'] is None:
+                GEMINI_FALLBACKS.labels('error').inc()
+            outcome['error'] = str(item)
+            return
+        outcome['source'] = 'gemini'
+        yield sse_event('token', {'text': item})
+
+def stream_query(question, mode, candidates=None, filters=None):
+    """Event stream for /query/stream: results first, then answer tokens, then a summary"""
+    start_time = time.time()
+    search_question, corrections = correct_query(question)
+    with STAGE_SECONDS.labels('intent').time():
+        intent = match_intent(search_question)
+    
+    # Set when an advice answer was attempted and missed; the template is then
+    # sent straight away instead of spending a second Gemini budget
+    advice_missed = False
+    if intent.is_advice and gemini_model:
+        outcome = {'source': None}
+        yield from relay_gemini(
+            build_advice_prompt(question), response_cache_key(question, 'advice'), outcome,
+            'generate_advice_response', 'advice'
+        )
+        advice_missed = outcome['source'] is None
+        if outcome['source']:
+            yield sse_event('done', {
+                'type': 'advice',
+                'mode': mode,
+                'corrections': corrections,
+                'source': outcome['source'],
+                'error': outcome.get('error'),
+                'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+            })
+            return
+    
+    # Local search is fast, so flush its results before waiting on Gemini
+    results, cursor = search_with_cursor(search_question, mode, intent, candidates, filters)
+    yield sse_event('results', {
+        'results': [result_json(r) for r in results],
+        'results_count': len(results),
+        'corrections': corrections,
+        'cursor': cursor
+    })
+    
+    outcome = {'source': None}
+    if results and gemini_model and mode == 'descriptive' and not advice_missed:
+        yield from relay_gemini(
+            build_recommendation_prompt(results, question),
+            response_cache_key(question, mode, results),
+            outcome,
+            'generate_ai_response',
+            mode
+        )
+    if outcome['source'] is None:
+        outcome['source'] = 'template'
+        yield sse_event('token', {'text': format_template_response(results, question, mode)})
+    
+    yield sse_event('done', {
+        'type': 'product_search',
+        'mode': mode,
+        'results_count': len(results),
+        'source': outcome['source'],
+        'error': outcome.get('error'),
+        'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+    })
+
+def stream_response(question, mode, candidates=None, filters=None):
+    return Response(
+        stream_with_context(stream_query(question, mode, candidates, filters)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Pin one snapshot per request; a reload mid-request doesn't affect it
+    g.catalog = catalog_reloader.current
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.labels(request.endpoint or 'unknown').observe(time.perf_counter() - start)
+    return response
+
 @app.route('/')
 def home():
     return jsonify({
         'status': 'running',
         'message': 'AI-Powered Perfume Chatbot API',
-        'perfumes_loaded': len(df) if df is not None else 0,
+        'perfumes_loaded': len(active_catalog() or ()),
         'ai_enabled': gemini_model is not None
     })
 
@@ -248,51 +607,189 @@ def query():
         
         question = data['question']
         mode = data.get('mode', 'descriptive')
+        try:
+            candidates = resolve_filters(data.get('filters'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        if data.get('stream'):
+            return stream_response(question, mode, candidates, data.get('filters'))
         
-        # Check if this is an advice question
-        if is_advice_question(question):
-            # Try to get AI advice first
-            ai_advice = generate_advice_response(question)
-            if ai_advice:
-                return jsonify({
-                    "answer": ai_advice,
-                    "mode": mode,
-                    "type": "advice"
-                })
+        # Typo-corrected text drives intent and search; Gemini still sees the original
+        search_question, corrections = correct_query(question)
         
-        # Otherwise, search perfumes
-        results = search_perfumes(question, mode)
+        # Detect advice intent and search terms in one pass
+        with STAGE_SECONDS.labels('intent').time():
+            intent = match_intent(search_question)
         
-        # Format response
-        answer = format_response(results, question, mode)
+        # Advice questions start Gemini first and search while it runs,
+        # so a miss costs max(search, LLM) instead of their sum
+        ai_advice, advice_future = None, None
+        if intent.is_advice:
+            ai_advice, advice_future = start_advice_response(question)
+        
+        results, cursor = search_with_cursor(search_question, mode, intent, candidates, data.get('filters'))
+        
+        if advice_future is not None:
+            ai_advice = wait_gemini(advice_future, 'advice')
+        if ai_advice:
+            return jsonify({
+                "answer": ai_advice,
+                "mode": mode,
+                "type": "advice",
+                "corrections": corrections,
+                "results_count": len(results),
+                "related_perfumes": [
+                    result_json({"title": p['title'], "rating": p['rating'], "notes": p['notes']})
+                    for p in results[:3]
+                ]
+            })
+        
+        # Format response; after a missed advice call the template goes out at
+        # once rather than waiting a second Gemini deadline
+        if advice_future is not None:
+            answer = format_template_response(results, question, mode)
+        else:
+            answer = format_response(results, question, mode)
         
         return jsonify({
             "answer": answer,
             "mode": mode,
             "results_count": len(results),
+            "corrections": corrections,
+            "cursor": cursor,
+            "type": "product_search"
+        })
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    data = request.get_json()
+    if not data or 'question' not in data:
+        return jsonify({"error": "Missing 'question' field"}), 400
+    
+    try:
+        candidates = resolve_filters(data.get('filters'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return stream_response(data['question'], data.get('mode', 'descriptive'), candidates, data.get('filters'))
+
+@app.route('/query/next', methods=['POST'])
+def query_next():
+    """Next page of a previous /query's ranking; no rescoring and no Gemini call"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('cursor'), str):
+        return jsonify({"error": "Missing 'cursor' field"}), 400
+    
+    try:
+        query, filters, mode, offset = decode_cursor(data['cursor'])
+        candidates = resolve_filters(filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    key = ranking_key(query, filters)
+    ranking = ranking_cache.get(key)
+    if ranking is None:
+        # Expired, evicted, or cached by another worker: rescore once, still without Gemini
+        CURSOR_PAGES.labels('miss').inc()
+        ranking = np.asarray(rank_perfumes(query, None, candidates), dtype=np.int64).reshape(-1, 2)
+        ranking_cache.put(key, ranking)
+    else:
+        CURSOR_PAGES.labels('hit').inc()
+    
+    limit = page_size(mode)
+    results = [build_result(idx, int(score)) for idx, score in ranking[offset:offset + limit].tolist()]
+    next_offset = offset + limit
+    
+    return jsonify({
+        "answer": format_template_response(results, query, mode),
+        "mode": mode,
+        "results": [result_json(r) for r in results],
+        "results_count": len(results),
+        "offset": offset,
+        "total": len(ranking),
+        "cursor": encode_cursor(query, filters, mode, next_offset) if next_offset < len(ranking) else None,
+        "type": "product_search"
+    })
+
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('questions'), list):
+            return jsonify({"error": "Missing 'questions' list"}), 400
+        
+        questions = [str(q) for q in data['questions']]
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"}), 400
+        mode = data.get('mode', 'descriptive')
+        try:
+            candidates = resolve_filters(data.get('filters'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        corrected = [correct_query(q) for q in questions]
+        batch_results = search_perfumes_batch([q for q, _ in corrected], mode, candidates)
+        
+        return jsonify({
+            "mode": mode,
+            "results": [
+                {
+                    "question": question,
+                    "corrections": corrections,
+                    "results": [result_json(r) for r in results],
+                    "results_count": len(results)
+                }
+                for question, (_, corrections), results in zip(questions, corrected, batch_results)
+            ],
             "type": "product_search"
         })
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Rebuild the catalog snapshot in the background and swap it in when ready"""
+    if not admin_authorized(request):
+        return jsonify({"error": "Forbidden"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    started = catalog_reloader.request_reload(wait=bool(data.get('wait')))
+    return jsonify({"started": started, "catalog": catalog_reloader.status()}), 200 if data.get('wait') else 202
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
         'status': 'healthy',
-        'perfumes': len(df) if df is not None else 0,
-        'ai_enabled': gemini_model is not None
+        'perfumes': len(active_catalog() or ()),
+        'catalog': catalog_reloader.status(),
+        'catalog_memory': active_catalog().memory_usage() if active_catalog() is not None else None,
+        'ai_enabled': gemini_model is not None,
+        'response_cache': response_cache.stats(),
+        'gemini_pool': gemini_pool.stats()
     })
 
 if __name__ == '__main__':
     print("Starting AI-Powered Perfume Chatbot...")
     if load_perfumes():
         print("✓ Data loaded successfully")
+        start_catalog_watch()
         if gemini_model:
             print("✓ Gemini AI ready for intelligent responses")
         else:
             print("⚠ Running in keyword-search mode (no AI)")
-        print("Starting Flask server on http://127.0.0.1:5001")
-        app.run(host='127.0.0.1', port=5001, debug=True)
+        # Development server; production runs gunicorn with wsgi.py
+        host = os.getenv('CHATBOT_HOST', '127.0.0.1')
+        port = int(os.getenv('CHATBOT_PORT', '5001'))
+        print(f"Starting Flask server on http://{host}:{port}")
+        app.run(host=host, port=port, debug=os.getenv('FLASK_DEBUG') == '1', threaded=True)
     else:
         print("✗ Failed to load data. Please check the CSV file.")
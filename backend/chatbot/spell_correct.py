@@ -0,0 +1,207 @@
+"""Typo correction for search queries using symmetric-delete lookups (SymSpell).
+
+Every dictionary word is indexed under the strings produced by deleting up to
+`max_distance` characters from its first `prefix_length` characters. A query
+term's own deletes are looked up in that index, so candidates are found with a
+few binary searches instead of comparing the term against the whole
+vocabulary.
+
+The index keeps only the hash of each delete string, in a sorted int64 array
+with a parallel array of word ids, so it costs 12 bytes per (delete, word)
+pair rather than a Python string and list per delete. A hash collision only
+adds a candidate, which the edit-distance check then rejects. The words
+themselves live in one newline-separated string, which also answers whether a
+term is part of a dictionary word (and will already match in search) with a
+single substring scan. That scan and a lookup take a few hundred
+microseconds on a 40k-word vocabulary, so each word's outcome is kept in a
+small LRU; query terms repeat heavily, so most words are a dict hit.
+"""
+import re
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+WORD_RE = re.compile(r"[a-z][a-z'\-]*[a-z]")
+
+# Query filler that should never be "corrected" into a catalog word
+COMMON_QUERY_WORDS = {
+    'best', 'good', 'nice', 'great', 'some', 'something', 'looking', 'want', 'need', 'like',
+    'love', 'recommend', 'recommendation', 'suggest', 'perfume', 'perfumes', 'fragrance',
+    'fragrances', 'scent', 'scents', 'smell', 'smells', 'cologne', 'show', 'find', 'give',
+    'more', 'most', 'very', 'really', 'that', 'this', 'with', 'from', 'have', 'which', 'what',
+    'under', 'cheap', 'budget', 'gift', 'long', 'lasting', 'strong', 'soft', 'similar'
+}
+
+# Bound on remembered word -> correction outcomes
+MAX_CACHED_WORDS = 4096
+
+
+def _deletes(word, max_distance, prefix_length):
+    """All strings reachable from word's prefix by up to max_distance deletions"""
+    word = word[:prefix_length]
+    found = {word}
+    frontier = [word]
+    for _ in range(max_distance):
+        next_frontier = []
+        for candidate in frontier:
+            for i in range(len(candidate)):
+                deleted = candidate[:i] + candidate[i + 1:]
+                if deleted not in found:
+                    found.add(deleted)
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellCorrector:
+    """Symmetric-delete dictionary built from catalog words and their frequencies"""
+
+    def __init__(self, word_counts, max_distance=2, prefix_length=7, protected=()):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.protected = set(protected) | COMMON_QUERY_WORDS
+        words = list(dict(word_counts).items())
+        self.counts = np.array([count for _, count in words], dtype=np.int64)
+        self._vocabulary = '\n' + '\n'.join(word for word, _ in words) + '\n'
+        self._starts = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(word) + 1 for word, _ in words], out=self._starts[1:])
+        self._starts += 1
+
+        hashes, word_ids = array('q'), array('i')
+        for word_id, (word, _) in enumerate(words):
+            for deleted in _deletes(word, max_distance, prefix_length):
+                hashes.append(hash(deleted))
+                word_ids.append(word_id)
+        hashes = np.frombuffer(hashes, dtype=np.int64)
+        order = np.argsort(hashes, kind='stable')
+        self._hashes = hashes[order]
+        self._word_ids = np.frombuffer(word_ids, dtype=np.int32)[order]
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def word(self, word_id):
+        """Dictionary word by id"""
+        return self._vocabulary[self._starts[word_id]:self._starts[word_id + 1] - 1]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the delete index and the vocabulary (the bounded word cache aside)"""
+        return (self._hashes.nbytes + self._word_ids.nbytes + self.counts.nbytes
+                + self._starts.nbytes + sys.getsizeof(self._vocabulary))
+
+    @classmethod
+    def from_catalog(cls, frame, min_description_count=3, extra_words=(), **kwargs):
+        """Dictionary of accords, names and perfumers, plus description words
+        seen at least min_description_count times (rarer ones are likely typos).
+
+        extra_words (e.g. the intent vocabulary) are added as correction
+        targets and are never corrected themselves.
+        """
+        counts = {word: 1 for word in extra_words}
+        for column in ('Main Accords', 'Name', 'Perfumers'):
+            if column in frame.columns:
+                for value in frame[column].dropna().tolist():
+                    for word in WORD_RE.findall(str(value).lower()):
+                        counts[word] = counts.get(word, 0) + 1
+
+        if 'Description' in frame.columns:
+            description_counts = {}
+            for value in frame['Description'].dropna().tolist():
+                for word in WORD_RE.findall(str(value).lower()):
+                    description_counts[word] = description_counts.get(word, 0) + 1
+            for word, count in description_counts.items():
+                if count >= min_description_count:
+                    counts[word] = counts.get(word, 0) + count
+
+        counts = {word: count for word, count in counts.items() if len(word) > 2}
+        protected = set(kwargs.pop('protected', ())) | set(extra_words)
+        return cls(counts, protected=protected, **kwargs)
+
+    def is_known(self, word):
+        """True if word is a dictionary word or part of one (it will match in search)"""
+        return '\n' not in word and word in self._vocabulary
+
+    def lookup(self, term):
+        """Best dictionary word within the allowed distance, or None"""
+        # Short words get one edit at most; two edits would turn them into anything
+        limit = 1 if len(term) <= 5 else self.max_distance
+        probes = np.fromiter(
+            (hash(deleted) for deleted in _deletes(term, limit, self.prefix_length)), dtype=np.int64
+        )
+        starts = np.searchsorted(self._hashes, probes, side='left')
+        ends = np.searchsorted(self._hashes, probes, side='right')
+        best, best_key = None, None
+        for word_id in {int(i) for start, end in zip(starts, ends) for i in self._word_ids[start:end]}:
+            word = self.word(word_id)
+            distance = edit_distance(term, word, limit)
+            if distance > limit:
+                continue
+            key = (distance, -int(self.counts[word_id]), word_id)
+            if best_key is None or key < best_key:
+                best, best_key = word, key
+        return best
+
+    def correct_word(self, word):
+        """Correction for one lowercase word, or None if it should be left as is"""
+        with self._cache_lock:
+            if word in self._cache:
+                self._cache.move_to_end(word)
+                return self._cache[word]
+
+        fixed = None
+        if len(word) >= 4 and word not in self.protected and not self.is_known(word):
+            fixed = self.lookup(word)
+            if fixed == word:
+                fixed = None
+
+        with self._cache_lock:
+            self._cache[word] = fixed
+            if len(self._cache) > MAX_CACHED_WORDS:
+                self._cache.popitem(last=False)
+        return fixed
+
+    def correct(self, query):
+        """Return (corrected query, {typo: correction}) for a free-text query"""
+        corrections = {}
+        words = []
+        for token in query.split():
+            lowered = token.lower()
+            match = WORD_RE.search(lowered)
+            if match is None:
+                words.append(token)
+                continue
+            word = match.group()
+            fixed = self.correct_word(word)
+            if fixed is None:
+                words.append(token)
+                continue
+            corrections[word] = fixed
+            words.append(lowered[:match.start()] + fixed + lowered[match.end():])
+        return ' '.join(words), corrections
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The services are flat modules in backend/chatbot
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ACCORDS = ['woody', 'amber', 'vanilla', 'citrus', 'rose', 'floral', 'fresh', 'musky', 'spicy', 'aquatic']
+WORDS = ACCORDS + ['warm', 'sweet', 'light', 'rich', 'powdery', 'green', 'oud', 'leather', 'bergamot', 'night']
+
+
+@pytest.fixture
+def perfumes():
+    """Small catalog in the fra_perfumes.csv layout, with missing values and repeated words"""
+    rng = np.random.default_rng(7)
+    rows = []
+    for i in range(300):
+        rows.append({
+            'Name': f"{rng.choice(WORDS)} {rng.choice(['eau', 'intense', 'noir', 'absolue'])} {i}",
+            'Main Accords': ', '.join(rng.choice(ACCORDS, rng.integers(1, 5), replace=False)),
+            'Description': None if i % 17 == 0 else ' '.join(rng.choice(WORDS, rng.integers(3, 15))),
+            'Perfumers': None if i % 5 == 0 else f"{rng.choice(['Alberto', 'Dominique', 'Olivier'])} Ropion",
+            'Gender': rng.choice(['women', 'men', 'unisex']),
+            'Rating Value': round(float(rng.uniform(1, 5)), 2),
+        })
+    return pd.DataFrame(rows)
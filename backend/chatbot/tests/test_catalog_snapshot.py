@@ -0,0 +1,99 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog_snapshot
+from catalog_snapshot import read_catalog
+
+
+@pytest.fixture
+def csv_path(perfumes, tmp_path, monkeypatch):
+    monkeypatch.delenv('CATALOG_SNAPSHOT_DIR', raising=False)
+    path = tmp_path / 'perfumes.csv'
+    perfumes.to_csv(path, index=False)
+    # Old enough that its stat can be trusted on the next read
+    old = os.stat(path).st_mtime_ns - 10 * 10**9
+    os.utime(path, ns=(old, old))
+    return str(path)
+
+
+@pytest.fixture
+def hashes(monkeypatch):
+    calls = []
+    file_hash = catalog_snapshot.file_hash
+
+    def counting(path, *args, **kwargs):
+        calls.append(path)
+        return file_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(catalog_snapshot, 'file_hash', counting)
+    return calls
+
+
+def snapshots(csv_path):
+    root = os.path.join(os.path.dirname(csv_path), '.snapshots')
+    return sorted(entry for entry in os.listdir(root) if os.path.isdir(os.path.join(root, entry)))
+
+
+def test_snapshot_round_trip_matches_read_csv(csv_path, monkeypatch):
+    expected = pd.read_csv(csv_path)
+    first = read_catalog(csv_path)
+    assert len(snapshots(csv_path)) == 1
+
+    # The second read must come from the snapshot, not the CSV parser
+    monkeypatch.setattr(catalog_snapshot.pd, 'read_csv', None)
+    second = read_catalog(csv_path)
+    for frame in (first, second):
+        pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+    assert second['Description'].isna().sum() == first['Description'].isna().sum() > 0
+    assert isinstance(second['Rating Value'].to_numpy(), np.ndarray)
+    assert second.attrs['sha256'] == first.attrs['sha256'] == catalog_snapshot.file_hash(csv_path)
+
+
+def test_usecols_selects_columns_in_file_order(csv_path):
+    read_catalog(csv_path)
+    frame = read_catalog(csv_path, usecols=['Rating Value', 'Name'])
+    assert list(frame.columns) == ['Name', 'Rating Value']
+
+
+def test_edited_csv_gets_a_new_snapshot(csv_path, perfumes):
+    before = read_catalog(csv_path)
+    perfumes.loc[0, 'Name'] = 'renamed'
+    perfumes.to_csv(csv_path, index=False)
+
+    after = read_catalog(csv_path)
+    assert after.loc[0, 'Name'] == 'renamed'
+    assert after.attrs['sha256'] != before.attrs['sha256']
+    # The old snapshot is removed once the new one is written
+    assert snapshots(csv_path) == [f"perfumes-{after.attrs['sha256'][:16]}"]
+
+
+def test_unchanged_csv_is_not_rehashed(csv_path, hashes):
+    digest = read_catalog(csv_path).attrs['sha256']
+    assert len(hashes) == 1
+    assert read_catalog(csv_path).attrs['sha256'] == digest
+    assert len(hashes) == 1
+
+
+def test_same_size_edit_is_caught_by_mtime(csv_path, hashes):
+    before = read_catalog(csv_path)
+    mtime = os.stat(csv_path).st_mtime_ns
+    with open(csv_path, 'r+b') as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(first.swapcase())
+    os.utime(csv_path, ns=(mtime + 10**9, mtime + 10**9))
+    assert read_catalog(csv_path).attrs['sha256'] != before.attrs['sha256']
+    assert len(hashes) == 2
+
+
+def test_recently_modified_csv_is_always_rehashed(csv_path, hashes):
+    now = time.time_ns()
+    os.utime(csv_path, ns=(now, now))
+    read_catalog(csv_path)
+    read_catalog(csv_path)
+    # hashed_at is within STAT_RACY_SECONDS of the mtime, so the stat isn't trusted
+    assert len(hashes) == 2
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from deadline_pool import DeadlinePool
+
+
+@pytest.fixture
+def pool():
+    pool = DeadlinePool(max_workers=2, max_inflight=2, name='test-pool')
+    yield pool
+    pool._executor.shutdown(wait=True)
+
+
+def test_wait_returns_the_result_in_time(pool):
+    assert pool.wait(pool.submit(lambda: 'answer'), timeout=1) == 'answer'
+    assert pool.stats()['timeouts'] == 0
+
+
+def test_timeout_returns_default_and_the_call_finishes(pool):
+    release = threading.Event()
+    done = []
+
+    def slow():
+        release.wait(5)
+        done.append(True)
+        return 'late'
+
+    future = pool.submit(slow)
+    start = time.perf_counter()
+    assert pool.wait(future, timeout=0.05, default='fallback') == 'fallback'
+    assert time.perf_counter() - start < 1
+    assert pool.stats()['timeouts'] == 1
+
+    # The caller stopped waiting, but the call still runs to completion
+    release.set()
+    assert future.result(timeout=5) == 'late'
+    assert done == [True]
+
+
+def test_errors_propagate_to_the_waiter(pool):
+    def fail():
+        raise RuntimeError('upstream down')
+
+    with pytest.raises(RuntimeError, match='upstream down'):
+        pool.wait(pool.submit(fail), timeout=1)
+
+
+def test_inflight_cap_rejects_instead_of_queueing(pool):
+    release = threading.Event()
+    futures = [pool.submit(release.wait, 5) for _ in range(2)]
+    assert all(futures)
+    assert pool.stats()['inflight'] == 2
+
+    assert pool.submit(lambda: 'never') is None
+    assert pool.stats()['rejected'] == 1
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    # Slots are handed back once the calls finish (done callbacks run on the worker)
+    deadline = time.monotonic() + 2
+    while pool.stats()['inflight'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()['inflight'] == 0
+    assert pool.wait(pool.submit(lambda: 'again'), timeout=1) == 'again'
+
+
+def test_cap_counts_calls_that_timed_out(pool):
+    release = threading.Event()
+    for _ in range(2):
+        assert pool.wait(pool.submit(release.wait, 5), timeout=0.01, default=None) is None
+    # Both callers gave up, but their calls still hold the slots
+    assert pool.submit(lambda: 'never') is None
+    release.set()
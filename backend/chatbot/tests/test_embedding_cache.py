@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query('  Warm   VANILLA\tscent ') == 'warm vanilla scent'
+    assert normalize_query('ｖａｎｉｌｌａ') == 'vanilla'
+
+
+def test_memory_roundtrip():
+    cache = EmbeddingCache('model')
+    assert cache.get('vanilla') is None
+    stored = cache.put('Vanilla ', [1, 2, 3])
+    assert stored.dtype == np.float32
+    assert not stored.flags.writeable
+    assert cache.get('vanilla') is stored
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_get_or_compute_encodes_once():
+    cache = EmbeddingCache('model')
+    calls = []
+
+    def encode(text):
+        calls.append(text)
+        return np.ones(4)
+
+    first = cache.get_or_compute('Rose Oud', encode)
+    second = cache.get_or_compute('rose   oud', encode)
+    assert calls == ['rose oud']
+    assert second is first
+
+
+def test_lru_eviction():
+    cache = EmbeddingCache('model', maxsize=2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    cache.get('a')
+    cache.put('c', [3])
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_disk_roundtrip_is_per_model(tmp_path):
+    db_path = str(tmp_path / 'embeddings.db')
+    EmbeddingCache('model', db_path=db_path).put('amber', [0.5, -1.5])
+
+    reloaded = EmbeddingCache('model', db_path=db_path)
+    vector = reloaded.get('AMBER')
+    np.testing.assert_array_equal(vector, np.array([0.5, -1.5], dtype=np.float32))
+    assert reloaded.stats()['disk_hits'] == 1
+    assert EmbeddingCache('other-model', db_path=db_path).get('amber') is None
+
+
+@pytest.mark.parametrize('vector', [np.arange(3, dtype=np.float64), [[1, 2, 3]]])
+def test_vectors_are_flat_float32(vector):
+    stored = EmbeddingCache('model').put('q', vector)
+    assert stored.shape == (3,)
+    assert stored.dtype == np.float32
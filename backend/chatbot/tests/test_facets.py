@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from facets import FacetIndex, parse_accords
+
+
+def expected(frame, keep):
+    return np.array([bool(keep(row)) for _, row in frame.iterrows()])
+
+
+def accords_of(row):
+    return {accord.strip() for accord in row['Main Accords'].split(',')}
+
+
+@pytest.fixture
+def index(perfumes):
+    # Gender as fra_perfumes.csv spells it, so the short aliases resolve
+    perfumes['Gender'] = perfumes['Gender'].map(
+        {'women': 'for women', 'men': 'for men', 'unisex': 'for women and men'}
+    )
+    return FacetIndex(perfumes)
+
+
+def test_parse_accords_reads_list_and_plain_cells():
+    assert parse_accords("['citrus', 'White Floral']") == ['citrus', 'white floral']
+    assert parse_accords('woody, amber') == ['woody', 'amber']
+    assert parse_accords(None) == []
+
+
+def test_no_filters_means_no_mask(index):
+    assert index.mask(None) is None
+    assert index.mask({}) is None
+    assert index.candidates({}) is None
+
+
+def test_masks_match_a_row_scan(index, perfumes):
+    filters = {'gender': ['women', 'Unisex'], 'min_rating': '3.5', 'accords': 'Woody',
+               'exclude_accords': ['rose', 'no-such-accord']}
+    want = expected(perfumes, lambda row: (
+        row['Gender'] in ('for women', 'for women and men') and row['Rating Value'] >= 3.5
+        and 'woody' in accords_of(row) and 'rose' not in accords_of(row)
+    ))
+    assert want.any()
+    assert np.array_equal(index.mask(filters), want)
+    assert np.array_equal(index.candidates(filters), np.flatnonzero(want))
+
+
+def test_unknown_values_match_nothing(index):
+    assert not index.mask({'accords': ['woody', 'no-such-accord']}).any()
+    assert not index.mask({'gender': 'robots'}).any()
+
+
+def test_missing_ratings_never_pass_a_minimum(perfumes):
+    perfumes.loc[:9, 'Rating Value'] = np.nan
+    mask = FacetIndex(perfumes).mask({'min_rating': 0})
+    assert not mask[:10].any() and mask[10:].all()
+
+
+@pytest.mark.parametrize('filters, message', [
+    (['woody'], "'filters' must be an object"),
+    ({'colour': 'red'}, 'Unknown filters: colour'),
+    ({'min_rating': 'high'}, "'min_rating' must be a number"),
+    ({'accords': [1, 2]}, "'accords' must be a string or a list of strings"),
+    ({'gender': {'is': 'women'}}, "'gender' must be a string or a list of strings"),
+])
+def test_malformed_filters_raise_value_error(index, filters, message):
+    with pytest.raises(ValueError, match=message):
+        index.mask(filters)
+
+
+def test_malformed_filters_are_a_400(perfumes):
+    pytest.importorskip('google.generativeai')
+    import simple_chat
+
+    simple_chat.set_catalog(perfumes)
+    client = simple_chat.app.test_client()
+    response = client.post('/query', json={'question': 'woody', 'filters': {'colour': 'red'}})
+    assert response.status_code == 400
+    assert 'Unknown filters' in response.get_json()['error']
+    response = client.post('/query', json={'question': 'woody', 'filters': {'min_rating': 'high'}})
+    assert response.status_code == 400
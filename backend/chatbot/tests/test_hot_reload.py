@@ -0,0 +1,38 @@
+from hot_reload import HotReloader
+
+
+def test_reload_swaps_in_a_new_snapshot():
+    reloader = HotReloader('test', lambda previous: {'generation': previous['generation'] + 1})
+    reloader.install({'generation': 1})
+    pinned = reloader.current
+    assert reloader.reload(wait=True)
+    assert reloader.current == {'generation': 2}
+    assert pinned == {'generation': 1}
+    assert reloader.status()['reloads'] == 1
+    assert reloader.status()['version'] == 2
+
+
+def test_unchanged_and_failed_builds_keep_the_snapshot():
+    outcomes = iter(['same', 'fail'])
+
+    def build(previous):
+        if next(outcomes) == 'fail':
+            raise ValueError('broken csv')
+        return previous
+
+    reloader = HotReloader('test', build)
+    reloader.install('snapshot')
+    reloader.reload(wait=True)
+    reloader.reload(wait=True)
+    status = reloader.status()
+    assert reloader.current == 'snapshot'
+    assert (status['unchanged'], status['failures'], status['reloads']) == (1, 1, 0)
+    assert status['last_error'] == 'broken csv'
+
+
+def test_request_reload_touches_the_trigger(tmp_path):
+    trigger = tmp_path / 'reload'
+    reloader = HotReloader('test', lambda previous: previous, trigger_path=str(trigger))
+    reloader.install('snapshot')
+    reloader.request_reload(wait=True)
+    assert trigger.exists()
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from hybrid_retriever import BM25Index, HybridRetriever, reciprocal_rank_fusion
+
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    fused = reciprocal_rank_fusion({'bm25': [1, 2, 3], 'vector': [3, 1, 4]}, rrf_k=60)
+    assert [position for position, _ in fused] == [1, 3, 2, 4]
+    scores = dict(fused)
+    assert scores[1] == pytest.approx(1 / 61 + 1 / 62)
+    assert scores[3] == pytest.approx(1 / 63 + 1 / 61)
+    assert scores[2] == pytest.approx(1 / 62)
+
+
+def test_rrf_ties_keep_first_appearance():
+    fused = reciprocal_rank_fusion({'a': [7, 8], 'b': [8, 7]})
+    assert [position for position, _ in fused] == [7, 8]
+
+
+def test_rrf_weights():
+    fused = reciprocal_rank_fusion({'bm25': [1], 'vector': [2]}, weights={'vector': 2.0})
+    assert [position for position, _ in fused] == [2, 1]
+
+
+def test_bm25_prefers_rarer_and_denser_matches():
+    index = BM25Index([
+        'vanilla amber',
+        'vanilla vanilla vanilla',
+        'rose oud',
+        'fresh citrus vanilla with a long list of other words',
+    ])
+    positions, scores = index.search('vanilla', 10)
+    assert positions.tolist() == [1, 0, 3]
+    assert np.all(np.diff(scores) <= 0)
+    positions, _ = index.search('oud', 10)
+    assert positions.tolist() == [2]
+    assert len(index.search('leather', 10)[0]) == 0
+
+
+def test_hybrid_search_fuses_legs():
+    legs = {
+        'bm25': lambda query, depth: (np.array([4, 2, 9]), np.array([3.0, 2.0, 1.0])),
+        'vector': lambda query, depth: (np.array([2, 5, 4]), np.array([0.1, 0.2, 0.3])),
+    }
+    result = HybridRetriever(legs, name='test_hybrid').search('query', 3)
+    assert result.positions == [2, 4, 5]
+    assert result.scores == sorted(result.scores, reverse=True)
+    assert result.overlap == pytest.approx(2 / 3, abs=1e-3)
+    stats = result.stats()
+    assert stats['legs']['bm25']['in_results'] == 2
+    assert stats['legs']['vector']['in_results'] == 3
@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from intent_matcher import IntentMatcher, match_intent
+
+# The keyword lists simple_chat scanned before intent_vocabulary.json
+OLD_ADVICE_KEYWORDS = [
+    'how to', 'how do', 'what is', 'why', 'when', 'tips', 'advice',
+    'guide', 'best way', 'should i', 'can i', 'help me', 'explain',
+    'difference between', ' vs ', ' versus ', 'better', 'choose', 'select', 'pick',
+    'layering', 'apply', 'wear', 'store', 'last longer', 'projection',
+    'longevity', 'sillage', 'what are', 'tell me about', 'learn about',
+    'niche vs', 'designer vs', 'difference', 'compare', 'comparison'
+]
+OLD_SEASONS = {
+    'summer': ['citrus', 'fresh', 'light', 'aquatic', 'marine', 'green', 'fruity'],
+    'winter': ['warm', 'spicy', 'woody', 'amber', 'vanilla', 'oriental', 'rich'],
+    'spring': ['floral', 'fresh', 'green', 'light', 'powdery'],
+    'fall': ['woody', 'spicy', 'amber', 'earthy', 'warm'],
+    'autumn': ['woody', 'spicy', 'amber', 'earthy', 'warm']
+}
+OLD_OCCASIONS = {
+    'office': ['fresh', 'clean', 'light', 'subtle'],
+    'work': ['fresh', 'clean', 'light', 'subtle'],
+    'evening': ['rich', 'warm', 'oriental', 'amber'],
+    'night': ['rich', 'warm', 'oriental', 'amber', 'musky'],
+    'party': ['sweet', 'fruity', 'floral', 'fresh'],
+    'date': ['romantic', 'floral', 'sweet', 'amber'],
+    'romantic': ['floral', 'sweet', 'vanilla', 'rose']
+}
+
+
+def old_is_advice(query):
+    query_lower = query.lower()
+    if ' vs ' in query_lower or ' versus ' in query_lower:
+        return True
+    return any(keyword in query_lower for keyword in OLD_ADVICE_KEYWORDS)
+
+
+def old_expand(query):
+    query_lower = query.lower()
+    expanded_terms = set(query_lower.split())
+    for season, terms in OLD_SEASONS.items():
+        if season in query_lower:
+            expanded_terms.update(terms)
+    for occasion, terms in OLD_OCCASIONS.items():
+        if occasion in query_lower:
+            expanded_terms.update(terms)
+    return expanded_terms
+
+
+def random_queries(count, seed=3):
+    """Queries stitched from vocabulary fragments, so phrases overlap and run into each other"""
+    rng = random.Random(seed)
+    pieces = (OLD_ADVICE_KEYWORDS + list(OLD_SEASONS) + list(OLD_OCCASIONS)
+              + ['vanilla', 'oud', 'rose', 'for', 'a', 'vs', 'versus', 'nightfall', 'dated', 'Summer'])
+    queries = []
+    for _ in range(count):
+        parts = [rng.choice(pieces) for _ in range(rng.randint(1, 6))]
+        glue = rng.choice([' ', '', '  ', '-'])
+        queries.append(glue.join(parts))
+    return queries
+
+
+CASES = [
+    'best summer perfume',
+    'How to make perfume last longer?',
+    'Dior vs Chanel',
+    'niche versus designer',
+    'something for a date night',
+    'workout fragrance',               # 'work' inside a longer word still counts
+    'nightfall in autumn',
+    'romantic evening',
+    'whenever',
+    'vanilla and oud',
+    '',
+]
+
+
+@pytest.mark.parametrize('query', CASES)
+def test_matches_the_old_keyword_scan(query):
+    intent = match_intent(query)
+    assert intent.is_advice == old_is_advice(query)
+    assert intent.expanded_terms == old_expand(query)
+
+
+def test_matches_the_old_keyword_scan_on_random_queries():
+    for query in random_queries(5000):
+        intent = match_intent(query)
+        assert (intent.is_advice, intent.expanded_terms) == (old_is_advice(query), old_expand(query)), query
+
+
+def test_reports_seasons_and_occasions_in_vocabulary_order():
+    intent = match_intent('a romantic date night in AUTUMN or fall')
+    assert intent.seasons == ['fall', 'autumn']
+    assert intent.occasions == ['night', 'date', 'romantic']
+    assert not intent.is_advice
+
+
+def test_longest_match_implies_contained_phrases():
+    matcher = IntentMatcher({
+        'advice_keywords': ['how to wear', 'wear'],
+        'seasons': {'summertime': ['citrus']},
+        'occasions': {'summer': ['fresh'], 'time': ['clock']},
+    })
+    intent = matcher.match('summertime')
+    assert intent.seasons == ['summertime']
+    assert intent.occasions == ['summer', 'time']
+    assert intent.expanded_terms == {'summertime', 'citrus', 'fresh', 'clock'}
+    assert matcher.match('How to wear it').is_advice
+    assert not matcher.match('worn').is_advice
+
+
+def test_empty_vocabulary_matches_nothing():
+    intent = IntentMatcher({}).match('summer advice')
+    assert intent == (False, [], [], {'summer', 'advice'})
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+from metrics import CallbackMetric, Counter, Histogram, Registry
+
+
+def sample_lines(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith('#')]
+
+
+def test_counters_from_many_threads():
+    registry = Registry()
+    counter = Counter('test_events_total', 'Events', ['kind'], registry=registry)
+
+    def record():
+        for _ in range(1000):
+            counter.labels('a').inc()
+
+    threads = [threading.Thread(target=record) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 'test_events_total{kind="a"} 50000' in sample_lines(registry)
+
+
+def test_histogram_buckets():
+    registry = Registry()
+    histogram = Histogram('test_seconds', 'Latency', buckets=(0.1, 1), registry=registry)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    assert sample_lines(registry) == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1.0"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        'test_seconds_sum 5.55',
+        'test_seconds_count 3',
+    ]
+
+
+def test_multiprocess_totals_survive_worker_exit(tmp_path):
+    registry = Registry(str(tmp_path))
+    counter = Counter('test_requests_total', 'Requests', ['endpoint'], registry=registry)
+    histogram = Histogram('test_latency_seconds', 'Latency', buckets=(1,), registry=registry)
+    CallbackMetric('test_catalog_size', 'Catalog size', lambda: 10, registry=registry)
+    counter.labels('query').inc(3)
+    histogram.observe(0.5)
+
+    # Another worker's last flushed samples
+    other = {
+        'test_requests_total': [[['query'], 4], [['batch'], 1]],
+        'test_latency_seconds': [[[], [1, 1, 2.5]]],
+        'test_catalog_size': [[[], 12]],
+    }
+    (tmp_path / 'worker-1.json').write_text(json.dumps(other))
+
+    expected = [
+        'test_requests_total{endpoint="batch"} 1',
+        'test_requests_total{endpoint="query"} 7',
+        'test_latency_seconds_bucket{le="1.0"} 2',
+        'test_latency_seconds_bucket{le="+Inf"} 3',
+        'test_latency_seconds_sum 3.0',
+        'test_latency_seconds_count 3',
+    ]
+    lines = sample_lines(registry)
+    assert lines[:6] == expected
+    assert sorted(lines[6:]) == sorted([
+        f'test_catalog_size{{worker="{os.getpid()}"}} 10', 'test_catalog_size{worker="1"} 12',
+    ])
+
+    # The exited worker's counts are archived; its gauge goes away
+    registry.mark_process_dead(1)
+    assert not (tmp_path / 'worker-1.json').exists()
+    lines = sample_lines(registry)
+    assert lines[:6] == expected
+    assert lines[6:] == [f'test_catalog_size{{worker="{os.getpid()}"}} 10']
+
+
+def test_write_samples_round_trip(tmp_path):
+    registry = Registry(str(tmp_path))
+    Counter('test_total', 'Total', registry=registry).inc(2)
+    registry.write_samples()
+    written = json.loads((tmp_path / f'worker-{os.getpid()}.json').read_text())
+    assert written == {'test_total': [[[], 2]]}
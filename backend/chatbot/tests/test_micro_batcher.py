@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from micro_batcher import MicroBatcher, QueueFull
+
+
+def test_results_return_to_their_callers():
+    seen = []
+
+    def process(items):
+        seen.append(len(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait=0.05, name='test_roundtrip')
+    results = {}
+    start = threading.Barrier(20)
+
+    def call(item):
+        start.wait()
+        results[item] = batcher(item, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: i * 10 for i in range(20)}
+    assert sum(seen) == 20
+    assert max(seen) <= 8
+    # Concurrent callers share batches
+    assert len(seen) < 20
+    assert batcher.stats()['items'] == 20
+
+
+def test_batch_exception_reaches_every_caller():
+    def process(items):
+        raise RuntimeError('model failed')
+
+    batcher = MicroBatcher(process, max_wait=0.01, name='test_failure')
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match='model failed'):
+            future.result(timeout=5)
+
+
+def test_wrong_result_count_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_wait=0.01, name='test_count')
+    with pytest.raises(ValueError):
+        batcher('x', timeout=5)
+
+
+def test_full_queue_rejects():
+    release = threading.Event()
+
+    def process(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=1, max_wait=0, max_queue=2, name='test_full')
+    first = batcher.submit(0)
+    # Wait until the worker holds the first item, so the queue is empty again
+    while batcher.stats()['queue_depth']:
+        time.sleep(0.001)
+    batcher.submit(1)
+    batcher.submit(2)
+    with pytest.raises(QueueFull):
+        batcher.submit(3)
+    release.set()
+    assert first.result(timeout=5) == 0
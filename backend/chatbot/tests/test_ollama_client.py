@@ -0,0 +1,173 @@
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ollama_client import CircuitBreaker, OllamaBusy, OllamaClient, OllamaError, OllamaUnavailable
+
+RESET = 0.1
+_names = itertools.count()
+
+
+class FakeOllama(ThreadingHTTPServer):
+    """Local /api/generate that answers according to .mode"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.mode = 'ok'
+        self.calls = 0
+        self.release = threading.Event()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers['Content-Length']))
+        server.calls += 1
+        status, body = 200, json.dumps({'response': 'hi', 'done': True}).encode()
+        if server.mode == '500':
+            status, body = 500, b'boom'
+        elif server.mode == '404':
+            status, body = 404, b'model not found'
+        elif server.mode == 'garbage':
+            body = b'not json'
+        elif server.mode == 'slow':
+            server.release.wait(5)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = FakeOllama()
+    threading.Thread(target=server.serve_forever, args=(0.02,), daemon=True).start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    return OllamaClient(f"http://127.0.0.1:{server.server_port}", max_parallel=2, slot_timeout=0.2,
+                        failure_threshold=2, reset_timeout=RESET, name=f"test_ollama_{next(_names)}")
+
+
+def generate(client):
+    return client.generate({'model': 'llama3', 'prompt': 'hi'}, timeout=2)
+
+
+def open_breaker(client, server):
+    server.mode = '500'
+    for _ in range(client.breaker.failure_threshold):
+        with pytest.raises(OllamaError):
+            generate(client)
+    assert client.breaker.state == 'open'
+
+
+def test_breaker_opens_after_consecutive_failures(client, server):
+    server.mode = '500'
+    with pytest.raises(OllamaError):
+        generate(client)
+    assert client.breaker.state == 'closed'
+    with pytest.raises(OllamaError):
+        generate(client)
+    assert client.breaker.state == 'open'
+    assert client.breaker.trips == 1
+
+    # Open: fails at once without reaching Ollama
+    calls = server.calls
+    with pytest.raises(OllamaUnavailable):
+        generate(client)
+    assert server.calls == calls
+
+
+def test_success_resets_the_failure_count(client, server):
+    server.mode = '500'
+    with pytest.raises(OllamaError):
+        generate(client)
+    server.mode = 'ok'
+    assert generate(client) == 'hi'
+    server.mode = '500'
+    with pytest.raises(OllamaError):
+        generate(client)
+    assert client.breaker.state == 'closed'
+
+
+def test_client_errors_do_not_count_against_ollama(client, server):
+    server.mode = '404'
+    for _ in range(3):
+        with pytest.raises(OllamaError):
+            generate(client)
+    assert client.breaker.state == 'closed'
+
+
+def test_half_open_after_cooldown_and_probe_success_closes(client, server):
+    open_breaker(client, server)
+    time.sleep(RESET * 1.5)
+    assert client.breaker.state == 'half_open'
+
+    server.mode = 'ok'
+    assert generate(client) == 'hi'
+    assert client.breaker.state == 'closed'
+    assert client.breaker.failures == 0
+
+
+@pytest.mark.parametrize('mode', ['500', 'garbage'])
+def test_probe_failure_reopens(client, server, mode):
+    # 'garbage' is a 200 with an unreadable body: a ValueError, not an OllamaError
+    open_breaker(client, server)
+    time.sleep(RESET * 1.5)
+    server.mode = mode
+    with pytest.raises(Exception):
+        generate(client)
+    assert client.breaker.state == 'open'
+    assert client.breaker.trips == 2
+
+    # Not stuck half-open: the next cooldown lets another probe out
+    time.sleep(RESET * 1.5)
+    server.mode = 'ok'
+    assert generate(client) == 'hi'
+    assert client.breaker.state == 'closed'
+
+
+def test_half_open_lets_out_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0, name=f"test_ollama_{next(_names)}")
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_slots_limit_concurrent_calls(client, server):
+    server.mode = 'slow'
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(generate(client))) for _ in range(2)]
+    for caller in callers:
+        caller.start()
+    deadline = time.monotonic() + 2
+    while client.in_flight < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.in_flight == 2
+
+    # Both slots taken: a third caller waits slot_timeout, then gets OllamaBusy
+    with pytest.raises(OllamaBusy):
+        generate(client)
+    assert client.breaker.state == 'closed'
+
+    server.release.set()
+    for caller in callers:
+        caller.join(5)
+    assert results == ['hi', 'hi']
+    assert client.in_flight == 0
+    assert client.stats()['waiting'] == 0
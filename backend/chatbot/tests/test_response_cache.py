@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(maxsize=4, ttl=60)
+    cache.put('q', 'answer')
+    clock.now += 59
+    assert cache.get('q') == 'answer'
+    clock.now += 2
+    assert cache.get('q') is None
+    assert cache.stats()['size'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_counts_from_the_last_put(clock):
+    cache = ResponseCache(maxsize=4, ttl=60)
+    cache.put('q', 'old')
+    clock.now += 50
+    cache.put('q', 'new')
+    clock.now += 50
+    assert cache.get('q') == 'new'
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ResponseCache(maxsize=2, ttl=60)
+    cache.put('a', '1')
+    cache.put('b', '2')
+    assert cache.get('a') == '1'   # 'b' is now the oldest
+    cache.put('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.stats()['size'] == 2
+
+
+def test_sqlite_tier_survives_a_new_instance(clock, tmp_path):
+    path = str(tmp_path / 'responses.db')
+    ResponseCache(maxsize=2, ttl=60, db_path=path).put('q', 'answer')
+
+    restarted = ResponseCache(maxsize=2, ttl=60, db_path=path)
+    assert restarted.get('q') == 'answer'
+    assert restarted.disk_hits == 1
+    # Promoted into memory: the second hit doesn't go to disk
+    assert restarted.get('q') == 'answer'
+    assert restarted.disk_hits == 1
+    assert restarted.stats()['disk_enabled']
+
+
+def test_sqlite_tier_respects_ttl_and_backs_evicted_entries(clock, tmp_path):
+    cache = ResponseCache(maxsize=1, ttl=60, db_path=str(tmp_path / 'responses.db'))
+    cache.put('a', '1')
+    cache.put('b', '2')
+    assert cache.get('a') == '1'
+    assert cache.disk_hits == 1
+
+    clock.now += 61
+    assert ResponseCache(maxsize=1, ttl=60, db_path=cache.db_path).get('b') is None
+
+
+def test_expired_rows_are_purged(clock, tmp_path):
+    path = str(tmp_path / 'responses.db')
+    cache = ResponseCache(maxsize=1, ttl=60, db_path=path)
+    cache.put('stale', 'x')
+    clock.now += 61
+    for i in range(99):
+        cache.put(f"k{i}", 'v')
+    keys = {key for key, in sqlite3.connect(path).execute("SELECT key FROM responses")}
+    assert 'stale' not in keys
+    assert len(keys) == 99
+
+
+def test_unwritable_database_falls_back_to_memory(clock, tmp_path):
+    cache = ResponseCache(maxsize=2, ttl=60, db_path=str(tmp_path / 'missing' / 'responses.db'))
+    cache.put('q', 'answer')
+    assert cache.get('q') == 'answer'
+    assert cache.get('other') is None
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from conftest import WORDS
+import scoring_engine
+from scoring_engine import SparseScoringEngine
+
+
+def baseline_scores(frame, terms):
+    """The original search_perfumes scan: substring counts, 5x for words in Main Accords, else 2x"""
+    scores = []
+    for idx, row in frame.iterrows():
+        combined = ' '.join(
+            str(row.get(field, '')) for field in ('Name', 'Main Accords', 'Description', 'Perfumers')
+        ).lower()
+        score = 0
+        for word in terms:
+            if len(word) > 2:
+                count = combined.count(word)
+                if word in str(row.get('Main Accords', '')).lower():
+                    score += count * 5
+                else:
+                    score += count * 2
+        if score > 0:
+            scores.append((idx, score))
+    # Stable sort, so ties stay in catalog order
+    return sorted(scores, key=lambda item: -item[1])
+
+
+QUERIES = [
+    {'woody'},
+    {'vanilla', 'amber', 'warm'},
+    {'rose', 'ro', 'fresh'},
+    {'ood', 'ich'},
+    {'citrus', 'aquatic', 'light', 'green', 'fresh'},
+    {'ropion', 'nan'},
+    {'nothing-matches'},
+    set(),
+]
+
+
+@pytest.mark.parametrize('terms', QUERIES, ids=lambda terms: ','.join(sorted(terms)) or 'empty')
+def test_top_matches_baseline_scan(perfumes, terms):
+    engine = SparseScoringEngine(perfumes)
+    expected = baseline_scores(perfumes, terms)
+    assert engine.top(terms, len(perfumes)) == expected
+    assert engine.top(terms, 5) == expected[:5]
+
+
+def test_accords_weighting(perfumes):
+    engine = SparseScoringEngine(perfumes)
+    scores = dict(engine.top({'woody'}, len(perfumes)))
+    in_accords = perfumes['Main Accords'].str.contains('woody')
+    for idx, row in perfumes.iterrows():
+        combined = ' '.join(str(row[f]) for f in ('Name', 'Main Accords', 'Description', 'Perfumers')).lower()
+        count = combined.count('woody')
+        assert scores.get(idx, 0) == count * (5 if in_accords[idx] else 2)
+
+
+def test_candidates_restrict_scoring(perfumes):
+    engine = SparseScoringEngine(perfumes)
+    candidates = np.flatnonzero(perfumes['Gender'].to_numpy() == 'women')
+    allowed = set(candidates.tolist())
+    terms = {'amber', 'rose', 'spicy'}
+    expected = [(idx, score) for idx, score in baseline_scores(perfumes, terms) if idx in allowed]
+    assert engine.top(terms, len(perfumes), candidates) == expected
+
+
+def test_batch_matches_single_queries(perfumes):
+    engine = SparseScoringEngine(perfumes)
+    rng = np.random.default_rng(3)
+    queries = [set(rng.choice(WORDS, rng.integers(1, 4))) for _ in range(20)] + [set()]
+    assert engine.top_batch(queries, 7) == [engine.top(terms, 7) for terms in queries]
+
+
+def test_expansions_evict_the_least_recently_used(perfumes, monkeypatch):
+    monkeypatch.setattr(scoring_engine, 'MAX_EXPANSIONS', 3)
+    engine = SparseScoringEngine(perfumes)
+    for word in ('woody', 'amber', 'rose'):
+        engine.expand(word)
+    kept = engine.expand('woody')
+    engine.expand('citrus')
+    assert list(engine._expansions) == ['rose', 'woody', 'citrus']
+    assert engine.expand('woody') is kept
+    assert engine.top({'amber'}, len(perfumes)) == baseline_scores(perfumes, {'amber'})
@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import ACCORDS
+from spell_correct import SpellCorrector, edit_distance
+
+
+@pytest.fixture
+def corrector():
+    return SpellCorrector({'vanilla': 40, 'sandalwood': 12, 'bergamot': 9, 'amber': 30, 'ambery': 2,
+                           'leather': 5, 'tuberose': 3}, protected={'ambr'})
+
+
+@pytest.mark.parametrize('typo, word', [
+    ('vanila', 'vanilla'),        # deletion
+    ('bergamont', 'bergamot'),    # insertion
+    ('leahter', 'leather'),       # transposition
+    ('sandlewood', 'sandalwood'),  # two edits
+    ('tuberoze', 'tuberose'),     # substitution
+])
+def test_lookup_finds_the_intended_word(corrector, typo, word):
+    assert corrector.lookup(typo) == word
+
+
+def test_lookup_prefers_the_closer_then_more_frequent_word(corrector):
+    assert corrector.lookup('ambor') == 'amber'
+    assert corrector.lookup('ambery') == 'ambery'
+    assert corrector.lookup('qqqqqq') is None
+
+
+def test_short_terms_get_one_edit(corrector):
+    # 'amxxr' is two edits from 'amber'; only words over five letters get two
+    assert corrector.lookup('amxxr') is None
+    assert edit_distance('amxxr', 'amber', 2) == 2
+
+
+def test_known_words_and_parts_of_words_are_left_alone(corrector):
+    assert corrector.is_known('sandalwood')
+    assert corrector.is_known('alwo')
+    assert not corrector.is_known('lwoodb')
+    assert not corrector.is_known('lla\nsan')
+    assert corrector.correct('sandalwood and dalwo') == ('sandalwood and dalwo', {})
+
+
+def test_correct_reports_corrections_and_keeps_punctuation(corrector):
+    assert corrector.correct('Vanila, sandlewood!') == (
+        'vanilla, sandalwood!', {'vanila': 'vanilla', 'sandlewood': 'sandalwood'}
+    )
+
+
+def test_protected_and_short_words_are_not_corrected(corrector):
+    assert corrector.correct('ambr perfume van') == ('ambr perfume van', {})
+
+
+def test_cached_words_give_the_same_answer(corrector):
+    first = corrector.correct('vanila leahter')
+    assert corrector.correct('vanila leahter') == first
+    assert corrector.correct_word('vanila') == 'vanilla'
+    assert corrector.correct_word('vanilla') is None
+
+
+def test_from_catalog_indexes_catalog_words(perfumes):
+    corrector = SpellCorrector.from_catalog(perfumes, extra_words=['winter'])
+    assert len(corrector) >= len(ACCORDS)
+    assert corrector.nbytes > 0
+    assert corrector.lookup('vanila') == 'vanilla'
+    assert corrector.correct('wintr rosse aquatik') == (
+        'winter rose aquatic', {'wintr': 'winter', 'rosse': 'rose', 'aquatik': 'aquatic'}
+    )
@@ -0,0 +1,107 @@
+import glob
+
+import faiss
+import numpy as np
+import pandas as pd
+import pytest
+
+from vector_index import VectorIndex
+
+DIMENSION = 16
+
+
+class Encoder:
+    """Deterministic bag-of-words embeddings that count how many texts were encoded"""
+
+    def __init__(self):
+        self.encoded = 0
+        self._words = {}
+        self._rng = np.random.default_rng(11)
+
+    def __call__(self, texts):
+        self.encoded += len(texts)
+        out = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                if word not in self._words:
+                    self._words[word] = self._rng.standard_normal(DIMENSION).astype(np.float32)
+                out[row] += self._words[word]
+        return out
+
+
+def catalog(size, seed=0):
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(60)]
+    return pd.DataFrame({
+        'title': [f"perfume {i}" for i in range(size)],
+        'combined_text': [' '.join(rng.choice(words, 5)) for _ in range(size)],
+    })
+
+
+def edited(frame):
+    """frame with one row changed, two deleted, one added, and the order shuffled"""
+    frame = frame.copy()
+    frame.loc[3, 'combined_text'] = 'w1 w2 w3'
+    frame = frame.drop([5, 9]).reset_index(drop=True)
+    frame = pd.concat([frame, pd.DataFrame({'title': ['new one'], 'combined_text': ['w7 w8']})], ignore_index=True)
+    return frame.sample(frac=1, random_state=2).reset_index(drop=True)
+
+
+def stored_vectors(vector_index):
+    """Vectors held by the index, in the row order of the frame it was synced to"""
+    index = vector_index.index
+    ids = faiss.vector_to_array(index.id_map)
+    vectors = index.index.reconstruct_n(0, index.ntotal)
+    return vectors[np.argsort(vector_index.positions(ids))]
+
+
+@pytest.mark.parametrize('spec', ['Flat', 'SQfp16,rerank=4', 'HNSW32,efSearch=64'])
+def test_incremental_sync_equals_full_rebuild(tmp_path, spec):
+    before = catalog(200)
+    after = edited(before)
+    encode = Encoder()
+    VectorIndex.sync(before, str(tmp_path / 'incremental.index'), encode, 'model', spec)
+
+    encode.encoded = 0
+    incremental, stats = VectorIndex.sync(after, str(tmp_path / 'incremental.index'), encode, 'model', spec)
+    assert stats['mode'] == 'incremental'
+    assert (stats['added'], stats['changed'], stats['removed']) == (1, 1, 2)
+    assert encode.encoded == 2
+
+    full, stats = VectorIndex.sync(after, str(tmp_path / 'full.index'), encode, 'model', spec)
+    assert stats['mode'] == 'full'
+
+    assert np.array_equal(incremental.ids, full.ids)
+    assert np.array_equal(incremental.hashes, full.hashes)
+    assert incremental.ntotal == full.ntotal == len(after)
+    np.testing.assert_allclose(stored_vectors(incremental), stored_vectors(full), atol=1e-2)
+    if incremental.vectors is not None:
+        assert np.array_equal(incremental.vectors, full.vectors)
+
+    queries = encode(after['combined_text'].tolist()[:20])
+    assert np.array_equal(incremental.search(queries, 5)[1], full.search(queries, 5)[1])
+
+
+def test_unchanged_catalog_encodes_nothing(tmp_path):
+    frame = catalog(50)
+    encode = Encoder()
+    path = str(tmp_path / 'flat.index')
+    VectorIndex.sync(frame, path, encode, 'model', 'Flat')
+    encode.encoded = 0
+    index, stats = VectorIndex.sync(frame, path, encode, 'model', 'Flat')
+    assert encode.encoded == 0
+    assert stats['encoded'] == 0
+    assert index.ntotal == len(frame)
+
+
+def test_adding_rerank_keeps_the_index(tmp_path):
+    frame = catalog(80)
+    encode = Encoder()
+    path = str(tmp_path / 'flat.index')
+    VectorIndex.sync(frame, path, encode, 'model', 'Flat')
+    encode.encoded = 0
+    index, stats = VectorIndex.sync(frame, path, encode, 'model', 'Flat,rerank=2')
+    assert stats['mode'] == 'incremental'
+    assert encode.encoded == 0
+    assert len(glob.glob(path + '.*.vectors.npy')) == 1
+    np.testing.assert_array_equal(index.vectors, encode(frame['combined_text'].tolist()))
@@ -0,0 +1,482 @@
+"""FAISS indexes keyed by stable perfume IDs, maintained incrementally.
+
+Vectors are stored under a 64-bit ID derived from each perfume (an `id`
+column when the CSV has one, otherwise its title). Next to the index file a
+manifest records every ID with a hash of the text that was embedded, plus
+the embedding model and index type. When the CSV changes, `sync` diffs the
+new rows against the manifest and only encodes rows that were added or whose
+text changed; deleted rows are removed.
+
+The index type is chosen by a spec string: a faiss index_factory string plus
+optional build and search parameters, e.g.
+
+    Flat
+    HNSW32,efConstruction=40,efSearch=64
+    IVF,Flat,nprobe=16          (IVF without a list count sizes it to the data)
+    IVF,PQ48,nprobe=16
+    OPQ48,IVF,PQ48,nprobe=16
+    SQfp16 / SQ8                (float16 / int8 scalar-quantized vectors)
+    HNSW32_SQ8,efSearch=64,rerank=4
+
+Search parameters (efSearch, nprobe, rerank) can be changed without a
+rebuild; the rest of the spec is recorded in the manifest.
+
+Quantized indexes keep 2x (SQfp16), 4x (SQ8) or more (PQ) fewer bytes per
+vector in RAM, at some cost in recall. rerank=N recovers most of it: the
+index returns N*k candidates, which are re-scored exactly against float32
+vectors kept in a memory-mapped .vectors.npy file next to the index. Only
+the candidate rows are read, so the float32 copy stays on disk and in the
+page cache rather than in the process. The file's name is derived from the
+manifest's IDs and hashes, so a manifest can only ever be paired with the
+vectors written for it. benchmarks/bench_ann.py
+measures recall and latency per spec and recommends search parameters.
+
+Flat and IVF indexes support remove_ids, so they are updated in place. HNSW
+graphs can't delete vectors, so they are rebuilt from the stored vectors plus
+the new embeddings: the float32 vectors file when there is one (the index's
+own copies are lossy for HNSW*_SQ8/PQ), otherwise via reconstruct. That
+re-runs graph construction but never re-encodes unchanged rows, and encoding
+is the expensive part.
+
+Adding rerank to the spec of an existing index keeps the index: the float32
+vectors file is written from the index itself for Flat, otherwise from a
+one-time encode of the rows.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+
+import faiss
+import numpy as np
+
+MANIFEST_SUFFIX = '.manifest.npz'
+MANIFEST_FORMAT = 1
+VECTORS_SUFFIX = 'vectors.npy'
+
+# Short names accepted for common specs
+INDEX_ALIASES = {
+    'flat': 'Flat',
+    'hnsw': 'HNSW32,efConstruction=40,efSearch=64',
+    'ivf-flat': 'IVF,Flat,nprobe=16',
+    'ivf-pq': 'IVF,PQ48,nprobe=16',
+    'opq': 'OPQ48,IVF,PQ48,nprobe=16',
+    'sq-fp16': 'SQfp16',
+    'sq8': 'SQ8,rerank=4',
+    'hnsw-sq8': 'HNSW32_SQ8,efConstruction=40,efSearch=64,rerank=4',
+}
+# Set at build time and part of the index's identity
+BUILD_PARAMS = ('efConstruction',)
+# Applied to a loaded index; changing them never forces a rebuild
+SEARCH_PARAMS = ('efSearch', 'nprobe', 'rerank')
+
+
+def parse_spec(spec):
+    """Split a spec into (factory string, build params, search params).
+
+    'HNSW32,efConstruction=40,efSearch=64' -> ('HNSW32', {'efConstruction': 40}, {'efSearch': 64})
+    """
+    spec = INDEX_ALIASES.get(spec.strip().lower(), spec)
+    parts, build, search = [], {}, {}
+    for token in (t.strip() for t in spec.split(',') if t.strip()):
+        if '=' not in token:
+            parts.append(token)
+            continue
+        name, value = (s.strip() for s in token.split('=', 1))
+        if name in BUILD_PARAMS:
+            build[name] = int(value)
+        elif name in SEARCH_PARAMS:
+            search[name] = int(value)
+        else:
+            raise ValueError(f"Unknown index parameter '{name}' in {spec!r}")
+    if not parts:
+        raise ValueError(f"Index spec {spec!r} has no index type")
+    return ','.join(parts), build, search
+
+
+def index_kind(spec):
+    """The part of a spec that determines how the index is built (what the manifest records)"""
+    factory, build, _ = parse_spec(spec)
+    return ','.join([factory] + [f"{name}={value}" for name, value in sorted(build.items())])
+
+
+def default_nlist(size):
+    """IVF list count for size vectors: ~4*sqrt(n), with enough points per list to train"""
+    return max(1, min(int(4 * math.sqrt(size)), size // 39))
+
+
+def new_index(spec, dimension, size):
+    """Empty (untrained) FAISS index for spec; size is the number of vectors it will hold"""
+    factory, build, search = parse_spec(spec)
+    factory = re.sub(r'\bIVF(?!\d)', f"IVF{default_nlist(size)}", factory)
+    # Skip polysemous training (only used for Hamming-filtered search, and
+    # over 10x the rest of PQ training)
+    factory = re.sub(r'\bPQ(\d+(?:x\d+)?)(?=,|$)', r'PQ\1np', factory)
+    index = faiss.index_factory(dimension, factory)
+    if 'efConstruction' in build:
+        hnsw = getattr(faiss.downcast_index(index), 'hnsw', None)
+        if hnsw is None:
+            raise ValueError(f"efConstruction only applies to HNSW indexes, not {factory}")
+        hnsw.efConstruction = build['efConstruction']
+    set_search_params(index, search)
+    return index
+
+
+def set_search_params(index, params):
+    """Apply efSearch/nprobe to an index (through IDMap and OPQ wrappers)"""
+    params = {name: value for name, value in params.items() if name != 'rerank'}
+    if params:
+        faiss.ParameterSpace().set_index_parameters(
+            index, ','.join(f"{name}={value}" for name, value in params.items())
+        )
+
+
+def rerank(vectors, queries, candidates, k):
+    """Exact squared-L2 top k among candidate rows of vectors (-1 candidates are skipped).
+
+    Returns (distances, rows) shaped like a faiss search, padded with
+    (inf, -1) where a query has fewer than k candidates.
+    """
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    rows = np.full((len(queries), k), -1, dtype=np.int64)
+    for q, (query, found) in enumerate(zip(queries, candidates)):
+        found = found[found >= 0]
+        if not len(found):
+            continue
+        # Sorted reads are sequential on the memory-mapped file
+        found = np.unique(found)
+        exact = ((np.asarray(vectors[found], dtype=np.float32) - query) ** 2).sum(axis=1)
+        best = np.argsort(exact, kind='stable')[:k]
+        distances[q, :len(best)] = exact[best]
+        rows[q, :len(best)] = found[best]
+    return distances, rows
+
+
+def index_nbytes(index):
+    """Bytes the index occupies (its serialized size: codes, graph links, IDs)"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def build_index(spec, embeddings):
+    """Plain FAISS index for spec, trained on and filled with embeddings"""
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = new_index(spec, embeddings.shape[1], len(embeddings))
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+
+def row_ids(frame, id_column='id', key_column='title'):
+    """Stable int64 ID per row: the id column if present, else a hash of the title.
+
+    Repeated titles get an occurrence number mixed in, so duplicates keep
+    distinct IDs.
+    """
+    if id_column in frame.columns:
+        return frame[id_column].to_numpy(dtype=np.int64)
+
+    seen = {}
+    ids = np.empty(len(frame), dtype=np.int64)
+    for pos, key in enumerate(frame[key_column].astype(str).tolist()):
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        digest = hashlib.blake2b(f"{key}\x00{occurrence}".encode('utf-8'), digest_size=8).digest()
+        # FAISS reserves -1, so keep IDs non-negative
+        ids[pos] = int.from_bytes(digest, 'little') & 0x7FFFFFFFFFFFFFFF
+    return ids
+
+
+def content_hashes(texts):
+    """16-byte hash of each text that gets embedded"""
+    return np.array(
+        [hashlib.blake2b(str(text).encode('utf-8'), digest_size=16).digest() for text in texts],
+        dtype='S16'
+    )
+
+
+class VectorIndex:
+    """A FAISS index holding stable perfume IDs plus the manifest of what it holds.
+
+    search() takes query vectors like faiss and returns (distances, positions),
+    where positions are row numbers in the frame the index was synced to
+    (-1 where fewer than k results exist), so callers can keep using
+    df.iloc[positions[0]].
+    """
+
+    def __init__(self, index, ids, hashes, model_name, spec, vectors=None):
+        self.index = index
+        self.ids = ids
+        self.hashes = hashes
+        self.model_name = model_name
+        self.kind = index_kind(spec)
+        self.search_params = parse_spec(spec)[2]
+        # float32 vectors by row position (memory-mapped) for exact re-ranking
+        self.vectors = vectors
+        set_search_params(index, self.search_params)
+        self._set_positions(ids)
+
+    def _set_positions(self, ids):
+        # Sorted IDs for vectorized id -> row position lookups
+        self._order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._order]
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def positions(self, ids):
+        """Row positions for stable IDs (-1 for IDs not in the synced frame)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[slots] == ids, self._order[slots], -1)
+
+    def search(self, vectors, k):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        factor = self.search_params.get('rerank')
+        if not factor or self.vectors is None:
+            distances, ids = self.index.search(vectors, k)
+            return distances, self.positions(ids)
+        _, ids = self.index.search(vectors, k * factor)
+        return rerank(self.vectors, vectors, self.positions(ids), k)
+
+    @property
+    def nbytes(self):
+        """Resident bytes: the FAISS index plus the ID lookup (memory-mapped vectors excluded)"""
+        return index_nbytes(self.index) + self.ids.nbytes + self.hashes.nbytes + self._order.nbytes
+
+    def save(self, path):
+        """Write index and manifest atomically (temporary files, then rename)"""
+        tmp_index = f"{path}.tmp"
+        faiss.write_index(self.index, tmp_index)
+        tmp_manifest = f"{path}{MANIFEST_SUFFIX}.tmp.npz"
+        np.savez(
+            tmp_manifest,
+            ids=self.ids,
+            hashes=self.hashes,
+            meta=np.array(json.dumps({
+                'format': MANIFEST_FORMAT, 'model': self.model_name, 'kind': self.kind,
+            }))
+        )
+        os.replace(tmp_index, path)
+        os.replace(tmp_manifest, path + MANIFEST_SUFFIX)
+
+    @classmethod
+    def load(cls, path, model_name, spec):
+        """Load a saved index, or None if missing or built with another model/kind.
+
+        If rerank is set but there is no matching float32 vectors file (e.g.
+        rerank was just added to the spec), the index is returned without
+        vectors; sync then writes the file and keeps the index.
+        """
+        kind = index_kind(spec)
+        manifest_path = path + MANIFEST_SUFFIX
+        if not (os.path.exists(path) and os.path.exists(manifest_path)):
+            return None
+        try:
+            with np.load(manifest_path) as manifest:
+                meta = json.loads(str(manifest['meta']))
+                ids, hashes = manifest['ids'], manifest['hashes']
+            if (meta.get('format'), meta.get('model'), meta.get('kind')) != (MANIFEST_FORMAT, model_name, kind):
+                logging.info(f"Index {path} was built for {meta.get('model')}/{meta.get('kind')}, rebuilding")
+                return None
+            index = faiss.read_index(path)
+            if index.ntotal != len(ids):
+                raise ValueError(f"index has {index.ntotal} vectors, manifest lists {len(ids)}")
+            vectors = None
+            if parse_spec(spec)[2].get('rerank'):
+                vectors = _load_vectors(vectors_path(path, ids, hashes), (len(ids), index.d))
+            return cls(index, ids, hashes, model_name, spec, vectors)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable index {path}: {e}")
+            return None
+
+    @classmethod
+    def sync(cls, frame, path, encode, model_name, spec, text_column='combined_text'):
+        """Bring the index at path up to date with frame, encoding only new or changed rows.
+
+        encode(texts) returns float32 embeddings; spec picks the index type
+        (see the module docstring). Returns (VectorIndex, stats).
+        The returned object is freshly loaded or built, never one that is
+        being served, so callers can swap it in atomically.
+        """
+        start = time.perf_counter()
+        ids = row_ids(frame)
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError("Perfume IDs are not unique")
+        texts = frame[text_column].tolist()
+        hashes = content_hashes(texts)
+
+        keep_vectors = bool(parse_spec(spec)[2].get('rerank'))
+        vectors = None
+        current = cls.load(path, model_name, spec)
+        if current is None:
+            embeddings = _encode(encode, texts)
+            index = _with_ids(new_index(spec, embeddings.shape[1], len(embeddings)))
+            if not index.is_trained:
+                index.train(embeddings)
+            index.add_with_ids(embeddings, ids)
+            if keep_vectors:
+                vectors = _write_vectors(vectors_path(path, ids, hashes), embeddings)
+            stats = {'mode': 'full', 'encoded': len(texts), 'added': len(texts), 'changed': 0, 'removed': 0}
+        else:
+            old_hash = dict(zip(current.ids.tolist(), current.hashes.tolist()))
+            new_ids = set(ids.tolist())
+            removed = [i for i in current.ids.tolist() if i not in new_ids]
+            stale = [pos for pos, (i, h) in enumerate(zip(ids.tolist(), hashes.tolist())) if old_hash.get(i) != h]
+            changed = [ids[pos] for pos in stale if int(ids[pos]) in old_hash]
+            stats = {
+                'mode': 'incremental', 'encoded': len(stale),
+                'added': len(stale) - len(changed), 'changed': len(changed), 'removed': len(removed),
+            }
+            index = current.index
+            vectors = current.vectors
+            fresh = np.zeros(len(ids), dtype=bool)
+            fresh[stale] = True
+            kept_ids = ids[~fresh]
+            embeddings = _encode(encode, [texts[pos] for pos in stale])
+
+            # float32 copies of the unchanged rows, in frame order, for when rerank
+            # was added after the index was built: read back from a Flat index,
+            # else encoded once, but never a rebuild of the index itself
+            kept = None
+            if keep_vectors and vectors is None:
+                kept = _exact_vectors(index, kept_ids)
+                stats['restored'] = 'index' if kept is not None else 'encoded'
+                if kept is None:
+                    kept = _encode(encode, [texts[pos] for pos in np.flatnonzero(~fresh)])
+                    stats['encoded'] += len(kept_ids)
+
+            def stored():
+                if kept is not None:
+                    return kept_ids, kept
+                if vectors is not None:
+                    return kept_ids, np.asarray(vectors[current.positions(kept_ids)], dtype=np.float32)
+                return None
+
+            if stale or removed:
+                drop = np.array(removed + changed, dtype=np.int64)
+                index = _upsert(index, drop, embeddings, ids[stale], spec, stored)
+            target = vectors_path(path, ids, hashes)
+            if keep_vectors and (vectors is None or vectors.filename != os.path.abspath(target)):
+                # Rows follow the frame's order, so even a reordered CSV needs a
+                # new file; unchanged rows are copied from the previous one by ID
+                rows = np.lib.format.open_memmap(
+                    target + '.tmp.npy', mode='w+', dtype=np.float32, shape=(len(ids), index.d)
+                )
+                if len(kept_ids):
+                    rows[~fresh] = stored()[1]
+                if stale:
+                    rows[stale] = embeddings
+                vectors = _write_vectors(target, rows)
+
+        result = cls(index, ids, hashes, model_name, spec, vectors)
+        if current is None or not (np.array_equal(ids, current.ids) and np.array_equal(hashes, current.hashes)):
+            result.save(path)
+            if current is not None and current.vectors is not None and current.vectors.filename != vectors.filename:
+                # Nothing refers to the old file any more; a VectorIndex still
+                # serving it keeps its mapping after the unlink
+                os.remove(current.vectors.filename)
+        stats['seconds'] = round(time.perf_counter() - start, 3)
+        stats['bytes_per_vector'] = round(result.nbytes / max(1, len(ids)), 1)
+        logging.info(f"Vector index {path}: {stats}")
+        return result, stats
+
+
+def _encode(encode, texts):
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(encode(texts), dtype=np.float32)
+
+
+def vectors_path(path, ids, hashes):
+    """Float32 vectors file for the manifest state (ids, hashes) of the index at path"""
+    digest = hashlib.blake2b(ids.tobytes() + hashes.tobytes(), digest_size=6).hexdigest()
+    return f"{path}.{digest}.{VECTORS_SUFFIX}"
+
+
+def _load_vectors(target, shape):
+    """The float32 vectors file memory-mapped, or None if it is missing or doesn't fit the index"""
+    try:
+        vectors = np.load(target, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logging.info(f"No usable vectors file {target} ({e}), it will be rewritten")
+        return None
+    if vectors.shape != shape or vectors.dtype != np.float32:
+        logging.warning(f"Vectors file {target} has shape {vectors.shape}, expected {shape}; it will be rewritten")
+        return None
+    return vectors
+
+
+def _write_vectors(target, rows):
+    """Write the float32 vectors file atomically and return it memory-mapped.
+
+    rows may already be a memmap of the temporary file.
+    """
+    tmp = target + '.tmp.npy'
+    if isinstance(rows, np.memmap) and rows.filename == os.path.abspath(tmp):
+        rows.flush()
+        del rows
+    else:
+        np.save(tmp, np.ascontiguousarray(rows, dtype=np.float32))
+    os.replace(tmp, target)
+    return np.load(target, mmap_mode='r')
+
+
+def _with_ids(index):
+    """Index that accepts add_with_ids/remove_ids with our stable IDs.
+
+    IVF indexes store IDs natively (and don't renumber on removal, which
+    IndexIDMap2 relies on), so only other index types get the wrapper.
+    """
+    if faiss.try_extract_index_ivf(index) is not None:
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def _exact_vectors(index, ids):
+    """float32 vectors for ids read back from a Flat index, or None if the index only keeps lossy codes"""
+    if not isinstance(index, faiss.IndexIDMap2) or not isinstance(faiss.downcast_index(index.index), faiss.IndexFlat):
+        return None
+    stored_ids = faiss.vector_to_array(index.id_map)
+    order = np.argsort(stored_ids)
+    slots = order[np.searchsorted(stored_ids[order], ids)]
+    return index.index.reconstruct_n(0, index.index.ntotal)[slots]
+
+
+def _upsert(index, drop, embeddings, new_ids, spec, stored=None):
+    """Remove drop IDs and add the new vectors, rebuilding if the index can't delete.
+
+    stored() returns (ids, float32 vectors) of the rows that stay, or None;
+    a rebuild uses them rather than the index's own copies, which are lossy
+    for quantized indexes and would lose more on every rebuild.
+    """
+    try:
+        if len(drop):
+            index.remove_ids(drop)
+        if len(new_ids):
+            index.add_with_ids(embeddings, new_ids)
+        return index
+    except RuntimeError:
+        pass
+
+    # e.g. HNSW: rebuild from the vectors already stored, skipping dropped IDs
+    kept = stored() if stored is not None else None
+    if kept is not None:
+        kept_ids, vectors = kept
+    else:
+        stored_ids = faiss.vector_to_array(index.id_map)
+        keep = ~np.isin(stored_ids, drop)
+        kept_ids, vectors = stored_ids[keep], index.index.reconstruct_n(0, index.index.ntotal)[keep]
+    rebuilt = _with_ids(new_index(spec, index.d, len(kept_ids) + len(new_ids)))
+    if not rebuilt.is_trained:
+        rebuilt.train(vectors)
+    rebuilt.add_with_ids(vectors, kept_ids)
+    if len(new_ids):
+        rebuilt.add_with_ids(embeddings, new_ids)
+    return rebuilt
@@ -0,0 +1,32 @@
+"""WSGI entry point for the chatbot services.
+
+CHATBOT_SERVICE picks the service: simple_chat (default), grok or app. The
+service's data and models are loaded at import time so a pre-forking server
+(see gunicorn.conf.py) loads them once before starting workers.
+
+Background threads (the catalog file watcher) must start in each worker after
+the fork; gunicorn.conf.py calls post_fork() for that.
+"""
+import os
+
+SERVICE = os.getenv('CHATBOT_SERVICE', 'simple_chat')
+
+if SERVICE == 'simple_chat':
+    import simple_chat as service
+    if not service.load_perfumes():
+        raise RuntimeError("Failed to load perfume catalog")
+elif SERVICE == 'grok':
+    import grok as service
+    service.initialize_models()
+elif SERVICE == 'app':
+    # app.py initializes its models on import
+    import app as service
+else:
+    raise ValueError(f"Unknown CHATBOT_SERVICE '{SERVICE}'")
+
+app = service.app
+
+
+def post_fork():
+    """Start per-worker background threads (CATALOG_WATCH_INTERVAL enables the watcher)"""
+    service.start_catalog_watch()